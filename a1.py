@@ -1,7 +1,15 @@
 from __future__ import annotations
 
-from random import shuffle
-from typing import List, Tuple, Optional, Union, Dict
+from collections import deque
+from random import Random, shuffle
+from typing import List, Tuple, Optional, Union, Dict, Iterable, Deque, \
+    Callable
+
+from a1_events import BoardEvent, CharacterPlaced, CharacterMoved, \
+    LockChanged, InsideCanChanged, GameEnded
+from a1_grid import CharGrid, RACCOON_ENTERABLE
+from a1_result import GameResult
+from a1_spatial import SpatialIndex
 
 # Each raccoon moves every this many turns
 RACCOON_TURN_FREQUENCY = 20
@@ -13,18 +21,28 @@ LEFT = (-1, 0)
 RIGHT = (1, 0)
 DIRECTIONS = [LEFT, UP, RIGHT, DOWN]
 
+# NUM_BITS[mask] is the number of bits set in the 4-bit direction mask <mask>
+NUM_BITS = (0, 1, 1, 2, 1, 2, 2, 3, 1, 2, 2, 3, 2, 3, 3, 4)
+
 
-def get_shuffled_directions() -> List[Tuple[int, int]]:
+def get_shuffled_directions(rng: Optional[Random] = None) \
+        -> List[Tuple[int, int]]:
     """
     Provided helper that returns a shuffled copy of DIRECTIONS.
     You should use this where appropriate
+
+    The copy is shuffled with <rng> (usually a GameBoard's rng) if it is
+    given, and with the module-level generator of random otherwise.
     """
     to_return = DIRECTIONS[:]
-    shuffle(to_return)
+    if rng is None:
+        shuffle(to_return)
+    else:
+        rng.shuffle(to_return)
     return to_return
 
 
-class GameBoard:
+class GameBoard(CharGrid):
     """A game board on which the game is played.
 
     === Public Attributes ===
@@ -36,7 +54,16 @@ class GameBoard:
         the number of squares wide this board is
     height:
         the number of squares high this board is
-
+    rng:
+        the random number generator used for everything random that happens
+        on this board, so that a game started from a given seed always plays
+        out the same way
+    observed:
+        whether any listener is subscribed to the events of this board (see
+        subscribe)
+    raccoon_turn_frequency:
+        the number of turns between two turns of the raccoons on this board,
+        RACCOON_TURN_FREQUENCY unless it is set otherwise
 
     === Representation Invariants ===
     turns >= 0
@@ -65,21 +92,43 @@ class GameBoard:
     #    or not.
     # _garbage_bins:
     #    A list of all the garbage bins on the gameboard.
+    # _index:
+    #    The spatial index of the Characters on the board.
+    # _result:
+    #    The GameResult last computed by result, or None if there is none.
+    # _result_version:
+    #    The value of _version (see CharGrid) when _result was computed.
+    # _early_end:
+    #    Whether raccoons that cannot reach a GarbageCan count as trapped.
+    # _listeners:
+    #    The (event class, listener) pairs subscribed to this board's events,
+    #    in the order they were subscribed.
 
     ended: bool
     turns: int
     width: int
     height: int
+    rng: Random
+    observed: bool
+    raccoon_turn_frequency: int
     _player: Optional[Player]
     _board: Dict[List[Union[Character, None]]]
     _raccoons: List[Raccoon]
     _garbage_bins: List[GarbageCan]
+    _index: SpatialIndex
+    _result: Optional[GameResult]
+    _result_version: int
+    _early_end: bool
+    _listeners: List[Tuple[type, Callable[[BoardEvent], None]]]
 
-    def __init__(self, w: int, h: int) -> None:
+    def __init__(self, w: int, h: int, seed: Optional[int] = None) -> None:
         """Initialize this Board to be of the given width <w> and height <h> in
         squares. A board is initially empty (no characters) and no turns have
         been taken.
 
+        The board's random number generator is seeded with <seed>, or from
+        the operating system if <seed> is None.
+
         >>> b = GameBoard(3, 3)
         >>> b.width == 3
         True
@@ -90,11 +139,12 @@ class GameBoard:
         >>> b.ended
         False
         """
+        CharGrid.__init__(self, w, h)
         self.ended = False
         self.turns = 0
 
-        self.width = w
-        self.height = h
+        self.rng = Random(seed)
+        self.raccoon_turn_frequency = RACCOON_TURN_FREQUENCY
 
         self._player = None
         d = {}
@@ -107,6 +157,16 @@ class GameBoard:
 
         self._garbage_bins = []
 
+        self._index = SpatialIndex(w, h)
+
+        self._result = None
+        self._result_version = 0
+
+        self._early_end = False
+
+        self.observed = False
+        self._listeners = []
+
     def place_character(self, c: Character) -> None:
         """Record that character <c> is on this board.
 
@@ -126,7 +186,7 @@ class GameBoard:
         as the Character.__init__ method calls this method.
 
         >>> b = GameBoard(3, 2)
-        >>> r = Raccoon(b, 1, 1)  # when a Raccoon is created, it is placed on b
+        >>> r = Raccoon(b, 1, 1)  # a Raccoon is placed on b when created
         >>> b.at(1, 1)[0] == r  # requires GameBoard.at be implemented to work
         True
         """
@@ -150,6 +210,10 @@ class GameBoard:
             self._garbage_bins.append(c)
 
         self._board[(c.x, c.y)].append(c)
+        self.refresh_tile(c.x, c.y)
+        self._index.add(c)
+        if self.observed:
+            self.notify(CharacterPlaced(c))
 
     def at(self, x: int, y: int) -> List[Character]:
         """Return the characters at tile (x, y).
@@ -183,6 +247,7 @@ class GameBoard:
 
         'R' = Raccoon
         'S' = SmartRaccoon
+        'T' = TrackingRaccoon
         'P' = Player
         'C' = closed GarbageCan
         'O' = open GarbageCan
@@ -199,27 +264,7 @@ class GameBoard:
         >>> b.to_grid()
         [['P', '-', '-'], ['-', 'R', 'C']]
         """
-        lst = []
-        # Set up lst so that it has the same number of empty inner lists as the
-        # number of rows in the GameBoard
-        for _ in range(self.height):
-            lst.append([])
-
-        for j in range(self.height):
-            for i in range(self.width):  # So (i, j) is the tile (i, j)
-                # on the board
-                lst_of_chars = self._board[(i, j)]
-
-                if not lst_of_chars:  # if lst_of_chars empty
-                    lst[j].append('-')
-
-                # So we can assume lst_of_chars not empty list
-                else:
-                    last_char = lst_of_chars[-1]
-                    ch = last_char.get_char()
-                    lst[j].append(ch)
-
-        return lst
+        return [list(row) for row in self.rows()]
 
     def __str__(self) -> str:
         """
@@ -240,13 +285,7 @@ class GameBoard:
         >>> str(b)
         'P--\\n-RO'
         """
-        grid_list = self.to_grid()
-        s = ''
-        for row in grid_list:
-            for ch in row:
-                s += ch
-            s += '\n'
-        return s.strip()
+        return '\n'.join(self.rows())
 
     def setup_from_grid(self, grid: str) -> None:
         """
@@ -254,6 +293,8 @@ class GameBoard:
         which represents a game board using the following chars:
 
         'R' = Raccoon not in a GarbageCan
+        'S' = SmartRaccoon not in a GarbageCan
+        'T' = TrackingRaccoon not in a GarbageCan
         'P' = Player
         'C' = closed GarbageCan
         'O' = open GarbageCan
@@ -269,17 +310,42 @@ class GameBoard:
         'P-B-\\n-BRB\\n--BB\\n-C--'
         """
         lines = grid.split("\n")
-        width = len(lines[0])
-        height = len(lines)
+        self.setup_from_rows(lines, len(lines[0]), len(lines))
+
+    def setup_from_rows(self, rows: Iterable[str], width: int,
+                        height: int) -> None:
+        """
+        Set the state of this GameBoard to a <width> by <height> board whose
+        rows, from top to bottom, are given by <rows>: one string per row,
+        using the same chars as setup_from_grid, without newlines.
+
+        Rows are only read one at a time, so <rows> can be a generator
+        producing them from a file without ever holding the whole board.
+
+        >>> b = GameBoard(1, 1)
+        >>> b.setup_from_rows(iter(['P-', 'BR']), 2, 2)
+        >>> str(b)
+        'P-\\nBR'
+        """
+        rng, listeners = self.rng, self._listeners
+        frequency = self.raccoon_turn_frequency
         self.__init__(width, height)  # reset the board to an empty board
+        self.rng = rng  # but keep drawing from the same random numbers
+        self.raccoon_turn_frequency = frequency  # and the same rules
+        for kind, listener in listeners:  # and keep the same listeners
+            self.subscribe(listener, kind)
         y = 0
-        for line in lines:
+        for line in rows:
             x = 0
             for char in line:
-                if char == 'R':
+                if char == '-':
+                    pass  # checked first, as most tiles are empty
+                elif char == 'R':
                     Raccoon(self, x, y)
                 elif char == 'S':
                     SmartRaccoon(self, x, y)
+                elif char == 'T':
+                    TrackingRaccoon(self, x, y)
                 elif char == 'P':
                     Player(self, x, y)
                 elif char == 'O':
@@ -297,6 +363,95 @@ class GameBoard:
                 x += 1
             y += 1
 
+    def refresh_tile(self, x: int, y: int) -> None:
+        """Update the character grid of this board for tile (<x>, <y>), which
+        has just changed: a Character arrived or left, or the Character on it
+        changed its letter (a GarbageCan was locked or unlocked, or a Raccoon
+        went inside a GarbageCan).
+
+        This is called by Character and its subclasses whenever they change a
+        tile, so it never needs to be called from outside this module.
+        """
+        chars = self._board[(x, y)]
+        self._set_letter(x, y, chars[-1].get_char() if chars else '-')
+
+    def character_moved(self, c: Character, old_x: int, old_y: int) -> None:
+        """Record that Character <c> has moved from tile (<old_x>, <old_y>)
+        to tile (c.x, c.y).
+
+        This method should only be called from Character._move, after the
+        tiles themselves have been updated.
+        """
+        self.refresh_tile(old_x, old_y)
+        self.refresh_tile(c.x, c.y)
+        self._index.move(c, old_x, old_y)
+        if self.observed:
+            self.notify(CharacterMoved(c, old_x, old_y))
+
+    def characters_in(self, kind: type, x: int, y: int, w: int,
+                      h: int) -> List[Character]:
+        """Return every Character on this board that is an instance of <kind>
+        and is inside the <w> by <h> rectangle whose top-left tile is
+        (<x>, <y>), in no particular order.
+
+        Only the index buckets overlapping the rectangle are looked at.
+
+        >>> b = GameBoard(20, 20)
+        >>> r = Raccoon(b, 3, 4)
+        >>> s = SmartRaccoon(b, 12, 15)
+        >>> _ = RecyclingBin(b, 5, 5)
+        >>> b.characters_in(Raccoon, 0, 0, 10, 10) == [r]
+        True
+        >>> set(b.characters_in(Raccoon, 0, 0, 20, 20)) == {r, s}
+        True
+        >>> b.characters_in(SmartRaccoon, 0, 0, 10, 10)
+        []
+        """
+        return self._index.find(kind, x, y, w, h)
+
+    def nearest_unoccupied_can(self, x: int,
+                               y: int) -> Optional[GarbageCan]:
+        """Return the GarbageCan with no Raccoon inside that is closest to
+        tile (<x>, <y>), counting distance as the number of horizontal plus
+        vertical steps between the tiles. Ties are broken by taking the
+        topmost, then leftmost, GarbageCan. Return None if every GarbageCan
+        is occupied.
+
+        Buckets of the spatial index are searched in rings of growing size
+        around (<x>, <y>), stopping as soon as no closer GarbageCan can exist.
+
+        >>> b = GameBoard(30, 30)
+        >>> g1 = GarbageCan(b, 25, 2, True)
+        >>> g2 = GarbageCan(b, 2, 9, False)
+        >>> _ = Raccoon(b, 2, 9)
+        >>> b.nearest_unoccupied_can(1, 1) == g1
+        True
+        >>> b.nearest_unoccupied_can(29, 29) == g1
+        True
+        """
+        return self._index.nearest(
+            GarbageCan, x, y,
+            lambda can: len(self._board[(can.x, can.y)]) == 1)  # no raccoon
+
+    def raccoons_near_player(self, k: int) -> List[Raccoon]:
+        """Return every Raccoon at most <k> horizontal plus vertical steps
+        away from the Player of this board, in no particular order.
+
+        Precondition:
+        self._player is not None
+
+        >>> b = GameBoard(10, 10)
+        >>> _ = Player(b, 5, 5)
+        >>> r1 = Raccoon(b, 5, 8)
+        >>> r2 = SmartRaccoon(b, 7, 7)
+        >>> b.raccoons_near_player(3) == [r1]
+        True
+        """
+        px, py = self._player.x, self._player.y
+        return [r for r in self.characters_in(Raccoon, px - k, py - k,
+                                              2 * k + 1, 2 * k + 1)
+                if abs(r.x - px) + abs(r.y - py) <= k]
+
     # a helper method you may find useful in places
     def on_board(self, x: int, y: int) -> bool:
         """Return True iff the position x, y is within the boundaries of this
@@ -309,7 +464,7 @@ class GameBoard:
 
         The Player should take their turn first and the number of turns
         should be incremented by one. Then each other TurnTaker
-        should be given a turn if RACCOON_TURN_FREQUENCY turns have occurred
+        should be given a turn if raccoon_turn_frequency turns have occurred
         since the last time the TurnTakers were given their turn.
 
         After all turns are taken, check_game_end should be called to
@@ -338,13 +493,15 @@ class GameBoard:
         >>> (p.x, p.y) == (1, 0)  # Player moved right!
         True
         """
+        self._start_turn()
         self._player.take_turn()
         self.turns += 1  # PROVIDED, DO NOT CHANGE
 
-        if self.turns % RACCOON_TURN_FREQUENCY == 0:  # PROVIDED, DO NOT CHANGE
+        if self.turns % self.raccoon_turn_frequency == 0:
             for raccoon in self._raccoons:
                 raccoon.take_turn()
 
+        self._end_turn()
         self.check_game_end()  # PROVIDED, DO NOT CHANGE
 
     def handle_event(self, event: Tuple[int, int]) -> None:
@@ -355,6 +512,30 @@ class GameBoard:
         """
         self._player.record_event(event)
 
+    def handle_events(self, events: Iterable[Tuple[int, int]]) -> None:
+        """Handle a sequence of user-input events at once, in order, as if
+        handle_event was called with each of them.
+
+        The Player makes moves_per_turn of them per turn, so scripted and AI
+        players can hand over a long sequence of moves with one call, then
+        give turns until it is used up (see Player.set_input_queue).
+
+        >>> b = GameBoard(4, 1)
+        >>> p = Player(b, 0, 0)
+        >>> b.set_input_queue(None, 2)
+        >>> b.handle_events([RIGHT, RIGHT, RIGHT])
+        >>> b.give_turns()
+        >>> (p.x, p.pending_moves)
+        (2, 1)
+        """
+        self._player.record_events(events)
+
+    def set_input_queue(self, size: Optional[int],
+                        moves_per_turn: int) -> None:
+        """Configure how the Player of this board buffers user input (see
+        Player.set_input_queue)."""
+        self._player.set_input_queue(size, moves_per_turn)
+
     def check_game_end(self) -> Optional[int]:
         """Check if this game has ended. A game ends when all the raccoons on
         this game board are either inside a can or trapped.
@@ -381,22 +562,102 @@ class GameBoard:
         >>> b.ended
         True
         """
-        for raccoon in self._raccoons:
-            if not raccoon.check_trapped():
-                self.ended = False
-                return None
+        res = self.result()
+        was_ended, self.ended = self.ended, res.ended
+        if self.observed and res.ended and not was_ended:
+            self.notify(GameEnded(res))
+        return res.score
+
+    def subscribe(self, listener: Callable[[BoardEvent], None],
+                  kind: Optional[type] = None) -> None:
+        """Call <listener> with every event of class <kind> (every
+        BoardEvent if it is None) that happens on this board from now on,
+        right after the change it describes.
+
+        Events are only created while some listener is subscribed, so a
+        board nobody listens to pays nothing for them.
+
+        >>> b = GameBoard(1, 1)
+        >>> b.subscribe(print)
+        >>> b.setup_from_grid('PB-\\nRO-')
+        CharacterPlaced(P, 0, 0)
+        CharacterPlaced(B, 1, 0)
+        CharacterPlaced(R, 0, 1)
+        CharacterPlaced(O, 1, 1)
+        >>> b.unsubscribe(print)
+        >>> b.subscribe(print, CharacterMoved)
+        >>> b.handle_event(RIGHT)
+        >>> b.give_turns()
+        CharacterMoved(B, 1, 0 -> 2, 0)
+        CharacterMoved(P, 0, 0 -> 1, 0)
+        """
+        self._listeners.append((kind or BoardEvent, listener))
+        self.observed = True
+
+    def unsubscribe(self, listener: Callable[[BoardEvent], None]) -> None:
+        """Stop calling <listener> with the events of this board."""
+        self._listeners = [(kind, other) for kind, other in self._listeners
+                           if other != listener]
+        self.observed = bool(self._listeners)
+
+    def notify(self, event: BoardEvent) -> None:
+        """Call every listener subscribed to events like <event> with it.
+
+        This is called by this module whenever the board changes, so it
+        never needs to be called from outside this module.
+        """
+        for kind, listener in self._listeners:
+            if isinstance(event, kind):
+                listener(event)
 
-        self.ended = True
-        trapped_num = self.trapped_num()
-        return trapped_num * 10 + self.adjacent_bin_score()
+    def result(self) -> GameResult:
+        """Return a breakdown of where this game stands: whether it has ended,
+        how many raccoons are trapped and inside cans, the size of the
+        largest cluster of recycling bins and the score (see check_game_end).
+
+        The result is cached, and only recomputed once something on the board
+        has changed, so calling this repeatedly is free.
+
+        >>> b = GameBoard(3, 2)
+        >>> _ = Raccoon(b, 1, 0)
+        >>> _ = Player(b, 0, 0)
+        >>> _ = GarbageCan(b, 2, 1, False)
+        >>> _ = Raccoon(b, 2, 1)
+        >>> _ = RecyclingBin(b, 1, 1)
+        >>> b.result()
+        GameResult(ended=False, trapped=0, in_cans=1, largest_cluster=1, \
+score=None)
+        >>> _ = RecyclingBin(b, 2, 0)
+        >>> res = b.result()
+        >>> res.ended, res.trapped, res.largest_cluster, res.score
+        (True, 1, 1, 11)
+        >>> b.result() is res
+        True
+        """
+        if self._result is not None and self._result_version == self._version:
+            return self._result
+
+        trapped, in_cans = 0, 0
+        for raccoon in self._raccoons:
+            if raccoon.inside_can:
+                in_cans += 1
+            elif raccoon.check_trapped() or (
+                    self._early_end
+                    and not self.can_reach_can(raccoon.x, raccoon.y)):
+                trapped += 1
+        ended = trapped + in_cans == len(self._raccoons)
+        self._result = GameResult(ended, trapped, in_cans,
+                                  self.adjacent_bin_score())
+        self._result_version = self._version
+        return self._result
 
     def adjacent_bin_score(self) -> int:
         """
         Return the size of the largest cluster of adjacent recycling bins
         on this board.
 
-        Two recycling bins are adjacent when they are directly beside each other
-        in one of the four directions (up, down, left, right).
+        Two recycling bins are adjacent when they are directly beside each
+        other in one of the four directions (up, down, left, right).
 
         See Task #5 in the handout for ideas if you aren't sure how
         to approach this problem.
@@ -426,7 +687,24 @@ class GameBoard:
         >>> b.adjacent_bin_score()
         5
         """
-        pass
+        visited = set()
+        largest = 0
+        for pos in self._board:
+            if pos in visited or not self._is_bin(pos):
+                continue
+            # flood fill the cluster of bins containing pos
+            visited.add(pos)
+            stack = [pos]
+            size = 0
+            while stack:
+                tile = stack.pop()
+                size += 1
+                for neighbour in get_neighbours(tile):
+                    if neighbour not in visited and self._is_bin(neighbour):
+                        visited.add(neighbour)
+                        stack.append(neighbour)
+            largest = max(largest, size)
+        return largest
 
     # === Helper Methods === #
     def movebins(self, bins_list: List[RecyclingBin], direction: Tuple[int,
@@ -440,17 +718,49 @@ class GameBoard:
         for rbin in bins_list_reversed:
             rbin._move(direction)
 
+    def _is_bin(self, tile: Tuple[int, int]) -> bool:
+        """Return whether <tile> is on the board and holds a RecyclingBin."""
+        chars = self.at(tile[0], tile[1])
+        return bool(chars) and isinstance(chars[0], RecyclingBin)
+
     def get_garbage(self) -> List[GarbageCan]:
         """Gives access to private attribute _garbage_bins."""
         return self._garbage_bins
 
+    def get_raccoons(self) -> List[Raccoon]:
+        """Gives access to private attribute _raccoons, in the order the
+        raccoons take their turns."""
+        return self._raccoons
+
+    @property
+    def early_end(self) -> bool:
+        """Whether the game ends early: if True, Raccoons that cannot reach
+        any GarbageCan (see can_reach_can) count as trapped, so a game ends
+        as soon as its outcome can no longer change without the Player
+        pushing RecyclingBins around. False by default.
+
+        >>> b = GameBoard(3, 1)
+        >>> _ = Raccoon(b, 0, 0)
+        >>> _ = Player(b, 2, 0)
+        >>> b.result().ended
+        False
+        >>> b.early_end = True
+        >>> b.result()
+        GameResult(ended=True, trapped=1, in_cans=0, largest_cluster=0, \
+score=10)
+        """
+        return self._early_end
+
+    @early_end.setter
+    def early_end(self, value: bool) -> None:
+        """Set whether the game ends early."""
+        self._early_end = value
+        self._result = None
+
     def trapped_num(self) -> int:
-        """Returns the number of trapped Raccoon on the gameboard."""
-        num = 0
-        for raccoon in self._raccoons:
-            if raccoon.check_trapped():
-                num += 1
-        return num
+        """Returns the number of trapped Raccoon on the gameboard (not counting
+        the ones inside a garbage can)."""
+        return self.result().trapped
 
 
 class Character:
@@ -487,7 +797,7 @@ class Character:
         """
         self.board = b
         self.x, self.y = x, y
-        self.board.place_character(self)  # this associates self with the board!
+        self.board.place_character(self)  # this associates self with b!
         #  The above line allows the board to know which characters are on it
 
     def move(self, direction: Tuple[int, int]) -> bool:
@@ -508,6 +818,7 @@ class Character:
         self.board.  (So additionally we can assume (self.x + direction[0],
         self.y + direction[1]) is on the board.)"""
         b = self.board
+        old_x, old_y = self.x, self.y
         # Delete location of <self> on self.board
         b.at(self.x, self.y).clear()
 
@@ -516,6 +827,7 @@ class Character:
 
         # Update new location of <self> on self.board
         b.at(self.x, self.y).extend([self])
+        b.character_moved(self, old_x, old_y)
 
     def get_char(self) -> chr:
         """
@@ -535,7 +847,8 @@ class TurnTaker(Character):
 
     def take_turn(self) -> None:
         """
-        Take a turn in the game. This method must be implemented in any subclass
+        Take a turn in the game. This method must be implemented in any
+        subclass
         """
         raise NotImplementedError
 
@@ -614,6 +927,10 @@ class RecyclingBin(Character):
 class Player(TurnTaker):
     """The Player of this game.
 
+    === Public Attributes ===
+    moves_per_turn:
+        the largest number of recorded moves the Player makes in one turn
+
     === Sample Usage ===
     >>> b = GameBoard(3, 1)
     >>> p = Player(b, 0, 0)
@@ -628,36 +945,78 @@ class Player(TurnTaker):
     True
     """
     # === Private Attributes ===
-    # _last_event:
-    #   The direction corresponding to the last keypress event that the user
-    #   made, or None if there is currently no keypress event left to process
-    _last_event: Optional[Tuple[int, int]]
+    # _events:
+    #   The directions of the keypress events the user made that are left to
+    #   process, oldest first. When it is full, recording a new event drops
+    #   the oldest one; by default it holds a single event, so that only the
+    #   last keypress before a turn counts.
+    moves_per_turn: int
+    _events: Deque[Tuple[int, int]]
 
     def __init__(self, b: GameBoard, x: int, y: int) -> None:
         """Initialize this Player with board <b>,
         and at tile (<x>, <y>)."""
 
         TurnTaker.__init__(self, b, x, y)
-        self._last_event = None
+        self.moves_per_turn = 1
+        self._events = deque(maxlen=1)
+
+    def set_input_queue(self, size: Optional[int],
+                        moves_per_turn: int) -> None:
+        """Buffer up to <size> recorded events (any number if <size> is
+        None), and make up to <moves_per_turn> of them per turn. The events
+        already recorded are kept, newest first if they do not all fit.
+
+        Precondition:
+        size is None or size >= 1
+        moves_per_turn >= 1
+
+        >>> b = GameBoard(4, 1)
+        >>> p = Player(b, 0, 0)
+        >>> p.record_event(RIGHT)
+        >>> p.record_event(RIGHT)  # replaces the first one
+        >>> p.pending_moves
+        1
+        >>> p.set_input_queue(3, 1)
+        >>> for _ in range(4):
+        ...     p.record_event(RIGHT)
+        >>> p.pending_moves
+        3
+        """
+        self._events = deque(self._events, maxlen=size)
+        self.moves_per_turn = moves_per_turn
+
+    @property
+    def pending_moves(self) -> int:
+        """The number of recorded events not processed yet."""
+        return len(self._events)
 
     def record_event(self, direction: Tuple[int, int]) -> None:
         """Record that <direction> is the last direction that the user
         has specified for this Player to move. Next time take_turn is called,
-        this direction will be used.
+        this direction will be used, after the events recorded before it.
         Precondition:
         direction is in DIRECTIONS
         """
-        self._last_event = direction
+        self._events.append(direction)
+
+    def record_events(self, directions: Iterable[Tuple[int, int]]) -> None:
+        """Record each of <directions>, in order, as record_event does.
+        Precondition:
+        every direction is in DIRECTIONS
+        """
+        self._events.extend(directions)
 
     def take_turn(self) -> None:
         """Take a turn in the game.
 
-        For a Player, this means responding to the last user input recorded
-        by a call to record_event.
+        For a Player, this means responding to the oldest user inputs
+        recorded by record_event (or record_events) that are still left, up
+        to moves_per_turn of them.
         """
-        if self._last_event is not None:
-            self.move(self._last_event)
-            self._last_event = None
+        events = self._events
+        for _ in range(min(self.moves_per_turn, len(events))):
+            self.move(events.popleft())
 
     def move(self, direction: Tuple[int, int]) -> bool:
         """Attempt to move this Player to the tile:
@@ -743,20 +1102,35 @@ class Raccoon(TurnTaker):
     >>> r.inside_can
     False
     """
-    inside_can: bool
+    _inside_can: bool
 
     def __init__(self, b: GameBoard, x: int, y: int) -> None:
         """Initialize this Raccoon with board <b>, and
-        at tile (<x>, <y>). Initially a Raccoon is not inside
-        of a GarbageCan, unless it is placed directly inside an open GarbageCan.
+        at tile (<x>, <y>). Initially a Raccoon is not inside of a
+        GarbageCan, unless it is placed directly inside an open GarbageCan.
         """
-        self.inside_can = False
+        self._inside_can = False
         # since this raccoon may be placed inside an open garbage can,
         # we need to initially set the inside_can attribute
-        # BEFORE calling the parent init, which is where the raccoon is actually
-        # placed on the board.
+        # BEFORE calling the parent init, which is where the raccoon is
+        # actually placed on the board.
         TurnTaker.__init__(self, b, x, y)
 
+    @property
+    def inside_can(self) -> bool:
+        """Whether or not this Raccoon is inside a garbage can."""
+        return self._inside_can
+
+    @inside_can.setter
+    def inside_can(self, value: bool) -> None:
+        """Set whether or not this Raccoon is inside a garbage can, keeping
+        the character grid of its board up to date."""
+        changed = value != self._inside_can
+        self._inside_can = value
+        self.board.refresh_tile(self.x, self.y)
+        if changed and self.board.observed:
+            self.board.notify(InsideCanChanged(self))
+
     def check_trapped(self) -> bool:
         """Return True iff this raccoon is trapped. A trapped raccoon is
         surrounded on 4 sides (diagonals don't matter) by recycling bins, other
@@ -776,10 +1150,7 @@ class Raccoon(TurnTaker):
         >>> r.check_trapped()
         True
         """
-        for direction in DIRECTIONS:
-            if self._can_move(direction):
-                return False
-        return True
+        return self.board.raccoon_moves(self.x, self.y) == 0
 
     def _can_move(self, direction: Tuple[int, int]) -> bool:
         """Returns whether <self> (a Raccoon) can move in this direction.
@@ -792,21 +1163,7 @@ class Raccoon(TurnTaker):
         # (x, y) will be the candidate tile to move to
         x, y = self.x + direction[0], self.y + direction[1]
         b = self.board
-
-        if not b.on_board(x, y):
-            # (x,y) is not on the board
-            return False
-        else:
-            # can assume (x,y) on the board
-            if not b.at(x, y):  # if the tile at (x, y) is empty
-                return True
-            # can now assume b.at(x, y) is not empty
-            elif b.at(x, y)[-1].get_char() in ['O', 'C']:
-                # if the tile at (x, y) has only an open garbage bin (with no
-                # raccoon in it) or a closed garbage bin
-                return True
-            else:
-                return False
+        return b.on_board(x, y) and b.char_at(x, y) in RACCOON_ENTERABLE
 
     def move(self, direction: Tuple[int, int]) -> bool:
         """Attempt to move this Raccoon in <direction> and return whether
@@ -821,8 +1178,8 @@ class Raccoon(TurnTaker):
         (the GarbageCan and the Raccoon). If the GarbageCan is locked, this
         Raccoon uses this turn to unlock it and return True.
 
-        If a Raccoon is inside of a GarbageCan, it will not move. Do nothing and
-        return False.
+        If a Raccoon is inside of a GarbageCan, it will not move. Do nothing
+        and return False.
 
         Return True if the Raccoon unlocks a GarbageCan or moves from its
         current tile.
@@ -855,26 +1212,26 @@ class Raccoon(TurnTaker):
         b = self.board
         if self.inside_can:
             return False
-        else:
-            # Can assume now that the self is not in a garbage can.
-            # Hence it has the ability to move
-            if self._can_move(direction):
-                x, y = self.x + direction[0], self.y + direction[1]
-                char_lst = b.at(x, y)  # list of characters at (x,y)
-                # case 1: (x,y) is empty
-                if not char_lst:
-                    self._move(direction)
-                    return True
-                # case 2: (x,y) has closed garbage can
-                elif char_lst[-1].get_char() == 'C':
-                    char_lst[-1].locked = False
-                    return True
-                # case 3: (x,y) has open garbage can
-                elif char_lst[-1].get_char() == 'O':
-                    self._move(direction)
-                    self.inside_can = True
-                    return True
+        # Can assume now that the self is not in a garbage can.
+        # Hence it has the ability to move
+        x, y = self.x + direction[0], self.y + direction[1]
+        if not b.on_board(x, y):
             return False
+        ch = b.char_at(x, y)  # the tile is read only once
+        # case 1: (x,y) is empty
+        if ch == '-':
+            self._move(direction)
+            return True
+        # case 2: (x,y) has closed garbage can
+        elif ch == 'C':
+            b.at(x, y)[-1].locked = False
+            return True
+        # case 3: (x,y) has open garbage can
+        elif ch == 'O':
+            self._move(direction)
+            self.inside_can = True
+            return True
+        return False
 
     def take_turn(self) -> None:
         """Take a turn in the game.
@@ -882,7 +1239,8 @@ class Raccoon(TurnTaker):
         If a Raccoon is in a GarbageCan, it stays where it is.
 
         Otherwise, it randomly attempts (if it is not blocked) to move in
-        one of the four directions, with equal probability.
+        one of the four directions, with equal probability. The direction is
+        picked with a single draw from the board's rng.
 
         >>> b = GameBoard(3, 4)
         >>> r1 = Raccoon(b, 0, 0)
@@ -901,17 +1259,24 @@ class Raccoon(TurnTaker):
             return None
 
         # Can assume raccoon not in a garbage can.  hence it has possibility
-        # of movement
-        possible_dir = []
-        for direction in DIRECTIONS:
-            if self._can_move(direction):
-                possible_dir.append(direction)
-
-        if possible_dir:  # if this list is not empty
-            shuffle(possible_dir)
-            self.move(possible_dir[0])
+        # of movement.
+        self._random_move(self.board.raccoon_moves(self.x, self.y))
         return None
 
+    def _random_move(self, mask: int) -> None:
+        """Move in one of the directions set in the neighbour <mask> (see
+        GameBoard.raccoon_moves), each with equal probability. Do nothing if
+        <mask> is 0."""
+        num = NUM_BITS[mask]
+        if num:  # pick the k-th possible direction
+            k = self.board.rng.randrange(num)
+            for i in range(4):
+                if mask >> i & 1:
+                    if k == 0:
+                        self.move(DIRECTIONS[i])
+                        return
+                    k -= 1
+
     def get_char(self) -> chr:
         """
         Return '@' to represent that this Raccoon is inside a garbage can
@@ -974,14 +1339,18 @@ class SmartRaccoon(Raccoon):
             return None
 
         # Can assume self is not in a garbage can.
+        mask = self.board.raccoon_moves(self.x, self.y)
+        if mask == 0:
+            return None  # trapped, so there is no point looking around
 
         direction = self._find_closest_path()
         if direction is None:
-            Raccoon.take_turn(self)
-            return None
+            self._random_move(mask)
         else:
-            self._move(direction)
-            return None
+            # move (rather than _move) so that walking into the GarbageCan
+            # unlocks it or climbs inside, like for any other Raccoon
+            self.move(direction)
+        return None
 
     def _find_closest_path(self) -> Optional[Tuple[int, int]]:
         """Returns the direction for <self> to travel in that is the closest
@@ -1014,25 +1383,19 @@ class SmartRaccoon(Raccoon):
         <direction>.  If there is one, it returns a tuple where the first value
         is True and the second value is the length of the direct path.
         If no such path exists, returns (False, 0). """
-        unoccupied_g = []
         b = self.board
-        for gb in b.get_garbage():
-            if len(b.at(gb.x, gb.y)) == 1:
-                # No raccoon in gb so it's unoccupied
-                unoccupied_g.append(gb)
-
         num = 1
         while b.on_board(self.x + num * direction[0],
                          self.y + num * direction[1]):
-            char_lst = b.at(self.x + num * direction[0],
-                            self.y + num * direction[1])
+            ch = b.char_at(self.x + num * direction[0],
+                           self.y + num * direction[1])
 
             # case 1: candidate tile is empty or has the player
-            if not char_lst or char_lst[-1].get_char() == 'P':
+            if ch in '-P':
                 num += 1
-            # case 2: candidate tile has a garbage can in unoccupied_g
-            elif char_lst[-1].get_char() in ['C', 'O'] and \
-                    char_lst[-1] in unoccupied_g:
+            # case 2: candidate tile has a garbage can with no raccoon in it
+            # (an occupied garbage can shows up as '@')
+            elif ch in 'CO':
                 return True, num
             # case 3: meets a tile with another character in the way
             else:
@@ -1049,6 +1412,73 @@ class SmartRaccoon(Raccoon):
         return 'S'
 
 
+class TrackingRaccoon(Raccoon):
+    """A raccoon that can find its way to a GarbageCan from anywhere.
+
+    Behaves like a Raccoon, but on each turn it takes a step along a shortest
+    path to the closest reachable unoccupied GarbageCan, following its board's
+    distance_field. The field is shared by every TrackingRaccoon on the board,
+    so a turn costs only four lookups per raccoon.
+
+    === Sample Usage ===
+    >>> b = GameBoard(5, 3)
+    >>> t = TrackingRaccoon(b, 0, 0)
+    >>> _ = RecyclingBin(b, 1, 0)
+    >>> _ = GarbageCan(b, 2, 0, False)
+    >>> t.take_turn()
+    >>> t.x, t.y
+    (0, 1)
+    >>> t.take_turn()
+    >>> t.take_turn()
+    >>> t.take_turn()
+    >>> t.inside_can
+    True
+    """
+
+    def take_turn(self) -> None:
+        """Take a turn in the game.
+
+        If a TrackingRaccoon is in a GarbageCan, it stays where it is.
+
+        Otherwise it moves to the neighbouring tile that is closest to an
+        unoccupied GarbageCan, if it can move there and that tile is closer
+        than its own. Ties are broken by the order of DIRECTIONS. If no such
+        tile exists, it moves exactly like a Raccoon.
+        """
+        if self.inside_can:
+            return None
+
+        mask = self.board.raccoon_moves(self.x, self.y)
+        if mask == 0:
+            return None  # trapped
+
+        field = self.board.distance_field()
+        w = self.board.width
+        best_dir, best_dist = None, field[self.y * w + self.x]
+        for i in range(4):
+            if mask >> i & 1:  # the neighbour is on the board and enterable
+                direction = DIRECTIONS[i]
+                dist = field[(self.y + direction[1]) * w + self.x
+                             + direction[0]]
+                if dist != -1 and (best_dist == -1 or dist < best_dist):
+                    best_dir, best_dist = direction, dist
+
+        if best_dir is None:
+            self._random_move(mask)
+        else:
+            self.move(best_dir)
+        return None
+
+    def get_char(self) -> chr:
+        """
+        Return '@' to represent that this TrackingRaccoon is inside a Garbage
+        Can and 'T' otherwise.
+        """
+        if self.inside_can:
+            return '@'
+        return 'T'
+
+
 class GarbageCan(Character):
     """A garbage can in the game.
 
@@ -1064,15 +1494,30 @@ class GarbageCan(Character):
     >>> g.locked
     False
     """
-    locked: bool
+    _locked: bool
 
     def __init__(self, b: GameBoard, x: int, y: int, locked: bool) -> None:
         """Initialize this GarbageCan to be at tile (<x>, <y>) and store
         whether it is locked or not based on <locked>.
         """
-
+        # set before placing this GarbageCan, so that its board can show it
+        self._locked = locked
         Character.__init__(self, b, x, y)
-        self.locked = locked
+
+    @property
+    def locked(self) -> bool:
+        """Whether or not this GarbageCan is locked."""
+        return self._locked
+
+    @locked.setter
+    def locked(self, value: bool) -> None:
+        """Lock or unlock this GarbageCan, keeping the character grid of its
+        board up to date."""
+        changed = value != self._locked
+        self._locked = value
+        self.board.refresh_tile(self.x, self.y)
+        if changed and self.board.observed:
+            self.board.notify(LockChanged(self))
 
     def get_char(self) -> chr:
         """
@@ -1118,7 +1563,10 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-io': [],
         'allowed-import-modules': ['doctest', 'python_ta', 'typing',
-                                   'random', '__future__', 'math'],
+                                   'random', '__future__', 'math',
+                                   'collections', 'a1_events',
+                                   'a1_freespace', 'a1_grid',
+                                   'a1_result', 'a1_spatial'],
         'disable': ['E1136'],
         'max-attributes': 15,
         'max-module-lines': 1600
@@ -0,0 +1,386 @@
+"""A batched engine stepping many independent games in lockstep.
+
+A BatchEngine holds B boards of the same size as one NumPy array of tile
+codes (the letters of GameBoard.to_grid), plus struct-of-arrays Player and
+Raccoon state. Each call to step applies one Player direction per board and,
+on the boards whose turn it is, the raccoon tick, to all B boards at once,
+following the same rules as GameBoard.give_turns:
+- the Player moves, pushes a line of recycling bins, or locks an open can,
+- every raccoon_turn_frequency turns (the board's own, for engines built
+  with from_boards, and RACCOON_TURN_FREQUENCY otherwise) each raccoon, in
+  the order it was placed, takes a turn exactly as Raccoon.take_turn and
+  SmartRaccoon.take_turn do,
+- the game has ended once every raccoon is trapped or inside a can, and its
+  score is then 10 per trapped raccoon plus the largest bin cluster.
+
+Raccoons of the same index are processed together across all boards, so a
+tick costs a fixed number of array operations per raccoon slot, however
+many boards there are. TrackingRaccoons are not supported.
+
+Randomness comes from a NumPy generator by default. For bit-for-bit
+agreement with GameBoard, build the engine with from_boards(...,
+exact=True): each board then draws its random moves from a copy of its
+GameBoard's rng, just like Raccoon.take_turn does.
+"""
+from __future__ import annotations
+
+from random import Random
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+import a1
+
+# Letters of the tiles, as codes in the tiles array.
+EMPTY, PLAYER, BIN = ord('-'), ord('P'), ord('B')
+RACCOON, SMART = ord('R'), ord('S')
+OPEN_CAN, CLOSED_CAN, IN_CAN = ord('O'), ord('C'), ord('@')
+
+# dx, dy of each direction index, in the order of a1.DIRECTIONS
+DX = np.array([d[0] for d in a1.DIRECTIONS])
+DY = np.array([d[1] for d in a1.DIRECTIONS])
+
+# Code of "no move" in the directions given to step.
+NO_MOVE = -1
+
+
+class BatchEngine:
+    """B games of Raccoon Raiders on boards of the same size, stepped in
+    lockstep.
+
+    === Public Attributes ===
+    tiles:
+        the tile codes of every board, of shape (B, height, width)
+    turns:
+        the number of turns taken on each board, of shape (B,)
+    frequencies:
+        the number of turns between two raccoon turns on each board, of
+        shape (B,)
+    ended:
+        whether each game has ended, of shape (B,)
+    scores:
+        the score of each game that has ended, and -1 for the others
+
+    === Representation Invariants ===
+    tiles[b, y, x] is the letter GameBoard.to_grid would show on tile (x, y)
+    of board b.
+    """
+    # === Private Attributes ===
+    # _player_x, _player_y:
+    #   the position of the Player on each board, of shape (B,)
+    # _rx, _ry:
+    #   the position of raccoon slot r on each board, of shape (B, R), where
+    #   R is the largest number of raccoons on a board; slot r of a board is
+    #   the r-th raccoon placed on it
+    # _smart:
+    #   whether the raccoon in each slot is a SmartRaccoon
+    # _inside:
+    #   whether the raccoon in each slot is inside a garbage can
+    # _alive:
+    #   whether each slot holds a raccoon (boards with fewer raccoons than R
+    #   have empty slots at the end)
+    # _np_rng:
+    #   the generator used for random moves when _exact_rngs is None
+    # _exact_rngs:
+    #   one Python Random per board, drawn from exactly like GameBoard.rng,
+    #   or None
+
+    tiles: np.ndarray
+    turns: np.ndarray
+    frequencies: np.ndarray
+    ended: np.ndarray
+    scores: np.ndarray
+    _player_x: np.ndarray
+    _player_y: np.ndarray
+    _rx: np.ndarray
+    _ry: np.ndarray
+    _smart: np.ndarray
+    _inside: np.ndarray
+    _alive: np.ndarray
+    _np_rng: np.random.Generator
+    _exact_rngs: Optional[List[Random]]
+
+    def __init__(self, grids: Sequence[str], seed: Optional[int] = None,
+                 rngs: Optional[List[Random]] = None) -> None:
+        """Initialize an engine playing one game per setup_from_grid string
+        in <grids>, all of the same size, each with exactly one Player.
+
+        Random moves are drawn from a NumPy generator seeded with <seed>, or
+        from <rngs>, one Python Random per board, if it is given.
+
+        Raise ValueError if the boards are not all the same size, or if one
+        of them holds a TrackingRaccoon.
+        """
+        rows = [g.split('\n') for g in grids]
+        height, width = len(rows[0]), len(rows[0][0])
+        if any(len(r) != height or any(len(line) != width for line in r)
+               for r in rows):
+            raise ValueError('all boards must have the same size')
+        raw = ''.join(''.join(r) for r in rows).encode('ascii')
+        self.tiles = np.frombuffer(raw, dtype=np.uint8).reshape(
+            len(grids), height, width).copy()
+        if (self.tiles == ord('T')).any():
+            raise ValueError('TrackingRaccoons are not supported')
+
+        num = len(grids)
+        flat = self.tiles.reshape(num, -1)
+        player = np.argmax(flat == PLAYER, axis=1)
+        self._player_x, self._player_y = player % width, player // width
+
+        # raccoon slots, in row-major (i.e. placement) order
+        is_raccoon = (flat == RACCOON) | (flat == SMART) | (flat == IN_CAN)
+        counts = is_raccoon.sum(axis=1)
+        slots = int(counts.max()) if num else 0
+        self._alive = np.arange(slots)[None, :] < counts[:, None]
+        pos = np.zeros((num, slots), dtype=np.int64)
+        pos[self._alive] = np.nonzero(is_raccoon)[1]
+        self._rx, self._ry = pos % width, pos // width
+        codes = flat[np.arange(num)[:, None], pos]
+        self._smart = self._alive & (codes == SMART)
+        self._inside = self._alive & (codes == IN_CAN)
+
+        self.turns = np.zeros(num, dtype=np.int64)
+        self.frequencies = np.full(num, a1.RACCOON_TURN_FREQUENCY,
+                                   dtype=np.int64)
+        self.ended = np.zeros(num, dtype=bool)
+        self.scores = np.full(num, -1, dtype=np.int64)
+        self._np_rng = np.random.default_rng(seed)
+        self._exact_rngs = rngs
+
+    @classmethod
+    def from_boards(cls, boards: Sequence[a1.GameBoard],
+                    exact: bool = False,
+                    seed: Optional[int] = None) -> BatchEngine:
+        """Return an engine continuing the games on <boards>, from their
+        current state and number of turns.
+
+        If <exact> is True, each board's random moves are drawn from a copy
+        of the state of its GameBoard's rng, so that the engine plays out
+        exactly like calling give_turns on the boards would.
+        """
+        rngs = None
+        if exact:
+            rngs = []
+            for board in boards:
+                rng = Random()
+                rng.setstate(board.rng.getstate())
+                rngs.append(rng)
+        engine = cls([str(board) for board in boards], seed, rngs)
+        engine.turns[:] = [board.turns for board in boards]
+        engine.frequencies[:] = [board.raccoon_turn_frequency
+                                 for board in boards]
+        # raccoons take their turns in the order they were placed, which is
+        # not always the row-major order the constructor assumes
+        for i, board in enumerate(boards):
+            raccoons = board.get_raccoons()
+            n = len(raccoons)
+            engine._rx[i, :n] = [r.x for r in raccoons]
+            engine._ry[i, :n] = [r.y for r in raccoons]
+            engine._smart[i, :n] = [isinstance(r, a1.SmartRaccoon)
+                                    for r in raccoons]
+            engine._inside[i, :n] = [r.inside_can for r in raccoons]
+        return engine
+
+    @property
+    def num_boards(self) -> int:
+        """The number of boards in this engine."""
+        return self.tiles.shape[0]
+
+    def board_string(self, b: int) -> str:
+        """Return the string representation of board <b>, as GameBoard.__str__
+        would give it.
+
+        >>> e = BatchEngine(['PO-\\n-R-', 'PB-\\n--S'])
+        >>> e.step(np.array([2, 2]))
+        >>> e.board_string(0), e.board_string(1)
+        ('PC-\\n-R-', '-PB\\n--S')
+        """
+        return '\n'.join(row.tobytes().decode('ascii')
+                         for row in self.tiles[b])
+
+    def step(self, directions: np.ndarray) -> None:
+        """Give one turn to every board: the Player of board b moves in
+        direction a1.DIRECTIONS[directions[b]] (or stays still if it is
+        NO_MOVE), then, on boards whose turn count reaches a multiple of
+        their entry in frequencies, every raccoon takes a turn. Finally
+        ended and scores are updated.
+        """
+        self._move_players(np.asarray(directions))
+        self.turns += 1
+        ticking = self.turns % self.frequencies == 0
+        if ticking.any():
+            for r in range(self._alive.shape[1]):
+                self._raccoon_turn(r, ticking)
+        self._check_end()
+
+    def _move_players(self, directions: np.ndarray) -> None:
+        """Apply Player.move in <directions> on every board."""
+        h, w = self.tiles.shape[1:]
+        idx = np.nonzero(directions != NO_MOVE)[0]
+        d = directions[idx]
+        dx, dy = DX[d], DY[d]
+        px, py = self._player_x[idx], self._player_y[idx]
+        tx, ty = px + dx, py + dy
+        on = (tx >= 0) & (tx < w) & (ty >= 0) & (ty < h)
+        idx, dx, dy, px, py, tx, ty = (a[on] for a in
+                                       (idx, dx, dy, px, py, tx, ty))
+        target = self.tiles[idx, ty, tx]
+
+        # an open can next to the Player is locked
+        lock = target == OPEN_CAN
+        self.tiles[idx[lock], ty[lock], tx[lock]] = CLOSED_CAN
+
+        # a line of bins is pushed if the tile after it is empty
+        push = target == BIN
+        steps = np.ones(len(idx), dtype=np.int64)
+        end_code = target.copy()
+        for _ in range(max(h, w)):
+            more = push & (end_code == BIN)
+            if not more.any():
+                break
+            steps[more] += 1
+            ex, ey = px + steps * dx, py + steps * dy
+            on_board = (ex >= 0) & (ex < w) & (ey >= 0) & (ey < h)
+            end_code[more & ~on_board] = 0  # the bins hit the edge
+            sel = more & on_board
+            end_code[sel] = self.tiles[idx[sel], ey[sel], ex[sel]]
+        push &= end_code == EMPTY
+        ex, ey = px + steps * dx, py + steps * dy
+        self.tiles[idx[push], ey[push], ex[push]] = BIN
+
+        walk = push | (target == EMPTY)
+        self.tiles[idx[walk], py[walk], px[walk]] = EMPTY
+        self.tiles[idx[walk], ty[walk], tx[walk]] = PLAYER
+        self._player_x[idx[walk]] = tx[walk]
+        self._player_y[idx[walk]] = ty[walk]
+
+    def _neighbour_masks(self, idx: np.ndarray, x: np.ndarray,
+                         y: np.ndarray) -> np.ndarray:
+        """Return the neighbour mask (as in GameBoard.raccoon_moves) of tile
+        (x[i], y[i]) of board idx[i], for every i."""
+        h, w = self.tiles.shape[1:]
+        mask = np.zeros(len(idx), dtype=np.int64)
+        for i in range(4):
+            nx, ny = x + DX[i], y + DY[i]
+            on = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+            code = np.full(len(idx), BIN, dtype=np.uint8)
+            code[on] = self.tiles[idx[on], ny[on], nx[on]]
+            enterable = (code == EMPTY) | (code == OPEN_CAN) \
+                | (code == CLOSED_CAN)
+            mask |= enterable.astype(np.int64) << i
+        return mask
+
+    def _raccoon_turn(self, r: int, ticking: np.ndarray) -> None:
+        """Give raccoon slot <r> its turn on every board in <ticking>."""
+        h, w = self.tiles.shape[1:]
+        idx = np.nonzero(ticking & self._alive[:, r] & ~self._inside[:, r])[0]
+        x, y = self._rx[idx, r], self._ry[idx, r]
+        mask = self._neighbour_masks(idx, x, y)
+        num = np.array(a1.NUM_BITS)[mask]
+        direction = np.full(len(idx), NO_MOVE)
+
+        # SmartRaccoons that are not trapped look for a can in sight
+        smart = self._smart[idx, r] & (mask != 0)
+        best = np.full(len(idx), np.iinfo(np.int64).max)
+        for i in range(4):
+            looking = smart.copy()
+            for dist in range(1, max(h, w)):
+                if not looking.any():
+                    break
+                nx, ny = x + dist * DX[i], y + dist * DY[i]
+                on = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+                looking &= on
+                code = np.zeros(len(idx), dtype=np.uint8)
+                code[looking] = self.tiles[idx[looking], ny[looking],
+                                           nx[looking]]
+                found = looking & ((code == OPEN_CAN) | (code == CLOSED_CAN))
+                closer = found & (dist < best)
+                best[closer] = dist
+                direction[closer] = i
+                looking &= (code == EMPTY) | (code == PLAYER)
+
+        # everyone else that can move picks a random possible direction
+        rand = (direction == NO_MOVE) & (num > 0)
+        k = self._draw(idx[rand], num[rand])
+        chosen = np.full(k.shape, NO_MOVE)
+        m = mask[rand]
+        for i in range(4):
+            bit = (m >> i) & 1 == 1
+            pick = bit & (k == 0) & (chosen == NO_MOVE)
+            chosen[pick] = i
+            k -= bit & (chosen == NO_MOVE)
+        direction[rand] = chosen
+
+        # move exactly like Raccoon.move
+        go = direction != NO_MOVE
+        idx, x, y, d = idx[go], x[go], y[go], direction[go]
+        tx, ty = x + DX[d], y + DY[d]
+        code = self.tiles[idx, ty, tx]
+        unlock = code == CLOSED_CAN
+        self.tiles[idx[unlock], ty[unlock], tx[unlock]] = OPEN_CAN
+        walk = code == EMPTY
+        enter = code == OPEN_CAN
+        moved = walk | enter
+        self.tiles[idx[moved], y[moved], x[moved]] = EMPTY
+        letters = np.where(self._smart[idx, r], SMART, RACCOON)
+        self.tiles[idx[walk], ty[walk], tx[walk]] = letters[walk]
+        self.tiles[idx[enter], ty[enter], tx[enter]] = IN_CAN
+        self._rx[idx[moved], r] = tx[moved]
+        self._ry[idx[moved], r] = ty[moved]
+        self._inside[idx[enter], r] = True
+
+    def _draw(self, idx: np.ndarray, num: np.ndarray) -> np.ndarray:
+        """Return a random integer in [0, num[i]) for board idx[i], for
+        every i."""
+        if self._exact_rngs is None:
+            return (self._np_rng.random(len(idx)) * num).astype(np.int64)
+        return np.array([self._exact_rngs[b].randrange(n)
+                         for b, n in zip(idx.tolist(), num.tolist())],
+                        dtype=np.int64)
+
+    def _check_end(self) -> None:
+        """Update ended and scores, as GameBoard.result would."""
+        num = self.num_boards
+        b = np.repeat(np.arange(num), self._alive.shape[1])
+        free = (self._alive & ~self._inside).ravel()
+        masks = np.zeros(free.shape, dtype=np.int64)
+        masks[free] = self._neighbour_masks(b[free], self._rx.ravel()[free],
+                                            self._ry.ravel()[free])
+        trapped = (free & (masks == 0)).reshape(num, -1)
+        settled = trapped | self._inside | ~self._alive
+        self.ended = settled.all(axis=1)
+        self.scores[:] = -1
+        if self.ended.any():
+            clusters = largest_bin_clusters(self.tiles[self.ended] == BIN)
+            self.scores[self.ended] = trapped[self.ended].sum(axis=1) * 10 \
+                + clusters
+
+
+def largest_bin_clusters(bins: np.ndarray) -> np.ndarray:
+    """Return the size of the largest group of adjacent True tiles on each
+    board of the boolean array <bins>, of shape (boards, height, width), as
+    GameBoard.adjacent_bin_score does.
+
+    >>> largest_bin_clusters(np.array([[[True, False, True],
+    ...                                 [True, True, False]]])).tolist()
+    [3]
+    """
+    num, h, w = bins.shape
+    if num == 0:
+        return np.zeros(0, dtype=np.int64)
+    big = h * w
+    labels = np.where(bins, np.arange(big).reshape(1, h, w), big)
+    while True:  # spread the smallest label over each cluster
+        spread = labels.copy()
+        np.minimum(spread[:, 1:, :], labels[:, :-1, :], out=spread[:, 1:, :])
+        np.minimum(spread[:, :-1, :], labels[:, 1:, :], out=spread[:, :-1, :])
+        np.minimum(spread[:, :, 1:], labels[:, :, :-1], out=spread[:, :, 1:])
+        np.minimum(spread[:, :, :-1], labels[:, :, 1:], out=spread[:, :, :-1])
+        spread = np.where(bins, spread, big)
+        if np.array_equal(spread, labels):
+            break
+        labels = spread
+    flat = labels.reshape(num, -1) + (np.arange(num) * (big + 1))[:, None]
+    sizes = np.bincount(flat[bins.reshape(num, -1)],
+                        minlength=num * (big + 1)).reshape(num, big + 1)
+    return sizes.max(axis=1)
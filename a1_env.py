@@ -0,0 +1,180 @@
+"""A Gym-style environment wrapping GameBoard, for reinforcement learning.
+
+    env = RaccoonEnv(10, 10)
+    obs = env.reset(seed=0)
+    done = False
+    while not done:
+        obs, reward, done, info = env.step(agent.act(obs))
+
+Observations are NumPy arrays of shape (height, width) holding the byte of
+the letter GameBoard.to_grid shows on each tile (ord('P'), ord('R'), ...).
+They are read-only views of the board's character grid, not copies: nothing
+is built per step, and the array returned by reset keeps reflecting the
+current state of the board until the next reset. Copy it to keep a
+snapshot.
+
+The reward of a step is 10 for every raccoon that became trapped during it
+(and -10 for every one that escaped), plus the size of the largest
+recycling bin cluster on the step that ends the game, so the rewards of an
+episode add up to the final score.
+"""
+from __future__ import annotations
+
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+import a1
+from a1_headless import populate_board, NUM_RACCOONS, NUM_GARBAGE_CANS
+
+# Action that leaves the Player where it is; actions 0 to 3 are the
+# directions of a1.DIRECTIONS.
+STAY = 4
+
+# Reward for each raccoon that becomes trapped.
+TRAP_REWARD = 10
+
+
+class RaccoonEnv:
+    """A Raccoon Raiders game as an environment.
+
+    === Public Attributes ===
+    width, height:
+        the size of the boards, in squares
+    num_actions:
+        the number of actions: one per direction, plus STAY
+    max_turns:
+        the number of turns after which an episode is cut short, or None
+    board:
+        the board of the current episode, or None before the first reset
+    """
+    # === Private Attributes ===
+    # _grid:
+    #   the setup_from_grid string every episode starts from, or None to
+    #   start each episode on a new random board
+    # _counts:
+    #   the number of raccoons, garbage cans and recycling bins placed on a
+    #   random board
+    # _trapped:
+    #   the number of trapped raccoons after the last step
+    # _done:
+    #   whether the current episode is over
+
+    width: int
+    height: int
+    num_actions: int
+    max_turns: Optional[int]
+    board: Optional[a1.GameBoard]
+    _grid: Optional[str]
+    _counts: Tuple[int, int, int]
+    _trapped: int
+    _done: bool
+
+    def __init__(self, width: int = 10, height: int = 10,
+                 grid: Optional[str] = None,
+                 num_raccoons: int = NUM_RACCOONS,
+                 num_cans: int = NUM_GARBAGE_CANS,
+                 num_bins: Optional[int] = None,
+                 max_turns: Optional[int] = None) -> None:
+        """Initialize an environment whose episodes start from the board
+        <grid> if it is given (its size then overrides <width> and <height>),
+        and otherwise from a random <width> by <height> board holding the
+        given number of Characters. With <num_bins> None, bins cover a
+        quarter of the board.
+        """
+        if grid is not None:
+            lines = grid.split('\n')
+            width, height = len(lines[0]), len(lines)
+        self.width, self.height = width, height
+        self.num_actions = 5
+        self.max_turns = max_turns
+        self.board = None
+        self._grid = grid
+        if num_bins is None:
+            num_bins = int(width * height * 0.25)
+        self._counts = (num_raccoons, num_cans, num_bins)
+        self._trapped = 0
+        self._done = True
+
+    def reset(self, seed: Optional[int] = None) -> np.ndarray:
+        """Start a new episode whose randomness is seeded with <seed>, and
+        return its first observation.
+
+        >>> env = RaccoonEnv(grid='P-B\\n--R')
+        >>> obs = env.reset(seed=1)
+        >>> obs.shape, bytes(obs[1])
+        ((2, 3), b'--R')
+        """
+        self.board = a1.GameBoard(self.width, self.height, seed)
+        if self._grid is not None:
+            self.board.setup_from_grid(self._grid)
+        else:
+            populate_board(self.board, *self._counts)
+        self._trapped = self.board.result().trapped
+        self._done = False
+        return self.observation()
+
+    def observation(self) -> np.ndarray:
+        """Return the read-only view of the current board's tile codes.
+
+        Raise RuntimeError if no episode was started with reset yet.
+        """
+        self._check_started()
+        return np.frombuffer(self.board.char_grid(), dtype=np.uint8).reshape(
+            self.height, self.width)
+
+    def step(self, action: Union[int, Tuple[int, int], None]) \
+            -> Tuple[np.ndarray, float, bool, dict]:
+        """Play one turn, with the Player moving as <action> says: an index
+        into a1.DIRECTIONS, a direction itself, or STAY (or None) to stay
+        still. Return the observation, the reward, whether the episode is
+        over, and a dict of extra information about the game. Once the
+        episode is over, the board no longer changes until the next reset.
+
+        Raise RuntimeError if no episode was started with reset yet.
+
+        >>> env = RaccoonEnv(grid='P-B\\n--R')
+        >>> env.step(2)
+        Traceback (most recent call last):
+        ...
+        RuntimeError: no episode has started: call reset first
+        >>> obs = env.reset(seed=1)
+        >>> obs, reward, done, info = env.step(2)  # RIGHT, pushing the bin
+        >>> print(env.board)
+        -PB
+        --R
+        >>> reward, done, info['score']
+        (0.0, False, None)
+        >>> obs, reward, done, info = env.step(3)  # DOWN, trapping R
+        >>> reward, done, info['score']
+        (11.0, True, 11)
+        >>> env.step(0)[1:3]  # the game is over: nothing more to earn
+        (0.0, True)
+        """
+        self._check_started()
+        reward = 0.0
+        if not self._done:
+            if isinstance(action, tuple):
+                self.board.handle_event(action)
+            elif action is not None and action != STAY:
+                self.board.handle_event(a1.DIRECTIONS[action])
+            self.board.give_turns()
+
+        res = self.board.result()
+        truncated = self.max_turns is not None \
+            and self.board.turns >= self.max_turns and not res.ended
+        if not self._done:
+            reward = float(TRAP_REWARD * (res.trapped - self._trapped))
+            self._trapped = res.trapped
+            if res.ended:
+                reward += res.largest_cluster
+            self._done = res.ended or truncated
+        info = {'turns': self.board.turns, 'trapped': res.trapped,
+                'in_cans': res.in_cans, 'score': res.score,
+                'truncated': truncated}
+        return self.observation(), reward, self._done, info
+
+    def _check_started(self) -> None:
+        """Raise RuntimeError if no episode was started with reset yet."""
+        if self.board is None:
+            raise RuntimeError('no episode has started: call reset first')
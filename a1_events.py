@@ -0,0 +1,121 @@
+"""The events a GameBoard passes to the listeners subscribed to it (see
+GameBoard.subscribe).
+
+a1 imports this module, so it only imports a1 for type checking.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from a1 import Character, GarbageCan, Raccoon
+    from a1_result import GameResult
+
+
+class BoardEvent:
+    """A change that happened on a GameBoard, as passed to the listeners
+    subscribed to it.
+
+    This class is abstract and should not be directly instantiated.
+    """
+
+
+class CharacterPlaced(BoardEvent):
+    """A Character was placed on the board.
+
+    === Public Attributes ===
+    character:
+        the Character placed
+    """
+    character: Character
+
+    def __init__(self, character: Character) -> None:
+        """Initialize this event."""
+        self.character = character
+
+    def __repr__(self) -> str:
+        """Return a string representation of this event."""
+        c = self.character
+        return f'CharacterPlaced({c.get_char()}, {c.x}, {c.y})'
+
+
+class CharacterMoved(BoardEvent):
+    """A Character moved by one tile, on its own or pushed by the Player.
+
+    === Public Attributes ===
+    character:
+        the Character that moved, now at (character.x, character.y)
+    old_x, old_y:
+        the tile the Character moved from
+    """
+    character: Character
+    old_x: int
+    old_y: int
+
+    def __init__(self, character: Character, old_x: int, old_y: int) -> None:
+        """Initialize this event."""
+        self.character = character
+        self.old_x, self.old_y = old_x, old_y
+
+    def __repr__(self) -> str:
+        """Return a string representation of this event."""
+        c = self.character
+        return (f'CharacterMoved({c.get_char()}, {self.old_x}, {self.old_y} '
+                f'-> {c.x}, {c.y})')
+
+
+class LockChanged(BoardEvent):
+    """A GarbageCan was locked or unlocked.
+
+    === Public Attributes ===
+    can:
+        the GarbageCan, whose locked attribute is its new state
+    """
+    can: GarbageCan
+
+    def __init__(self, can: GarbageCan) -> None:
+        """Initialize this event."""
+        self.can = can
+
+    def __repr__(self) -> str:
+        """Return a string representation of this event."""
+        return (f'LockChanged({self.can.x}, {self.can.y}, '
+                f'locked={self.can.locked})')
+
+
+class InsideCanChanged(BoardEvent):
+    """A Raccoon went inside a GarbageCan, or came out of one.
+
+    === Public Attributes ===
+    raccoon:
+        the Raccoon, whose inside_can attribute is its new state
+    """
+    raccoon: Raccoon
+
+    def __init__(self, raccoon: Raccoon) -> None:
+        """Initialize this event."""
+        self.raccoon = raccoon
+
+    def __repr__(self) -> str:
+        """Return a string representation of this event."""
+        r = self.raccoon
+        return f'InsideCanChanged({r.x}, {r.y}, inside_can={r.inside_can})'
+
+
+class GameEnded(BoardEvent):
+    """The game ended, i.e. GameBoard.check_game_end found it over when
+    it was not before.
+
+    === Public Attributes ===
+    result:
+        the result of the game when it ended
+    """
+    result: GameResult
+
+    def __init__(self, result: GameResult) -> None:
+        """Initialize this event."""
+        self.result = result
+
+    def __repr__(self) -> str:
+        """Return a string representation of this event."""
+        return f'GameEnded(score={self.result.score})'
@@ -0,0 +1,294 @@
+"""An incremental index of the free space of a board, as Raccoons see it.
+
+GameBoard.free_space builds one for its character grid and keeps it up to
+date as tiles change; GameBoard.can_reach_can and early_end rely on it.
+The distance fields that TrackingRaccoons follow are found in the same free
+space.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Set
+
+# Letters of the tiles Raccoons pass through on their way to a GarbageCan:
+# empty tiles, and the tiles of Characters that move out of the way. Tiles
+# of GarbageCans with no Raccoon inside are where the way ends; everything
+# else (RecyclingBins and occupied GarbageCans) blocks it.
+_FREE_CODES = b'-PRST'
+_CAN_CODES = b'OC'
+
+
+def changes_paths(old: int, new: int) -> bool:
+    """Return whether a tile whose letter changed from the code <old> to the
+    code <new> changed the ways Raccoons can walk to GarbageCans: the tile
+    became free or stopped being free, or it became or stopped being a
+    GarbageCan with no Raccoon inside. Characters moving around in the free
+    space change no ways.
+
+    >>> changes_paths(ord('-'), ord('R')), changes_paths(ord('O'), ord('@'))
+    (False, True)
+    """
+    return (old in _FREE_CODES) != (new in _FREE_CODES) \
+        or (old in _CAN_CODES) != (new in _CAN_CODES)
+
+
+def find_distances(grid: bytearray, width: int, height: int) -> List[int]:
+    """Return the distance field of the board whose character grid is
+    <grid>: entry i is the number of Raccoon steps from tile i to the
+    closest GarbageCan with no Raccoon inside, or -1 if no such GarbageCan
+    can be reached from tile i. The way only passes through free tiles.
+
+    The field is found with a single breadth-first search starting from
+    every GarbageCan with no Raccoon inside at once.
+
+    >>> find_distances(bytearray(b'CB--' b'----'), 4, 2)
+    [0, -1, 4, 5, 1, 2, 3, 4]
+    """
+    field = [-1] * (width * height)
+    queue = [i for i, code in enumerate(grid) if code in _CAN_CODES]
+    for i in queue:
+        field[i] = 0
+    for i in queue:  # queue grows as the search goes
+        x = i % width
+        for n, inside in [(i - 1, x > 0), (i - width, i >= width),
+                          (i + 1, x < width - 1),
+                          (i + width, i + width < len(field))]:
+            if inside and field[n] == -1 and grid[n] in _FREE_CODES:
+                field[n] = field[i] + 1
+                queue.append(n)
+    return field
+
+
+class FreeSpaceIndex:
+    """The regions of a board's free space, as Raccoons see it.
+
+    A tile is free if its letter is in _FREE_CODES, i.e. it is empty or holds
+    a Raccoon or the Player, and a region is a maximal group of adjacent free
+    tiles. A Raccoon can reach a GarbageCan with no Raccoon inside iff such
+    a GarbageCan is next to some tile of its region, which the index tells
+    in constant time.
+
+    The index is updated tile by tile as the board changes: a tile becoming
+    free merges the regions around it, relabelling the smaller ones, and a
+    tile that stops being free splits its region only if its free neighbours
+    are not connected around it, in which case one search per neighbour
+    runs in lockstep until all but one of them have either met or run out
+    of tiles, so the cost is that of the smaller pieces.
+
+    Tiles are given as grid indices: tile (x, y) is y * width + x.
+
+    === Public Attributes ===
+    width, height:
+        the size of the board, in squares
+
+    === Sample Usage ===
+    >>> grid = bytearray(b'-B-' b'-BO')
+    >>> index = FreeSpaceIndex(grid, 3, 2)
+    >>> index.can_reach_can(0), index.can_reach_can(2)
+    (False, True)
+    >>> grid[1] = ord('-')  # the bin at (1, 0) is pushed away...
+    >>> index.update(1, ord('B'), ord('-'))
+    >>> index.can_reach_can(0), index.region(0) == index.region(2)
+    (True, True)
+    """
+    # === Private Attributes ===
+    # _grid:
+    #   the character grid of the board, which this index only reads
+    # _labels:
+    #   the label of the region of every tile, or -1 for tiles that are not
+    #   free
+    # _tiles:
+    #   the tiles of every region, by label
+    # _cans:
+    #   for every region, by label, the number of pairs of a tile of the
+    #   region and a neighbouring GarbageCan with no Raccoon inside
+    # _next_label:
+    #   the label of the next new region
+
+    width: int
+    height: int
+    _grid: bytearray
+    _labels: List[int]
+    _tiles: Dict[int, Set[int]]
+    _cans: Dict[int, int]
+    _next_label: int
+
+    def __init__(self, grid: bytearray, width: int, height: int) -> None:
+        """Initialize the index of the board whose character grid is
+        <grid>, labelling every region with one search each."""
+        self.width, self.height = width, height
+        self._grid = grid
+        self._labels = [-1] * (width * height)
+        self._tiles = {}
+        self._cans = {}
+        self._next_label = 0
+        for i, code in enumerate(grid):
+            if code in _FREE_CODES and self._labels[i] == -1:
+                label = self._new_label()
+                self._labels[i] = label
+                members = [i]
+                for t in members:  # members grows as the search goes
+                    for n in self._neighbours(t):
+                        if self._labels[n] == -1 and grid[n] in _FREE_CODES:
+                            self._labels[n] = label
+                            members.append(n)
+                self._fill(label, members)
+
+    def region(self, i: int) -> int:
+        """Return the label of the region of tile <i>, or -1 if the tile is
+        not free."""
+        return self._labels[i]
+
+    def can_reach_can(self, i: int) -> bool:
+        """Return whether a Raccoon on free tile <i> could walk to a
+        GarbageCan with no Raccoon inside; False if the tile is not free."""
+        label = self._labels[i]
+        return label != -1 and self._cans[label] > 0
+
+    def num_regions(self) -> int:
+        """Return the number of regions of free space."""
+        return len(self._tiles)
+
+    def update(self, i: int, old: int, new: int) -> None:
+        """Update the index after the letter of tile <i> in the character
+        grid changed from the code <old> to the code <new>."""
+        if old in _FREE_CODES and new not in _FREE_CODES:
+            self._remove_tile(i)
+        elif old in _CAN_CODES and new not in _CAN_CODES:
+            self._count_can(i, -1)
+        if new in _FREE_CODES and old not in _FREE_CODES:
+            self._add_tile(i)
+        elif new in _CAN_CODES and old not in _CAN_CODES:
+            self._count_can(i, 1)
+
+    def _neighbours(self, i: int) -> List[int]:
+        """Return the tiles next to tile <i>."""
+        w = self.width
+        x = i % w
+        result = []
+        if x > 0:
+            result.append(i - 1)
+        if i >= w:
+            result.append(i - w)
+        if x < w - 1:
+            result.append(i + 1)
+        if i + w < len(self._labels):
+            result.append(i + w)
+        return result
+
+    def _cans_next_to(self, i: int) -> int:
+        """Return the number of GarbageCans with no Raccoon inside next to
+        tile <i>."""
+        return sum(1 for n in self._neighbours(i)
+                   if self._grid[n] in _CAN_CODES)
+
+    def _new_label(self) -> int:
+        """Return an unused region label."""
+        self._next_label += 1
+        return self._next_label - 1
+
+    def _fill(self, label: int, tiles: Iterable[int]) -> None:
+        """Make <tiles>, already labelled <label>, the region <label>."""
+        self._tiles[label] = set(tiles)
+        self._cans[label] = sum(self._cans_next_to(t)
+                                for t in self._tiles[label])
+
+    def _count_can(self, i: int, change: int) -> None:
+        """Record that a GarbageCan with no Raccoon inside appeared on tile
+        <i> (<change> is 1) or left it (<change> is -1)."""
+        for n in self._neighbours(i):
+            if self._labels[n] != -1:
+                self._cans[self._labels[n]] += change
+
+    def _add_tile(self, i: int) -> None:
+        """Add the newly free tile <i>, merging the regions around it."""
+        around = {self._labels[n] for n in self._neighbours(i)} - {-1}
+        if not around:
+            label = self._new_label()
+            self._tiles[label], self._cans[label] = set(), 0
+        else:
+            label = max(around, key=lambda r: len(self._tiles[r]))
+            for other in around - {label}:
+                for t in self._tiles[other]:
+                    self._labels[t] = label
+                self._tiles[label] |= self._tiles.pop(other)
+                self._cans[label] += self._cans.pop(other)
+        self._labels[i] = label
+        self._tiles[label].add(i)
+        self._cans[label] += self._cans_next_to(i)
+
+    def _remove_tile(self, i: int) -> None:
+        """Remove tile <i>, which is no longer free, splitting its region if
+        that disconnects it."""
+        label = self._labels[i]
+        self._labels[i] = -1
+        self._tiles[label].discard(i)
+        self._cans[label] -= self._cans_next_to(i)
+        if not self._tiles[label]:
+            del self._tiles[label]
+            del self._cans[label]
+            return
+        seeds = [n for n in self._neighbours(i) if self._labels[n] == label]
+        if len(seeds) > 1 and not self._connected_around(i, label):
+            for piece in self._split(seeds, label):
+                new = self._new_label()
+                for t in piece:
+                    self._labels[t] = new
+                self._tiles[label] -= piece
+                self._fill(new, piece)
+                self._cans[label] -= self._cans[new]
+
+    def _connected_around(self, i: int, label: int) -> bool:
+        """Return whether the neighbours of tile <i> in region <label> are
+        all connected through the 8 tiles around <i>."""
+        w, h = self.width, self.height
+        x, y = i % w, i // w
+        ring = [(0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0),
+                (-1, -1)]
+        free = [0 <= x + dx < w and 0 <= y + dy < h
+                and self._labels[i + dy * w + dx] == label
+                for dx, dy in ring]
+        # count the runs of free tiles around the ring holding a neighbour
+        runs = 0
+        for k in range(0, 8, 2):
+            if free[k] and not (free[k - 1] and free[k - 2]):
+                runs += 1
+        return runs <= 1
+
+    def _split(self, seeds: List[int], label: int) -> List[Set[int]]:
+        """Return the pieces region <label> falls into, as the tiles of all
+        the pieces but the one left with the label, when the tiles <seeds>
+        may no longer be connected."""
+        owner = {seed: k for k, seed in enumerate(seeds)}
+        group = list(range(len(seeds)))  # union-find over the searches
+        frontiers = [[seed] for seed in seeds]
+        done = [False] * len(seeds)
+
+        def find(k: int) -> int:
+            while group[k] != k:
+                k = group[k]
+            return k
+
+        while len({find(k) for k in range(len(seeds)) if not done[k]}) > 1:
+            for k in range(len(seeds)):
+                if done[k]:
+                    continue
+                t = frontiers[k].pop()
+                for n in self._neighbours(t):
+                    if self._labels[n] != label:
+                        continue
+                    if n not in owner:
+                        owner[n] = k
+                        frontiers[k].append(n)
+                    elif find(owner[n]) != find(k):
+                        group[find(owner[n])] = find(k)
+                done[k] = not frontiers[k]
+
+        # a group whose searches have all run out of tiles is a piece of its
+        # own; the one group still searching (if any) keeps the label
+        pieces = {}
+        for t, k in owner.items():
+            pieces.setdefault(find(k), set()).add(t)
+        searching = {find(k) for k in range(len(seeds)) if not done[k]}
+        keep = searching.pop() if searching \
+            else max(pieces, key=lambda g: len(pieces[g]))
+        return [tiles for g, tiles in pieces.items() if g != keep]
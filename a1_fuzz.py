@@ -0,0 +1,322 @@
+"""A differential fuzzer checking alternative engines against GameBoard.
+
+Each fuzz case is a random board (from populate_board), the seed of its rng,
+and a random sequence of Player moves. Every case is played both by the
+reference engine (GameBoard.give_turns, i.e. Player.move, RecyclingBin.move,
+Raccoon.move and SmartRaccoon.take_turn) and by a candidate engine, and the
+hash of every board's state is compared after every turn. The state hashed
+is the board's string, its number of turns, whether the game has ended and
+its score.
+
+On the first mismatch, the failing case is minimised -- moves after the
+mismatch are dropped, as many moves as possible are replaced by staying
+still, as many Characters as possible are removed from the board, and the
+moves that are no longer needed at the end are dropped -- and printed as
+a reproducer. The time each engine took to play all the cases (without
+hashing) is reported too, as the candidate's speedup.
+
+A candidate engine is a function taking a list of boards and an array of
+moves of shape (turns, boards), holding direction indices or
+a1_batch.NO_MOVE, which plays the moves on (copies of) the boards. It
+returns the state hashes as a list of lists of shape (turns, boards), or
+None if its <record> argument is False, along with the state (see
+state_text) of each board after the last move. The only candidate so far
+is 'batch', the BatchEngine of a1_batch in exact mode.
+
+Fuzz with, e.g.:
+    python a1_fuzz.py --cases 500 --turns 400 --width 9 --height 7
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import a1
+from a1_batch import BatchEngine, NO_MOVE
+from a1_headless import populate_board
+
+# A reproducer: the setup_from_grid string of a board, the seed of its rng,
+# and the moves played on it.
+Case = Tuple[str, int, List[int]]
+
+# The state hashes of every board after every turn, or None if not recorded,
+# and the signature of an engine (see this module's docstring).
+Hashes = Optional[List[List[str]]]
+Engine = Callable[[List[a1.GameBoard], np.ndarray, bool],
+                  Tuple[Hashes, List[str]]]
+
+# Letters of the moves in a printed reproducer, indexed by direction; the
+# last one, '.', is at index NO_MOVE.
+MOVE_LETTERS = 'LURD.'
+
+
+def state_text(text: str, turns: int, ended: bool,
+               score: Optional[int]) -> str:
+    """Return the state of a board whose string is <text>, as compared
+    between engines.
+
+    >>> print(state_text('P-\\nBR', 3, False, None))
+    P-
+    BR
+    turns 3, ended False, score None
+    """
+    return f'{text}\nturns {turns}, ended {ended}, score {score}'
+
+
+def state_hash(state: str) -> str:
+    """Return the hash of the board state <state>."""
+    return hashlib.blake2b(state.encode(), digest_size=8).hexdigest()
+
+
+def case_board(case: Case) -> a1.GameBoard:
+    """Return a fresh board set up as in <case>."""
+    grid, seed, _ = case
+    board = a1.GameBoard(1, 1, seed)
+    board.setup_from_grid(grid)
+    return board
+
+
+def run_reference(boards: List[a1.GameBoard], moves: np.ndarray,
+                  record: bool = True) -> Tuple[Hashes, List[str]]:
+    """Play <moves> on <boards> with GameBoard.give_turns."""
+    def state(board: a1.GameBoard) -> str:
+        return state_text(str(board), board.turns, board.ended,
+                          board.result().score)
+
+    hashes = [] if record else None
+    for turn_moves in moves.tolist():
+        row = []
+        for board, d in zip(boards, turn_moves):
+            if d != NO_MOVE:
+                board.handle_event(a1.DIRECTIONS[d])
+            board.give_turns()
+            if record:
+                row.append(state_hash(state(board)))
+        if record:
+            hashes.append(row)
+    return hashes, [state(board) for board in boards]
+
+
+def run_batch(boards: List[a1.GameBoard], moves: np.ndarray,
+              record: bool = True,
+              engine_class: type = BatchEngine) -> Tuple[Hashes, List[str]]:
+    """Play <moves> on <boards> with a BatchEngine (or <engine_class>) in
+    exact mode."""
+    engine = engine_class.from_boards(boards, exact=True)
+
+    def state(b: int) -> str:
+        score = int(engine.scores[b])
+        return state_text(engine.board_string(b), int(engine.turns[b]),
+                          bool(engine.ended[b]), None if score < 0 else score)
+
+    hashes = [] if record else None
+    for turn_moves in moves:
+        engine.step(turn_moves)
+        if record:
+            hashes.append([state_hash(state(b))
+                           for b in range(engine.num_boards)])
+    return hashes, [state(b) for b in range(engine.num_boards)]
+
+
+CANDIDATES: Dict[str, Engine] = {'batch': run_batch}
+
+
+class Mismatch:
+    """The first state on which a candidate engine disagreed with the
+    reference.
+
+    === Public Attributes ===
+    case_index:
+        the index of the failing case
+    turn:
+        the number of turns played when the states first differed
+    reproducer:
+        the minimised failing case
+    expected, actual:
+        the state of the reproducer's board after its last move, as the
+        reference and the candidate engine left it
+    """
+    case_index: int
+    turn: int
+    reproducer: Case
+    expected: str
+    actual: str
+
+    def __init__(self, case_index: int, turn: int, reproducer: Case,
+                 expected: str, actual: str) -> None:
+        """Initialize a mismatch record."""
+        self.case_index = case_index
+        self.turn = turn
+        self.reproducer = reproducer
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self) -> str:
+        """Return a printable description of this mismatch."""
+        grid, seed, moves = self.reproducer
+        return '\n'.join([
+            f'mismatch in case {self.case_index} after turn {self.turn}',
+            f'minimised reproducer (seed {seed}, moves '
+            f'{"".join(MOVE_LETTERS[m] for m in moves)}):', grid,
+            'reference ends at:', self.expected,
+            'candidate ends at:', self.actual])
+
+
+class FuzzReport:
+    """The outcome of a fuzzing run.
+
+    === Public Attributes ===
+    cases, turns:
+        the number of cases played, and the number of turns of each
+    reference_seconds, candidate_seconds:
+        the time each engine took to play every case, without hashing
+    mismatch:
+        the first mismatch found, or None if the engines always agreed
+    """
+    cases: int
+    turns: int
+    reference_seconds: float
+    candidate_seconds: float
+    mismatch: Optional[Mismatch]
+
+    def __init__(self, cases: int, turns: int, reference_seconds: float,
+                 candidate_seconds: float,
+                 mismatch: Optional[Mismatch]) -> None:
+        """Initialize a report."""
+        self.cases, self.turns = cases, turns
+        self.reference_seconds = reference_seconds
+        self.candidate_seconds = candidate_seconds
+        self.mismatch = mismatch
+
+    @property
+    def speedup(self) -> float:
+        """How many times faster the candidate played than the reference."""
+        return self.reference_seconds / max(self.candidate_seconds, 1e-9)
+
+    def __str__(self) -> str:
+        """Return a printable summary of this report."""
+        steps = self.cases * self.turns
+        lines = [f'{self.cases} cases x {self.turns} turns',
+                 f'reference: {self.reference_seconds:.3f}s '
+                 f'({steps / max(self.reference_seconds, 1e-9):.0f} '
+                 f'turns/s)',
+                 f'candidate: {self.candidate_seconds:.3f}s '
+                 f'({steps / max(self.candidate_seconds, 1e-9):.0f} '
+                 f'turns/s)',
+                 f'speedup:   {self.speedup:.1f}x']
+        lines.append('no mismatch' if self.mismatch is None
+                     else str(self.mismatch))
+        return '\n'.join(lines)
+
+
+def random_cases(num: int, width: int, height: int, turns: int,
+                 seed: int) -> List[Case]:
+    """Return <num> random cases of <turns> moves on <width> by <height>
+    boards, all drawn from <seed>. The number of raccoons, cans and bins
+    varies from case to case.
+    """
+    rng = np.random.default_rng(seed)
+    area = width * height
+    cases = []
+    for i in range(num):
+        raccoons = int(rng.integers(1, max(2, area // 8)))
+        cans = int(rng.integers(0, max(1, area // 8)))
+        bins = int(rng.integers(0, max(1, (area - 1 - raccoons - cans) // 2)))
+        board = a1.GameBoard(width, height, seed * num + i)
+        populate_board(board, raccoons, cans, bins)
+        moves = rng.integers(NO_MOVE, 4, turns).tolist()
+        cases.append((str(board), seed * num + i, moves))
+    return cases
+
+
+def _play(case: Case, candidate: Engine) -> Tuple[bool, str, str]:
+    """Play <case> on both engines, and return whether any state differed
+    along the way, and the final state of each engine's board."""
+    moves = np.array(case[2], dtype=np.int64).reshape(-1, 1)
+    expected, ref_boards = run_reference([case_board(case)], moves)
+    actual, cand_boards = candidate([case_board(case)], moves, True)
+    return expected != actual, ref_boards[0], cand_boards[0]
+
+
+def _fails(case: Case, candidate: Engine) -> bool:
+    """Return whether the engines disagree at some point of <case>."""
+    return len(case[2]) > 0 and _play(case, candidate)[0]
+
+
+def minimise(case: Case, turn: int, candidate: Engine) -> Case:
+    """Return a smaller version of <case>, on which the engines disagree
+    after <turn> turns, that still makes them disagree.
+    """
+    grid, seed, moves = case
+    moves = moves[:turn]
+    # stay still wherever that keeps the failure, latest moves first
+    for i in reversed(range(len(moves))):
+        if moves[i] != NO_MOVE:
+            trial = moves[:i] + [NO_MOVE] + moves[i + 1:]
+            if _fails((grid, seed, trial), candidate):
+                moves = trial
+    # remove every Character but the Player that is not needed
+    for i, char in enumerate(grid):
+        if char not in '-P\n':
+            trial = grid[:i] + '-' + grid[i + 1:]
+            if _fails((trial, seed, moves), candidate):
+                grid = trial
+    # drop trailing moves that are not needed
+    while len(moves) > 1 and _fails((grid, seed, moves[:-1]), candidate):
+        moves = moves[:-1]
+    return grid, seed, moves
+
+
+def fuzz(cases: List[Case], candidate: Engine = run_batch) -> FuzzReport:
+    """Play <cases>, which must all have boards of the same size and the
+    same number of moves, on the reference engine and on <candidate>, and
+    return the report of the run.
+
+    >>> report = fuzz(random_cases(20, 6, 5, 50, seed=0))
+    >>> report.cases, report.turns, report.mismatch is None
+    (20, 50, True)
+    """
+    moves = np.array([c[2] for c in cases], dtype=np.int64).T
+
+    start = time.perf_counter()
+    run_reference([case_board(c) for c in cases], moves, False)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    candidate([case_board(c) for c in cases], moves, False)
+    candidate_seconds = time.perf_counter() - start
+
+    expected, _ = run_reference([case_board(c) for c in cases], moves)
+    actual, _ = candidate([case_board(c) for c in cases], moves, True)
+    mismatch = None
+    for turn, (exp_row, act_row) in enumerate(zip(expected, actual)):
+        bad = [i for i, (e, a) in enumerate(zip(exp_row, act_row)) if e != a]
+        if bad:
+            i = bad[0]
+            small = minimise(cases[i], turn + 1, candidate)
+            _, ref_text, cand_text = _play(small, candidate)
+            mismatch = Mismatch(i, turn + 1, small, ref_text, cand_text)
+            break
+    return FuzzReport(len(cases), moves.shape[0], reference_seconds,
+                      candidate_seconds, mismatch)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', default='batch', choices=CANDIDATES)
+    parser.add_argument('--cases', type=int, default=200)
+    parser.add_argument('--turns', type=int, default=300)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    fuzz_report = fuzz(random_cases(args.cases, args.width, args.height,
+                                    args.turns, args.seed),
+                       CANDIDATES[args.engine])
+    print(fuzz_report)
+    if fuzz_report.mismatch is not None:
+        sys.exit(1)
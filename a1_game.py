@@ -1,35 +1,71 @@
+from __future__ import annotations
+
 import sys
-from random import random, shuffle
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-import pygame
 import a1
-
-# Feel free to modify any of these constant values.
+# everything headless is imported from a1_headless, where it used to be
+# defined here, so that code importing it from this module keeps working
+from a1_headless import BOARD_WIDTH, BOARD_HEIGHT, NUM_RACCOONS, \
+    NUM_GARBAGE_CANS, NUM_RECYCLING_BINS, FRACTION_LOCKED, FRACTION_SMART, \
+    populate_board, SCRIPT_MOVES, parse_script, run_script, read_board, \
+    DEFAULT_BOARD, parse_args, game_string, play_headless
+from a1_telemetry import Telemetry
+
+__all__ = [
+    # defined here
+    'SCREEN_WIDTH', 'SCREEN_HEIGHT', 'LOOP_DELAY', 'INPUT_QUEUE_SIZE',
+    'MOVES_PER_TURN', 'FRAME_POLL_DELAY', 'SHOW_TELEMETRY',
+    'METRICS_INTERVAL', 'PRINT_BOARDS', 'BACKGROUND_ICON',
+    'GARBAGE_CAN_OPEN_ICON', 'GARBAGE_CAN_CLOSED_ICON', 'PERSON_ICON',
+    'SMART_RACCOON_ICON', 'RACCOON_ICON', 'RECYCLING_ICON',
+    'RACCOON_IN_BIN_ICON', 'make_image', 'BoardSnapshot', 'LatestSlot',
+    'RaccoonRaiders',
+    # re-exported from a1_headless
+    'BOARD_WIDTH', 'BOARD_HEIGHT', 'NUM_RACCOONS', 'NUM_GARBAGE_CANS',
+    'NUM_RECYCLING_BINS', 'FRACTION_LOCKED', 'FRACTION_SMART',
+    'populate_board', 'SCRIPT_MOVES', 'parse_script', 'run_script',
+    'read_board', 'DEFAULT_BOARD', 'parse_args', 'game_string',
+    'play_headless']
+
+# pygame is only imported by the methods opening and drawing a game window,
+# so that the headless mode (and every module importing this one) starts
+# without loading pygame and SDL.
+if TYPE_CHECKING:
+    import pygame
+
+# Feel free to modify any of these constant values. The size of random
+# boards and the Characters on them are set up in a1_headless.
 
 # Game Screen dimensions in pixels
 SCREEN_WIDTH = 1500  # 1165
 SCREEN_HEIGHT = 600  # 733
 
-# Dimensions of the game board, in squares.
-BOARD_WIDTH = 10  # 20
-BOARD_HEIGHT = 10  # 15
-
-# Number of each type of Character to include in a random game
-NUM_RACCOONS = 4
-NUM_GARBAGE_CANS = 4
-NUM_RECYCLING_BINS = int(BOARD_HEIGHT * BOARD_WIDTH * 0.25)
-
 # Number of milliseconds to wait between iterations of the main game loop.
 # This changes the speed of the game. The main player can move at most
 # once every LOOP_DELAY milliseconds.
 LOOP_DELAY = 100
 
-# Fraction of garbage cans that are to be locked at the start of the game.
-FRACTION_LOCKED = 0.1
+# Number of arrow key presses buffered for the Player, and the number of
+# them the Player acts on per turn: presses made faster than that are kept
+# for the next turns instead of being lost (up to the buffer size).
+INPUT_QUEUE_SIZE = 4
+MOVES_PER_TURN = 1
 
-# Fraction of "smart" raccoons
-FRACTION_SMART = 0.5
+# Number of milliseconds the main thread waits for a new frame before it
+# polls for user input again, when the game is played with a render thread.
+FRAME_POLL_DELAY = 5
+
+# Whether to show the performance telemetry overlay (see a1_telemetry), and
+# the number of seconds between two reports written to the metrics file.
+SHOW_TELEMETRY = True
+METRICS_INTERVAL = 5.0
+
+# Whether to print every new board state to the terminal. This is slow on
+# big boards: its cost shows up in the draw time of the telemetry.
+PRINT_BOARDS = True
 
 # Character icons
 BACKGROUND_ICON = 'icons/background.png'
@@ -47,10 +83,132 @@ def make_image(icon_file: str, width: int, height: int) -> pygame.surface:
     A helper function for loading <icon_file> as a pygame image
     and scaling it to have dimensions <width> and <height>
     """
+    import pygame
     pic = pygame.image.load(icon_file)
     return pygame.transform.scale(pic, (width, height))
 
 
+class BoardSnapshot:
+    """A copy of the state of a board at one point of the game, which is
+    never modified, so it can be handed over from one thread to another.
+
+    === Public Attributes ===
+    width, height:
+        the size of the board, in squares
+    tiles:
+        the letter shown on every tile, as in GameBoard.char_grid: byte
+        y * width + x is the letter of tile (x, y)
+    turns:
+        the number of turns taken when the snapshot was taken
+    ended:
+        whether the game had ended
+    input_time:
+        the perf_counter time the last user input applied to the board by
+        then was made at, or None if there was none
+
+    === Sample Usage ===
+    >>> b = a1.GameBoard(1, 1)
+    >>> b.setup_from_grid('P-\\nBR')
+    >>> snap = BoardSnapshot(b)
+    >>> snap.tiles, snap.char_at(1, 1)
+    (b'P-BR', 'R')
+    >>> print(snap)
+    P-
+    BR
+    """
+    width: int
+    height: int
+    tiles: bytes
+    turns: int
+    ended: bool
+    input_time: Optional[float]
+
+    def __init__(self, board: a1.GameBoard,
+                 input_time: Optional[float] = None) -> None:
+        """Initialize a snapshot of the current state of <board>, to which
+        the last user input applied was made at <input_time>."""
+        self.width, self.height = board.width, board.height
+        self.tiles = bytes(board.char_grid())
+        self.turns = board.turns
+        self.ended = board.ended
+        self.input_time = input_time
+
+    def char_at(self, x: int, y: int) -> chr:
+        """Return the letter of tile (<x>, <y>)."""
+        return chr(self.tiles[y * self.width + x])
+
+    def __str__(self) -> str:
+        """Return the board in the format of GameBoard.__str__."""
+        w = self.width
+        return '\n'.join(self.tiles[y * w:(y + 1) * w].decode('ascii')
+                         for y in range(self.height))
+
+
+class LatestSlot:
+    """A one-item mailbox between threads, which only keeps the newest item:
+    putting an item replaces the item waiting to be taken, if any, and that
+    item is dropped.
+
+    === Public Attributes ===
+    dropped:
+        the number of items replaced before they were taken
+    closed:
+        whether no more items will be put
+
+    === Sample Usage ===
+    >>> slot = LatestSlot()
+    >>> slot.put(1)
+    >>> slot.put(2)
+    >>> slot.take(), slot.dropped
+    (2, 1)
+    >>> slot.close()
+    >>> slot.take() is None
+    True
+    """
+    # === Private Attributes ===
+    # _item:
+    #   the item waiting to be taken, or None
+    # _cond:
+    #   the condition taking threads wait on for an item
+
+    dropped: int
+    closed: bool
+    _item: Any
+    _cond: threading.Condition
+
+    def __init__(self) -> None:
+        """Initialize an empty, open slot."""
+        self.dropped = 0
+        self.closed = False
+        self._item = None
+        self._cond = threading.Condition()
+
+    def put(self, item: Any) -> None:
+        """Make <item> (which is not None) the item waiting to be taken."""
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Record that no more items will be put."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def take(self, timeout: Optional[float] = None) -> Any:
+        """Take the waiting item, waiting up to <timeout> seconds (forever if
+        <timeout> is None) for one. Return None if there is still none by
+        then, or if the slot is closed and empty.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self.closed,
+                                timeout)
+            item, self._item = self._item, None
+            return item
+
+
 class RaccoonRaiders:
     """The user interface for the Raccoon Raiders game!
 
@@ -61,6 +219,8 @@ class RaccoonRaiders:
         height of the underlying game board
     square_size:
         size of each square in the game
+    telemetry:
+        the performance measurements of this game
     """
     # === Private Attributes ===
     # _board:
@@ -72,25 +232,66 @@ class RaccoonRaiders:
     # _background_tile:
     #     image icon for the background
     # _last_state:
-    #     the string representation of the last board state that was drawn
+    #     the snapshot of the last board state that was drawn
+    # _canvas:
+    #     the off-screen surface the render thread draws on
+    # _snapshots:
+    #     the board snapshots published by the simulation thread for the
+    #     render thread
+    # _frames:
+    #     the snapshots and frames drawn by the render thread, for the main
+    #     thread to show
+    # _pending_events:
+    #     the directions the user pressed since the simulation thread last
+    #     took them, in order, and the perf_counter time of the last one
+    # _input_time:
+    #     the perf_counter time of the last user input applied to the board,
+    #     or None
+    # _shown_input_time:
+    #     the input_time of the last frame shown
+    # _font:
+    #     the font of the telemetry overlay
+    # _input_lock:
+    #     the lock guarding _pending_events
+    # _stop:
+    #     set to stop the simulation thread
 
     width: int
     height: int
     square_size: int
+    telemetry: Telemetry
     _board: a1.GameBoard
     _screen: pygame.Surface
     _icon_map: Dict[chr, pygame.Surface]
     _background_tile: pygame.Surface
-    _last_state: Optional[List[List[chr]]]
-
-    def __init__(self, w: int, h: int, board_string: str = "") -> None:
+    _last_state: Optional[BoardSnapshot]
+    _canvas: pygame.Surface
+    _snapshots: LatestSlot
+    _frames: LatestSlot
+    _pending_events: Tuple[List[Tuple[int, int]], float]
+    _input_time: Optional[float]
+    _shown_input_time: Optional[float]
+    _input_lock: threading.Lock
+    _stop: threading.Event
+    _font: pygame.font.Font
+
+    def __init__(self, w: int, h: int, board_string: str = "",
+                 seed: Optional[int] = None,
+                 metrics_path: Optional[str] = None) -> None:
         """Initialize this game to be of the given width <w> and height <h> in
         squares. If <board_string> is not specified, then a random board
         is generated. Otherwise, GameBoard.setup_from_grid is used to populate
         the board.
+
+        Everything random in the game is drawn from a generator seeded with
+        <seed>, or from the operating system if <seed> is None.
+
+        If <metrics_path> is given, a report of the telemetry is appended to
+        that file every METRICS_INTERVAL seconds.
         """
+        import pygame
 
-        self._board = a1.GameBoard(w, h)
+        self._board = a1.GameBoard(w, h, seed)
 
         if board_string:
             self._board.setup_from_grid(board_string)
@@ -99,6 +300,7 @@ class RaccoonRaiders:
                            NUM_RACCOONS,
                            NUM_GARBAGE_CANS,
                            NUM_RECYCLING_BINS)
+        self._board.set_input_queue(INPUT_QUEUE_SIZE, MOVES_PER_TURN)
 
         self.square_size = min(int(SCREEN_WIDTH / w),
                                int(SCREEN_HEIGHT / h))
@@ -118,6 +320,7 @@ class RaccoonRaiders:
 
         self._icon_map = {'R': image_loader(RACCOON_ICON),
                           'S': image_loader(SMART_RACCOON_ICON),
+                          'T': image_loader(SMART_RACCOON_ICON),
                           'C': image_loader(GARBAGE_CAN_CLOSED_ICON),
                           'O': image_loader(GARBAGE_CAN_OPEN_ICON),
                           '@': image_loader(RACCOON_IN_BIN_ICON),
@@ -128,44 +331,97 @@ class RaccoonRaiders:
         self._last_state = None
         self.height, self.width = self._board.height, self._board.width
 
+        self._canvas = pygame.Surface(self._screen.get_size())
+        self._snapshots = LatestSlot()
+        self._frames = LatestSlot()
+        self._pending_events = ([], 0.0)
+        self._input_time = None
+        self._shown_input_time = None
+        self._input_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        out = open(metrics_path, 'a') if metrics_path is not None else None
+        self.telemetry = Telemetry(out, METRICS_INTERVAL)
+        pygame.font.init()
+        self._font = pygame.font.Font(pygame.font.get_default_font(), 14)
+
     def draw(self) -> None:
         """
         Draw the given board state using pygame and also print it to the
         terminal in a text representation.
         """
-        state = self._board.to_grid()
-        changed = self._last_state != state
-        if changed:  # also print the board to the console, feel free to remove
-            print(f'\n{self._board}')
-        self._last_state = state
-
-        for x in range(len(state[0])):  # will fail until Task #1 is done
-            for y in range(len(state)):
-                c = state[y][x]
-                rectangle = pygame.Rect(x * self.square_size,
-                                        y * self.square_size,
-                                        self.square_size, self.square_size)
-                # Draw the icon onto the rectangle.
-                self._screen.blit(self._background_tile, (x * self.square_size,
-                                                          y * self.square_size))
-                if c in self._icon_map:
-                    self._screen.blit(self._icon_map[c], rectangle)
+        start = time.perf_counter()
+        snapshot = BoardSnapshot(self._board, self._input_time)
+        self._render(self._screen, snapshot, None)
+        self._last_state = snapshot
+        self.telemetry.record('draw', time.perf_counter() - start)
 
         # Update the screen.
+        self._show(snapshot)
+
+    def _show(self, snapshot: BoardSnapshot) -> None:
+        """Show the screen, on which <snapshot> was just drawn, with the
+        telemetry overlay, and record the frame in the telemetry."""
+        import pygame
+        if SHOW_TELEMETRY:
+            text = self._font.render(self.telemetry.summary(), True,
+                                     (255, 255, 255), (0, 0, 0))
+            self._screen.blit(text, (0, 0))
         pygame.display.flip()
+        now = time.perf_counter()
+        self.telemetry.frame_shown(now)
+        if snapshot.input_time is not None \
+                and snapshot.input_time != self._shown_input_time:
+            self.telemetry.record('latency', now - snapshot.input_time)
+            self._shown_input_time = snapshot.input_time
+        self.telemetry.maybe_write_report(now)
+
+    def _render(self, surface: pygame.Surface, snapshot: BoardSnapshot,
+                previous: Optional[BoardSnapshot]) -> None:
+        """Draw <snapshot> on <surface>, which already shows <previous> (if
+        it is not None), so only the tiles that differ are drawn again. Print
+        the board to the terminal if it changed since the last one drawn.
+        """
+        last = self._last_state
+        if PRINT_BOARDS and (last is None or last.tiles != snapshot.tiles):
+            print(f'\n{snapshot}')
+
+        size = self.square_size
+        for y in range(snapshot.height):
+            for x in range(snapshot.width):
+                c = snapshot.char_at(x, y)
+                if previous is not None and previous.char_at(x, y) == c:
+                    continue
+                # Draw the icon onto the tile.
+                surface.blit(self._background_tile, (x * size, y * size))
+                if c in self._icon_map:
+                    surface.blit(self._icon_map[c], (x * size, y * size))
 
-    def play(self) -> None:
+    def play(self, threaded: bool = True) -> None:
         """
         Play the game!
+
+        If <threaded>, the game is simulated and drawn on threads of their
+        own (see _play_threaded), so slow drawing never holds up the
+        game. Otherwise inputs, turns and drawing all happen one after the
+        other on this thread.
         """
-        while not self._board.ended:
-            pygame.time.wait(LOOP_DELAY)
-            # Handle all inputs that are in the event queue,
-            # i.e., that occurred since the last iteration.
-            self._handle_user_input()
+        import pygame
+        if threaded:
+            self._play_threaded()
+        else:
+            while not self._board.ended:
+                pygame.time.wait(LOOP_DELAY)
+                # Handle all inputs that are in the event queue,
+                # i.e., that occurred since the last iteration.
+                self._handle_user_input()
+
+        self.telemetry.write_report()
+        if self.telemetry.out is not None:
+            self.telemetry.out.close()
 
         # game has ended, print message
-        score = self._board.check_game_end()
+        score = self._board.result().score
         print(f"Game has ended. Your score is {score}")
 
         pygame.font.init()
@@ -190,9 +446,26 @@ class RaccoonRaiders:
         """Handle user input, give characters their turns, and
         redraw the game board.
         """
+        directions = self._poll_directions()
+        if directions:
+            self._board.handle_events(directions)
+            self._input_time = time.perf_counter()
+        # Give every character a turn in the game and draw the board.
+        start = time.perf_counter()
+        self._board.give_turns()
+        self.telemetry.record('tick', time.perf_counter() - start)
+        self.draw()
+
+    def _poll_directions(self) -> List[Tuple[int, int]]:
+        """Return the directions of the arrow keys pressed since the last
+        call, in order. Exit if the user closed the window.
+        """
+        import pygame
+        directions = []
         for event in pygame.event.get():  # process all key presses
             # Stop if user closed the window.
             if event.type == pygame.constants.QUIT:
+                self._stop.set()
                 sys.exit()
             if event.type == pygame.constants.KEYDOWN:
                 dx, dy = None, None
@@ -205,83 +478,92 @@ class RaccoonRaiders:
                 if event.key == pygame.constants.K_UP:
                     dx, dy = 0, -1
                 if dx is not None:
-                    self._board.handle_event((dx, dy))
-        # Give every character a turn in the game and draw the board.
-        self._board.give_turns()
-        self.draw()
-
-
-# this depends on your place_character method in the GameBoard class
-# in order to work, since
-# Character.__init__ relies on GameBoard.place_character!
-def populate_board(board: a1.GameBoard, num_raccoons: int,
-                   num_cans: int, num_bins: int) -> None:
-    """Place characters on this board.
-
-    The board will have one player at the top-left corner of the board,
-    and the given number of raccoons, garbage cans and recycling bins
-    all at random, not already occupied, locations on the board.
-
-    FRACTION_LOCKED and FRACTION_SMART dictate the probability that
-    each GarbageCan is locked and
-    each Raccoon is a SmartRaccoon, respectively.
-
-     Precondition:
-        - num_raccoons >= 0
-        - num_cans >= 0
-        - num_bins >= 0
-        - num_raccoons + num_bins + num_cans + 1 <= number of locations
-          on the board!
-        - board is initially empty
-
-    >>> b = a1.GameBoard(3, 1)
-    >>> populate_board(b,1,0,1)
-    >>> str(b) in ['PRB', 'PBR', 'PSB', 'PBS']
-    True
-    """
-    a1.Player(board, 0, 0)
-
-    # get the set of all possible locations on the board and
-    # randomly place characters in them.
-    availables = []
-    for i in range(board.width):
-        for j in range(board.height):
-            availables.append((i, j))
-    availables.remove((0, 0))
-
-    shuffle(availables)
-
-    for _ in range(num_raccoons):
-        x, y = availables.pop()
-        if random() <= FRACTION_SMART:
-            a1.SmartRaccoon(board, x, y)
-        else:
-            a1.Raccoon(board, x, y)
-
-    for _ in range(num_cans):
-        x, y = availables.pop()
-        locked = random() <= FRACTION_LOCKED
-        a1.GarbageCan(board, x, y, locked)
+                    directions.append((dx, dy))
+        return directions
+
+    def _play_threaded(self) -> None:
+        """Play the game until it ends, as a pipeline of three threads:
+        - the simulation thread gives turns every LOOP_DELAY milliseconds,
+          and publishes a snapshot of the board after each,
+        - the render thread draws the latest snapshot off-screen, and hands
+          the frame over to the main thread,
+        - the main (this) thread polls for user input, and shows the latest
+          frame.
+        Each hand-over only keeps the newest item, so snapshots the render
+        thread cannot keep up with, and frames the main thread cannot keep up
+        with, are dropped instead of slowing the game down.
+        """
+        self._snapshots.put(BoardSnapshot(self._board))
+        threads = [threading.Thread(target=self._simulate, daemon=True),
+                   threading.Thread(target=self._render_frames, daemon=True)]
+        for thread in threads:
+            thread.start()
 
-    for _ in range(num_bins):
-        x, y = availables.pop()
-        a1.RecyclingBin(board, x, y)
+        while True:
+            directions = self._poll_directions()
+            if directions:
+                with self._input_lock:
+                    self._pending_events = (self._pending_events[0]
+                                            + directions, time.perf_counter())
+            frame = self._frames.take(FRAME_POLL_DELAY / 1000)
+            if frame is not None:
+                snapshot, surface = frame
+                self._screen.blit(surface, (0, 0))
+                self._show(snapshot)
+            elif self._frames.closed:
+                break
+        for thread in threads:
+            thread.join()
+
+    def _simulate(self) -> None:
+        """Give turns every LOOP_DELAY milliseconds until the game ends,
+        publishing a snapshot of the board after each turn. This runs on the
+        simulation thread, which is the only one touching the board.
+        """
+        next_turn = time.perf_counter()
+        while not self._board.ended:
+            next_turn += LOOP_DELAY / 1000
+            if self._stop.wait(max(0.0, next_turn - time.perf_counter())):
+                break
+            with self._input_lock:
+                (events, pressed), self._pending_events = \
+                    self._pending_events, ([], 0.0)
+            if events:
+                self._board.handle_events(events)
+                self._input_time = pressed
+            start = time.perf_counter()
+            self._board.give_turns()
+            self.telemetry.record('tick', time.perf_counter() - start)
+            self._snapshots.put(BoardSnapshot(self._board, self._input_time))
+        self._snapshots.close()
+
+    def _render_frames(self) -> None:
+        """Draw the latest snapshot published by the simulation thread on
+        the canvas, and hand a copy of it over to the main thread, until the
+        simulation thread is done. This runs on the render thread.
+        """
+        previous = None
+        while True:
+            snapshot = self._snapshots.take()
+            if snapshot is None:
+                break
+            start = time.perf_counter()
+            self._render(self._canvas, snapshot, previous)
+            self._last_state = previous = snapshot
+            self._frames.put((snapshot, self._canvas.copy()))
+            self.telemetry.record('draw', time.perf_counter() - start)
+        self._frames.close()
 
 
 if __name__ == '__main__':
-    random_game = False  # set to True to play on a random board
-    if random_game:
-        rc = RaccoonRaiders(BOARD_WIDTH,
-                            BOARD_HEIGHT)
-        # for random board, you can adjust settings at top of this file
+    cli_args = parse_args()
+    cli_game_string = game_string(cli_args)
+    if cli_args.script is not None:
+        play_headless(cli_args)
+    elif cli_game_string:
+        lines = cli_game_string.split('\n')
+        RaccoonRaiders(len(lines[0]), len(lines), cli_game_string,
+                       cli_args.seed, cli_args.metrics).play()
     else:
-        # game board from handout animation
-        game_string = "P-O----S\n---BBB-\n------B-\n-BRBB-O-\n" \
-                      "---B-B--\n--O---S-"
-        rc = RaccoonRaiders(8, 6, game_string)
-
-        # uncomment the below for bin moving demo in handout
-        # game_string = "R-P-B-BB--O "
-        # rc = RaccoonRaiders(len(game_string), 1, game_string)
-
-    rc.play()
+        RaccoonRaiders(BOARD_WIDTH, BOARD_HEIGHT, seed=cli_args.seed,
+                       metrics_path=cli_args.metrics).play()
@@ -0,0 +1,303 @@
+"""The character grid of a board: the letter shown on every tile.
+
+GameBoard extends CharGrid and keeps the grid up to date as its Characters
+change (see GameBoard.refresh_tile), so that everything that only depends on
+what the board looks like -- writing it out, the moves open to a Raccoon,
+the changes made by a turn, the free space and the distances to GarbageCans
+-- reads the grid instead of looking at Characters.
+
+a1 imports this module, so doctests import a1 themselves.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from a1_freespace import FreeSpaceIndex, changes_paths, find_distances
+
+# Letters of the tiles a Raccoon can move onto: empty tiles and GarbageCans
+# with no Raccoon inside
+RACCOON_ENTERABLE = '-OC'
+_ENTERABLE_CODES = RACCOON_ENTERABLE.encode('ascii')
+
+
+class CharGrid:
+    """The letter (as in GameBoard.to_grid) shown on every tile of a board.
+
+    This class is abstract and should not be directly instantiated.
+
+    === Public Attributes ===
+    width:
+        the number of squares wide the board is
+    height:
+        the number of squares high the board is
+
+    === Representation Invariants ===
+    width > 0
+    height > 0
+    """
+    # === Private Attributes ===
+    # _grid:
+    #    The letter shown on every tile of the board, as one byte per tile:
+    #    byte y * width + x is the letter of tile (x, y). It is kept up to
+    #    date by calling _set_letter whenever a tile changes, so that reading
+    #    the whole board never has to look at its Characters.
+    # _version:
+    #    The number of tile changes made on this board so far. Anything
+    #    derived from the state of the board can be cached along with the
+    #    _version it was derived at, and reused while _version is unchanged.
+    # _distances:
+    #    The distance field shared by all TrackingRaccoons (see
+    #    distance_field), or None if it has to be recomputed, which
+    #    _set_letter sets it to whenever a tile changes in a way that could
+    #    change a distance.
+    # _free_space:
+    #    The FreeSpaceIndex of this board, or None until it is first needed.
+    #    Once built, it is kept up to date by _set_letter.
+    # _changes:
+    #    While a turn is given, maps the index (as in _grid) of every tile
+    #    changed so far during the turn to its letter code before the turn;
+    #    None between turns.
+    # _last_changes:
+    #    The tiles changed by the last turn, as returned by last_changes.
+
+    width: int
+    height: int
+    _grid: bytearray
+    _version: int
+    _distances: Optional[List[int]]
+    _free_space: Optional[FreeSpaceIndex]
+    _changes: Optional[Dict[int, int]]
+    _last_changes: List[Tuple[int, int, str, str]]
+
+    def __init__(self, w: int, h: int) -> None:
+        """Initialize the grid of an empty <w> by <h> board."""
+        self.width = w
+        self.height = h
+        self._grid = bytearray(b'-' * (w * h))
+        self._version = 0
+        self._distances = None
+        self._free_space = None
+        self._changes = None
+        self._last_changes = []
+
+    def _set_letter(self, x: int, y: int, letter: str) -> None:
+        """Record that tile (<x>, <y>) now shows <letter>, keeping everything
+        derived from the grid up to date."""
+        self._version += 1
+        i = y * self.width + x
+        old, new = self._grid[i], ord(letter)
+        self._grid[i] = new
+        if old != new:
+            if self._free_space is not None:
+                self._free_space.update(i, old, new)
+            if changes_paths(old, new):
+                self._distances = None
+        if self._changes is not None and i not in self._changes:
+            self._changes[i] = old
+
+    def _start_turn(self) -> None:
+        """Start recording the tiles changed by a turn."""
+        self._changes = {}
+
+    def _end_turn(self) -> None:
+        """Stop recording the tiles changed by the turn, and make them the
+        last changes."""
+        changes, self._changes = self._changes, None
+        grid, w = self._grid, self.width
+        self._last_changes = [(i % w, i // w, chr(changes[i]), chr(grid[i]))
+                              for i in sorted(changes)
+                              if changes[i] != grid[i]]
+
+    def rows(self, x: int = 0, y: int = 0, w: Optional[int] = None,
+             h: Optional[int] = None) -> Iterator[str]:
+        """Yield the rows of the <w> by <h> window of this board whose top-left
+        tile is (<x>, <y>), one string per row, top to bottom, using the same
+        letters as to_grid. The window is clipped to the board, and extends to
+        the right and bottom edges of the board if <w> or <h> is None.
+
+        Rows are produced one at a time, so serializing a large board never
+        holds more than one row in memory. They are copied straight out of
+        the board's character grid, without looking at any Character.
+
+        >>> import a1
+        >>> b = a1.GameBoard(4, 3)
+        >>> _ = a1.Player(b, 0, 0)
+        >>> _ = a1.RecyclingBin(b, 2, 1)
+        >>> list(b.rows())
+        ['P---', '--B-', '----']
+        >>> list(b.rows(1, 1, 2, 5))
+        ['-B', '--']
+        """
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = self.width if w is None else min(x + w, self.width)
+        y1 = self.height if h is None else min(y + h, self.height)
+        grid = self._grid
+        for j in range(y0, y1):
+            start = j * self.width
+            yield grid[start + x0:start + x1].decode('ascii')
+
+    def write_grid(self, out: TextIO, x: int = 0, y: int = 0,
+                   w: Optional[int] = None, h: Optional[int] = None) -> None:
+        """Write the <w> by <h> window of this board whose top-left tile is
+        (<x>, <y>) to the text stream <out>, streaming one row at a time.
+
+        The format is the same as __str__ (and setup_from_grid), followed by
+        a newline. See rows for how the window is chosen.
+
+        >>> import a1, sys
+        >>> b = a1.GameBoard(3, 2)
+        >>> _ = a1.Raccoon(b, 1, 1)
+        >>> b.write_grid(sys.stdout)
+        ---
+        -R-
+        >>> b.write_grid(sys.stdout, 1, 0, 2, 2)
+        --
+        R-
+        """
+        for row in self.rows(x, y, w, h):
+            out.write(row)
+            out.write('\n')
+
+    def char_at(self, x: int, y: int) -> chr:
+        """Return the letter to_grid uses for tile (<x>, <y>).
+
+        Precondition:
+        self.on_board(x, y)
+
+        >>> import a1
+        >>> b = a1.GameBoard(3, 2)
+        >>> _ = a1.GarbageCan(b, 2, 1, True)
+        >>> b.char_at(2, 1), b.char_at(0, 0)
+        ('C', '-')
+        """
+        return chr(self._grid[y * self.width + x])
+
+    def raccoon_moves(self, x: int, y: int) -> int:
+        """Return the neighbour mask of tile (<x>, <y>): an int whose bit i is
+        set iff a Raccoon on (<x>, <y>) could move in direction DIRECTIONS[i],
+        i.e. that neighbour is on the board and is empty or holds a GarbageCan
+        with no Raccoon inside.
+
+        The four neighbours are each read once, straight from the character
+        grid, so every Raccoon method that needs to know where a Raccoon can
+        go shares this one computation.
+
+        Precondition:
+        self.on_board(x, y)
+
+        >>> import a1
+        >>> b = a1.GameBoard(3, 3)
+        >>> _ = a1.RecyclingBin(b, 1, 0)
+        >>> _ = a1.GarbageCan(b, 2, 1, True)
+        >>> b.raccoon_moves(1, 1) == 0b1101  # LEFT, RIGHT and DOWN
+        True
+        >>> b.raccoon_moves(0, 0) == 0b1000  # only DOWN
+        True
+        """
+        grid, w = self._grid, self.width
+        i = y * w + x
+        mask = 0
+        if x > 0 and grid[i - 1] in _ENTERABLE_CODES:
+            mask = 1  # LEFT
+        if y > 0 and grid[i - w] in _ENTERABLE_CODES:
+            mask |= 2  # UP
+        if x < w - 1 and grid[i + 1] in _ENTERABLE_CODES:
+            mask |= 4  # RIGHT
+        if y < self.height - 1 and grid[i + w] in _ENTERABLE_CODES:
+            mask |= 8  # DOWN
+        return mask
+
+    def char_grid(self) -> memoryview:
+        """Return a read-only view of the character grid of this board: one
+        byte per tile, holding the letter to_grid uses for that tile, with
+        tile (x, y) at index y * width + x.
+
+        The view always reflects the current state of the board; it is not a
+        copy.
+
+        >>> import a1
+        >>> b = a1.GameBoard(3, 2)
+        >>> g = b.char_grid()
+        >>> _ = a1.Raccoon(b, 1, 1)
+        >>> bytes(g)
+        b'----R-'
+        """
+        return memoryview(self._grid).toreadonly()
+
+    def last_changes(self) -> List[Tuple[int, int, str, str]]:
+        """Return the tiles changed by the last turn given with give_turns,
+        in row-major order, as (x, y, letter before, letter after), the
+        letters being those of to_grid. This covers every way a turn changes
+        the board: Characters moving, RecyclingBins being pushed, GarbageCans
+        being locked or unlocked and Raccoons going inside GarbageCans. A
+        tile that changed and changed back during the turn is left out.
+
+        Consumers of the board's state can apply these changes to a copy of
+        the previous state instead of comparing whole boards. Changes made
+        between turns (e.g. by placing Characters) are not included.
+
+        >>> import a1
+        >>> b = a1.GameBoard(3, 2)
+        >>> b.setup_from_grid('PB-\\n-RO')
+        >>> b.last_changes()
+        []
+        >>> b.handle_event(a1.RIGHT)
+        >>> b.give_turns()
+        >>> b.last_changes()
+        [(0, 0, 'P', '-'), (1, 0, 'B', 'P'), (2, 0, '-', 'B')]
+        """
+        return self._last_changes
+
+    def distance_field(self) -> List[int]:
+        """Return the distances from every tile to an unoccupied GarbageCan.
+
+        Entry y * width + x of the returned list is the number of raccoon
+        steps from tile (x, y) to the closest GarbageCan with no Raccoon in it,
+        or -1 if no such GarbageCan can be reached from (x, y). RecyclingBins
+        and occupied GarbageCans block the way; Raccoons and the Player do not,
+        since they will usually have moved by the time the way is taken.
+
+        The field is shared by every Raccoon: it is only computed again once
+        a tile changes in a way that could change a distance (see
+        a1_freespace.changes_paths), e.g. when a Raccoon climbs into a
+        GarbageCan, and not when Raccoons move around.
+
+        >>> import a1
+        >>> b = a1.GameBoard(4, 2)
+        >>> _ = a1.GarbageCan(b, 0, 0, True)
+        >>> _ = a1.RecyclingBin(b, 1, 0)
+        >>> b.distance_field()
+        [0, -1, 4, 5, 1, 2, 3, 4]
+        """
+        if self._distances is None:
+            self._distances = find_distances(self._grid, self.width,
+                                             self.height)
+        return self._distances
+
+    def free_space(self) -> FreeSpaceIndex:
+        """Return the free-space connectivity index of this board, building
+        it the first time it is needed. From then on it is updated as tiles
+        change, so it always reflects the current state of the board.
+        """
+        if self._free_space is None:
+            self._free_space = FreeSpaceIndex(self._grid, self.width,
+                                              self.height)
+        return self._free_space
+
+    def can_reach_can(self, x: int, y: int) -> bool:
+        """Return whether a Raccoon on tile (<x>, <y>) could still walk to a
+        GarbageCan with no Raccoon inside, if the Player and the other
+        Raccoons got out of its way and no RecyclingBin moved.
+
+        Precondition:
+        self.on_board(x, y)
+
+        >>> import a1
+        >>> b = a1.GameBoard(4, 2)
+        >>> _ = a1.RecyclingBin(b, 1, 0)
+        >>> _ = a1.RecyclingBin(b, 1, 1)
+        >>> _ = a1.GarbageCan(b, 3, 1, False)
+        >>> b.can_reach_can(0, 0), b.can_reach_can(2, 0)
+        (False, True)
+        """
+        return self.free_space().can_reach_can(y * self.width + x)
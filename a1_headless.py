@@ -0,0 +1,391 @@
+"""Board generation, simulation and scoring without the game window.
+
+Everything needed to set up and play games of Raccoon Raiders without a
+display lives here, away from a1_game, so that importing it never imports
+pygame: worker processes, servers and scripts start in the time it takes to
+import a1. a1_game uses this module too, and only imports pygame once a game
+window is opened.
+
+Play a script of moves headless with, e.g.:
+    echo RRD.L | python a1_headless.py --random --seed 3 --max-turns 500
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import a1
+
+# Feel free to modify any of these constant values.
+
+# Dimensions of the game board, in squares.
+BOARD_WIDTH = 10  # 20
+BOARD_HEIGHT = 10  # 15
+
+# Number of each type of Character to include in a random game
+NUM_RACCOONS = 4
+NUM_GARBAGE_CANS = 4
+NUM_RECYCLING_BINS = int(BOARD_HEIGHT * BOARD_WIDTH * 0.25)
+
+# Fraction of garbage cans that are to be locked at the start of the game.
+FRACTION_LOCKED = 0.1
+
+# Fraction of "smart" raccoons
+FRACTION_SMART = 0.5
+
+
+# this depends on your place_character method in the GameBoard class
+# in order to work, since
+# Character.__init__ relies on GameBoard.place_character!
+def populate_board(board: a1.GameBoard, num_raccoons: int,
+                   num_cans: int, num_bins: int,
+                   fraction_smart: Optional[float] = None,
+                   fraction_locked: Optional[float] = None) -> None:
+    """Place characters on this board.
+
+    The board will have one player at the top-left corner of the board,
+    and the given number of raccoons, garbage cans and recycling bins
+    all at random, not already occupied, locations on the board.
+
+    <fraction_locked> and <fraction_smart> (FRACTION_LOCKED and
+    FRACTION_SMART if they are None) dictate the probability that
+    each GarbageCan is locked and
+    each Raccoon is a SmartRaccoon, respectively.
+
+    All random choices are drawn from board.rng, so boards created with the
+    same seed are populated the same way.
+
+     Precondition:
+        - num_raccoons >= 0
+        - num_cans >= 0
+        - num_bins >= 0
+        - num_raccoons + num_bins + num_cans + 1 <= number of locations
+          on the board!
+        - board is initially empty
+
+    >>> b = a1.GameBoard(3, 1)
+    >>> populate_board(b,1,0,1)
+    >>> str(b) in ['PRB', 'PBR', 'PSB', 'PBS']
+    True
+    >>> b1, b2 = a1.GameBoard(5, 5, seed=7), a1.GameBoard(5, 5, seed=7)
+    >>> populate_board(b1, 3, 2, 6)
+    >>> populate_board(b2, 3, 2, 6)
+    >>> str(b1) == str(b2)
+    True
+    """
+    if fraction_smart is None:
+        fraction_smart = FRACTION_SMART
+    if fraction_locked is None:
+        fraction_locked = FRACTION_LOCKED
+    a1.Player(board, 0, 0)
+
+    # get the set of all possible locations on the board and
+    # randomly place characters in them.
+    availables = []
+    for i in range(board.width):
+        for j in range(board.height):
+            availables.append((i, j))
+    availables.remove((0, 0))
+
+    rng = board.rng
+    rng.shuffle(availables)
+
+    for _ in range(num_raccoons):
+        x, y = availables.pop()
+        if rng.random() <= fraction_smart:
+            a1.SmartRaccoon(board, x, y)
+        else:
+            a1.Raccoon(board, x, y)
+
+    for _ in range(num_cans):
+        x, y = availables.pop()
+        locked = rng.random() <= fraction_locked
+        a1.GarbageCan(board, x, y, locked)
+
+    for _ in range(num_bins):
+        x, y = availables.pop()
+        a1.RecyclingBin(board, x, y)
+
+
+class GameConfig:
+    """The tunable rules and setup of a game, so that boards playing by
+    different rules can live in the same process.
+
+    === Public Attributes ===
+    raccoon_turn_frequency:
+        the number of turns between two turns of the raccoons
+    num_raccoons, num_cans:
+        the number of raccoons and garbage cans on a random board
+    num_bins:
+        the number of recycling bins on a random board, or None for a
+        quarter of its tiles
+    fraction_smart, fraction_locked:
+        the probability that each raccoon is a SmartRaccoon, and that each
+        garbage can starts locked
+
+    === Sample Usage ===
+    >>> config = GameConfig(raccoon_turn_frequency=5, num_raccoons=2)
+    >>> b = config.make_board(6, 4, seed=1)
+    >>> b.raccoon_turn_frequency, len(b.get_raccoons())
+    (5, 2)
+    >>> GameConfig.from_dict(config.as_dict()) == config
+    True
+    """
+    raccoon_turn_frequency: int
+    num_raccoons: int
+    num_cans: int
+    num_bins: Optional[int]
+    fraction_smart: float
+    fraction_locked: float
+
+    def __init__(self, raccoon_turn_frequency: Optional[int] = None,
+                 num_raccoons: Optional[int] = None,
+                 num_cans: Optional[int] = None,
+                 num_bins: Optional[int] = None,
+                 fraction_smart: Optional[float] = None,
+                 fraction_locked: Optional[float] = None) -> None:
+        """Initialize a configuration. Every setting left as None (except
+        <num_bins>) takes the value of the matching constant:
+        a1.RACCOON_TURN_FREQUENCY, NUM_RACCOONS, NUM_GARBAGE_CANS,
+        FRACTION_SMART and FRACTION_LOCKED.
+
+        Raise ValueError if the raccoon turn frequency is below 1, a count is
+        negative, or a fraction is outside [0, 1].
+        """
+        def pick(value: object, default: object) -> object:
+            return default if value is None else value
+
+        self.raccoon_turn_frequency = pick(raccoon_turn_frequency,
+                                           a1.RACCOON_TURN_FREQUENCY)
+        self.num_raccoons = pick(num_raccoons, NUM_RACCOONS)
+        self.num_cans = pick(num_cans, NUM_GARBAGE_CANS)
+        self.num_bins = num_bins
+        self.fraction_smart = pick(fraction_smart, FRACTION_SMART)
+        self.fraction_locked = pick(fraction_locked, FRACTION_LOCKED)
+        if self.raccoon_turn_frequency < 1:
+            raise ValueError(f'raccoon_turn_frequency must be at least 1, '
+                             f'not {self.raccoon_turn_frequency}')
+        for name in ['num_raccoons', 'num_cans', 'num_bins']:
+            if getattr(self, name) is not None and getattr(self, name) < 0:
+                raise ValueError(f'{name} cannot be negative')
+        for name in ['fraction_smart', 'fraction_locked']:
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f'{name} must be between 0 and 1')
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, object]) -> GameConfig:
+        """Return the configuration whose settings are <values>, keyed by
+        attribute name; settings left out take their default value.
+
+        Raise ValueError if <values> holds an unknown setting.
+        """
+        unknown = set(values) - set(cls.__annotations__)
+        if unknown:
+            raise ValueError(f'unknown settings {sorted(unknown)}')
+        return cls(**values)
+
+    def as_dict(self) -> Dict[str, object]:
+        """Return every setting of this configuration, keyed by attribute
+        name."""
+        return {name: getattr(self, name) for name in self.__annotations__}
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether <other> is a configuration with the same
+        settings."""
+        return isinstance(other, GameConfig) \
+            and self.as_dict() == other.as_dict()
+
+    def __repr__(self) -> str:
+        """Return a string representation of this configuration."""
+        settings = ', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())
+        return f'GameConfig({settings})'
+
+    def bins_on(self, width: int, height: int) -> int:
+        """Return the number of recycling bins on a random <width> by
+        <height> board.
+
+        >>> GameConfig().bins_on(4, 3), GameConfig(num_bins=1).bins_on(4, 3)
+        (3, 1)
+        """
+        if self.num_bins is None:
+            return int(width * height * 0.25)
+        return self.num_bins
+
+    def check_fits(self, width: int, height: int) -> None:
+        """Raise ValueError if a random <width> by <height> board has no
+        room for the player and every Character of this configuration.
+
+        >>> GameConfig(num_raccoons=20).check_fits(5, 5)
+        Traceback (most recent call last):
+        ...
+        ValueError: 20 raccoons, 4 cans and 6 bins do not fit on a 5x5 board
+        """
+        num_bins = self.bins_on(width, height)
+        if 1 + self.num_raccoons + self.num_cans + num_bins > width * height:
+            raise ValueError(f'{self.num_raccoons} raccoons, {self.num_cans} '
+                             f'cans and {num_bins} bins do not fit on a '
+                             f'{width}x{height} board')
+
+    def make_board(self, width: int, height: int,
+                   seed: Optional[int] = None) -> a1.GameBoard:
+        """Return a new random <width> by <height> board whose rng is seeded
+        with <seed>, set up and playing by this configuration.
+
+        Raise ValueError if the board is too small for this configuration.
+        """
+        self.check_fits(width, height)
+        board = a1.GameBoard(width, height, seed)
+        board.raccoon_turn_frequency = self.raccoon_turn_frequency
+        populate_board(board, self.num_raccoons, self.num_cans,
+                       self.bins_on(width, height), self.fraction_smart,
+                       self.fraction_locked)
+        return board
+
+
+# Letters and words of the moves in a script, and the letter for staying
+# still for one turn.
+SCRIPT_MOVES = {'L': a1.LEFT, 'U': a1.UP, 'R': a1.RIGHT, 'D': a1.DOWN,
+                'LEFT': a1.LEFT, 'UP': a1.UP, 'RIGHT': a1.RIGHT,
+                'DOWN': a1.DOWN, '.': None}
+
+
+def parse_script(text: str) -> List[Optional[Tuple[int, int]]]:
+    """Return the moves of the script <text>, one per turn, with None for
+    staying still. A script is a sequence of the letters L, U, R, D and '.'
+    (stay still) and of the words LEFT, UP, RIGHT and DOWN, in any case,
+    separated by whitespace or not; everything after a '#' on a line is a
+    comment.
+
+    >>> parse_script('RRD. # to the can\\nleft UP') == [
+    ...     a1.RIGHT, a1.RIGHT, a1.DOWN, None, a1.LEFT, a1.UP]
+    True
+    """
+    moves = []
+    for line in text.splitlines():
+        for word in line.split('#', 1)[0].upper().split():
+            if word in SCRIPT_MOVES:
+                moves.append(SCRIPT_MOVES[word])
+            elif all(c in SCRIPT_MOVES for c in word):
+                moves.extend(SCRIPT_MOVES[c] for c in word)
+            else:
+                raise ValueError(f'invalid move {word!r} in script')
+    return moves
+
+
+def run_script(board: a1.GameBoard, moves: List[Optional[Tuple[int, int]]],
+               max_turns: Optional[int] = None) -> float:
+    """Play <moves> on <board>, one per turn, as fast as possible, until the
+    game ends or the moves run out; then, if <max_turns> is given, keep
+    giving turns with no move until the game ends or <max_turns> turns have
+    been taken. Return the number of seconds it took.
+
+    >>> b = a1.GameBoard(1, 1)
+    >>> b.setup_from_grid('P-B\\n--R')
+    >>> _ = run_script(b, parse_script('RD'))
+    >>> b.ended, b.turns, b.result().score
+    (True, 2, 11)
+    """
+    start = time.perf_counter()
+    for move in moves:
+        if board.ended:
+            break
+        if move is not None:
+            board.handle_event(move)
+        board.give_turns()
+    while max_turns is not None and not board.ended \
+            and board.turns < max_turns:
+        board.give_turns()
+    return time.perf_counter() - start
+
+
+def read_board(value: str) -> str:
+    """Return the setup_from_grid string given by <value>: the contents of
+    the file <value> if there is one, or else <value> itself, where the two
+    characters \\n stand for a newline.
+
+    >>> read_board('P-\\\\nBR')
+    'P-\\nBR'
+    """
+    if os.path.isfile(value):
+        with open(value) as f:
+            return f.read().strip('\n')
+    return value.replace('\\n', '\n')
+
+
+# Board played when none is given on the command line: the board from the
+# handout animation.
+DEFAULT_BOARD = "P-O----S\n---BBB-\n------B-\n-BRBB-O-\n---B-B--\n--O---S-"
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Return the command line options of a game in <argv> (the program's
+    arguments if None), as understood by a1_game and by this module.
+    """
+    parser = argparse.ArgumentParser(
+        description='Play Raccoon Raiders, in a window or headless.')
+    parser.add_argument('--board', default=None,
+                        help='setup_from_grid string or file of the board '
+                             '(default: the handout board)')
+    parser.add_argument('--random', action='store_true',
+                        help='play on a random board, as set up by the '
+                             'constants at the top of a1_headless')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--script', default=None,
+                        help='play headless: read the moves from this file, '
+                             'or from stdin if it is -')
+    parser.add_argument('--max-turns', type=int, default=None,
+                        help='headless: once the script is over, keep giving '
+                             'turns up to this many')
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                        help='in a window: append a telemetry report to this '
+                             'file every few seconds')
+    return parser.parse_args(argv)
+
+
+def game_string(args: argparse.Namespace) -> str:
+    """Return the setup_from_grid string of the board chosen by <args>, or
+    the empty string for a random board."""
+    if args.random:
+        return ''
+    return DEFAULT_BOARD if args.board is None else read_board(args.board)
+
+
+def play_headless(args: argparse.Namespace) -> None:
+    """Play the script of <args> (or, if it has none, no moves at all) on
+    the board chosen by <args>, and print the final board, its score and
+    how long the game took to play.
+    """
+    board = a1.GameBoard(BOARD_WIDTH, BOARD_HEIGHT, args.seed)
+    grid = game_string(args)
+    if grid:
+        board.setup_from_grid(grid)
+    else:
+        populate_board(board, NUM_RACCOONS, NUM_GARBAGE_CANS,
+                       NUM_RECYCLING_BINS)
+    if args.script is None:
+        script = ''
+    elif args.script == '-':
+        script = sys.stdin.read()
+    else:
+        with open(args.script) as script_file:
+            script = script_file.read()
+    try:
+        moves = parse_script(script)
+    except ValueError as e:
+        sys.exit(str(e))
+    seconds = run_script(board, moves, args.max_turns)
+    print(board)
+    print(f'turns: {board.turns}  ended: {board.ended}  '
+          f'score: {board.result().score}')
+    print(f'time: {seconds:.4f}s '
+          f'({board.turns / max(seconds, 1e-9):.0f} turns/s)')
+
+
+if __name__ == '__main__':
+    cli_args = parse_args()
+    if cli_args.script is None:
+        cli_args.script = '-'
+    play_headless(cli_args)
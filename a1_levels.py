@@ -0,0 +1,337 @@
+"""A constrained level generator for Raccoon Raiders.
+
+Unlike a1_headless.populate_board, which places Characters uniformly at random,
+the generator only keeps boards that satisfy a LevelSpec:
+- every raccoon can reach some garbage can, but is at least
+  <min_can_distance> raccoon steps away from the closest one,
+- the Player can walk (without pushing anything) next to every raccoon,
+- recycling bins cover <bin_density> of the board,
+- the estimated difficulty (see estimate_difficulty) is within bounds.
+
+Candidate boards are generated and checked many at a time as NumPy arrays
+(one layer per candidate), and batches are spread over a pool of worker
+processes, so level packs of thousands of boards are quick to fill.
+
+Generate a level pack with, e.g.:
+    python a1_levels.py 5000 --width 12 --height 10 --out pack.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import a1
+
+# Number of candidate boards generated and checked together.
+BATCH_CANDIDATES = 512
+
+# Letters of the tiles, as codes in the candidate arrays.
+EMPTY, PLAYER, BIN = ord('-'), ord('P'), ord('B')
+RACCOON, SMART, OPEN_CAN, CLOSED_CAN = ord('R'), ord('S'), ord('O'), ord('C')
+
+
+class LevelSpec:
+    """The constraints generated levels must satisfy.
+
+    === Public Attributes ===
+    width, height:
+        the size of the board, in squares
+    num_raccoons, num_cans:
+        the number of raccoons and garbage cans on the board
+    bin_density:
+        the fraction of the tiles covered by recycling bins
+    min_can_distance:
+        the smallest number of steps allowed between a raccoon and the
+        closest garbage can it can reach
+    fraction_smart, fraction_locked:
+        the probability that each raccoon is a SmartRaccoon, and that each
+        garbage can starts locked
+    min_difficulty, max_difficulty:
+        the range the estimated difficulty of a level must be in
+
+    === Representation Invariants ===
+    width >= 1 and height >= 1
+    num_raccoons >= 0 and num_cans >= 0 and min_can_distance >= 0
+    bin_density, fraction_smart and fraction_locked are between 0 and 1
+    min_difficulty <= max_difficulty
+    1 + num_raccoons + num_cans + round(bin_density * width * height)
+        <= width * height
+
+    >>> LevelSpec(3, 3, num_raccoons=4, num_cans=4)
+    Traceback (most recent call last):
+    ...
+    ValueError: 4 raccoons, 4 cans and 2 bins do not fit on a 3x3 board
+    """
+    width: int
+    height: int
+    num_raccoons: int
+    num_cans: int
+    bin_density: float
+    min_can_distance: int
+    fraction_smart: float
+    fraction_locked: float
+    min_difficulty: float
+    max_difficulty: float
+
+    def __init__(self, width: int, height: int, num_raccoons: int = 4,
+                 num_cans: int = 4, bin_density: float = 0.25,
+                 min_can_distance: int = 3, fraction_smart: float = 0.5,
+                 fraction_locked: float = 0.1, min_difficulty: float = 0.0,
+                 max_difficulty: float = 1.0) -> None:
+        """Initialize a spec with the given constraints.
+
+        Raise ValueError if they break a representation invariant.
+        """
+        self.width, self.height = width, height
+        self.num_raccoons, self.num_cans = num_raccoons, num_cans
+        self.bin_density = bin_density
+        self.min_can_distance = min_can_distance
+        self.fraction_smart = fraction_smart
+        self.fraction_locked = fraction_locked
+        self.min_difficulty = min_difficulty
+        self.max_difficulty = max_difficulty
+        if width < 1 or height < 1:
+            raise ValueError('the board must be at least 1x1')
+        for name in ['num_raccoons', 'num_cans', 'min_can_distance']:
+            if getattr(self, name) < 0:
+                raise ValueError(f'{name} cannot be negative')
+        for name in ['bin_density', 'fraction_smart', 'fraction_locked']:
+            if not 0 <= getattr(self, name) <= 1:
+                raise ValueError(f'{name} must be between 0 and 1')
+        if min_difficulty > max_difficulty:
+            raise ValueError(f'min_difficulty {min_difficulty} is above '
+                             f'max_difficulty {max_difficulty}')
+        if 1 + num_raccoons + num_cans + self.num_bins() > width * height:
+            raise ValueError(f'{num_raccoons} raccoons, {num_cans} cans and '
+                             f'{self.num_bins()} bins do not fit on a '
+                             f'{width}x{height} board')
+
+    def num_bins(self) -> int:
+        """Return the number of recycling bins on a level of this spec."""
+        return round(self.bin_density * self.width * self.height)
+
+
+def random_candidates(spec: LevelSpec, count: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    """Return <count> random boards for <spec> as an array of tile codes of
+    shape (count, height, width). As in populate_board, the Player is on the
+    top-left tile and every other Character is on a random free tile.
+    """
+    area = spec.width * spec.height
+    # a random permutation of the tiles other than (0, 0), per candidate
+    order = np.argsort(rng.random((count, area - 1)), axis=1) + 1
+    codes = np.full((count, area), EMPTY, dtype=np.uint8)
+    codes[:, 0] = PLAYER
+    rows = np.arange(count)[:, None]
+
+    end = spec.num_raccoons
+    smart = rng.random((count, end)) < spec.fraction_smart
+    codes[rows, order[:, :end]] = np.where(smart, SMART, RACCOON)
+    start, end = end, end + spec.num_cans
+    locked = rng.random((count, spec.num_cans)) < spec.fraction_locked
+    codes[rows, order[:, start:end]] = np.where(locked, CLOSED_CAN, OPEN_CAN)
+    start, end = end, end + spec.num_bins()
+    codes[rows, order[:, start:end]] = BIN
+    return codes.reshape(count, spec.height, spec.width)
+
+
+def grow_distances(sources: np.ndarray, passable: np.ndarray) -> np.ndarray:
+    """Return, for every tile of every board, the number of steps from the
+    closest tile in <sources>, moving only through <passable> tiles; -1 if
+    no source can be reached. Both arguments are boolean arrays of shape
+    (boards, height, width), and the search runs on all boards at once.
+
+    >>> src = np.array([[[True, False, False, False]]])
+    >>> ok = np.array([[[False, True, False, True]]])
+    >>> grow_distances(src, ok).tolist()
+    [[[0, 1, -1, -1]]]
+    """
+    dist = np.where(sources, 0, -1)
+    seen = sources.copy()
+    frontier = sources
+    step = 0
+    while frontier.any():
+        step += 1
+        grown = np.zeros_like(frontier)
+        grown[:, 1:, :] |= frontier[:, :-1, :]
+        grown[:, :-1, :] |= frontier[:, 1:, :]
+        grown[:, :, 1:] |= frontier[:, :, :-1]
+        grown[:, :, :-1] |= frontier[:, :, 1:]
+        frontier = grown & passable & ~seen
+        dist[frontier] = step
+        seen |= frontier
+    return dist
+
+
+def estimate_difficulty(raccoon_dists: np.ndarray,
+                        smart: np.ndarray) -> np.ndarray:
+    """Return a difficulty estimate between 0 and 1 for each board, given
+    the distances from its raccoons to their closest garbage can, and which
+    raccoons are smart (both of shape (boards, raccoons)).
+
+    Raccoons close to a can leave the Player little time, and smart raccoons
+    head straight for cans, so the estimate is
+        0.7 * mean(1 / distance) + 0.3 * fraction of smart raccoons.
+
+    >>> estimate_difficulty(np.array([[1, 1], [4, 4]]),
+    ...                     np.array([[True, True], [False, False]])).tolist()
+    [1.0, 0.175]
+    """
+    if raccoon_dists.shape[1] == 0:
+        return np.zeros(raccoon_dists.shape[0])
+    closeness = (1.0 / np.maximum(raccoon_dists, 1)).mean(axis=1)
+    return 0.7 * closeness + 0.3 * smart.mean(axis=1)
+
+
+def check_candidates(spec: LevelSpec,
+                     codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return which of the candidate boards <codes> satisfy <spec>, as a
+    boolean array, along with their estimated difficulty.
+    """
+    count = codes.shape[0]
+    is_raccoon = (codes == RACCOON) | (codes == SMART)
+    is_can = (codes == OPEN_CAN) | (codes == CLOSED_CAN)
+    is_bin = codes == BIN
+
+    # raccoons walk through anything but bins and cans, which they stop in
+    can_dist = grow_distances(is_can, ~is_bin & ~is_can)
+    dists = can_dist[is_raccoon].reshape(count, spec.num_raccoons)
+    smart = (codes[is_raccoon] == SMART).reshape(count, spec.num_raccoons)
+    ok = ((dists >= spec.min_can_distance) & (dists != -1)).all(axis=1)
+
+    # the Player must get next to each raccoon through empty tiles only
+    player = codes == PLAYER
+    reach = grow_distances(player, codes == EMPTY) != -1
+    near = np.zeros_like(reach)
+    near[:, 1:, :] |= reach[:, :-1, :]
+    near[:, :-1, :] |= reach[:, 1:, :]
+    near[:, :, 1:] |= reach[:, :, :-1]
+    near[:, :, :-1] |= reach[:, :, 1:]
+    ok &= (near | ~is_raccoon).all(axis=(1, 2))
+
+    difficulty = estimate_difficulty(dists, smart)
+    ok &= (difficulty >= spec.min_difficulty) \
+        & (difficulty <= spec.max_difficulty)
+    return ok, difficulty
+
+
+def to_grid_string(codes: np.ndarray) -> str:
+    """Return the setup_from_grid string of the board with tile <codes>.
+
+    >>> to_grid_string(np.array([[PLAYER, EMPTY], [BIN, RACCOON]],
+    ...                         dtype=np.uint8))
+    'P-\\nBR'
+    """
+    return '\n'.join(row.tobytes().decode('ascii') for row in codes)
+
+
+def generate_batch(spec: LevelSpec, count: int, seed: int,
+                   max_rounds: int = 1000) -> List[dict]:
+    """Return up to <count> levels satisfying <spec>, generated from <seed>.
+    Fewer are returned if <max_rounds> batches of candidates did not yield
+    enough of them.
+    """
+    rng = np.random.default_rng(seed)
+    levels = []
+    for _ in range(max_rounds):
+        if len(levels) >= count:
+            break
+        codes = random_candidates(spec, BATCH_CANDIDATES, rng)
+        ok, difficulty = check_candidates(spec, codes)
+        for i in np.flatnonzero(ok)[:count - len(levels)]:
+            levels.append({'board': to_grid_string(codes[i]),
+                           'difficulty': round(float(difficulty[i]), 4)})
+    return levels
+
+
+def generate_levels(spec: LevelSpec, count: int, seed: int = 0,
+                    workers: Optional[int] = None,
+                    max_rounds: int = 1000) -> List[dict]:
+    """Return <count> levels satisfying <spec>, each a dict holding the
+    level's setup_from_grid string ('board') and estimated difficulty,
+    generated in parallel by <workers> processes. The levels only depend on
+    <seed> and <workers>.
+
+    Raise ValueError if a worker found too few levels in <max_rounds>
+    batches of candidates (see generate_batch): the spec is then too strict
+    to be met, or only very rarely.
+
+    >>> spec = LevelSpec(6, 5, num_raccoons=2, num_cans=2, bin_density=0.2)
+    >>> levels = generate_levels(spec, 3, seed=1, workers=1)
+    >>> len(levels)
+    3
+    >>> b = level_board(levels[0])
+    >>> (b.width, b.height, str(b).count('B'))
+    (6, 5, 6)
+    >>> generate_levels(LevelSpec(6, 5, min_difficulty=0.99), 1, workers=1,
+    ...                 max_rounds=2)
+    Traceback (most recent call last):
+    ...
+    ValueError: only 0 of 1 levels met the spec in 2 rounds of candidates
+    """
+    workers = workers or os.cpu_count() or 1
+    shares = [count // workers + (i < count % workers)
+              for i in range(workers)]
+    if workers == 1:
+        levels = generate_batch(spec, count, seed, max_rounds)
+    else:
+        levels = []
+        with ProcessPoolExecutor(workers) as pool:
+            for batch in pool.map(generate_batch, [spec] * workers, shares,
+                                  [seed * workers + i
+                                   for i in range(workers)],
+                                  [max_rounds] * workers):
+                levels.extend(batch)
+    if len(levels) < count:
+        raise ValueError(f'only {len(levels)} of {count} levels met the spec '
+                         f'in {max_rounds} rounds of candidates')
+    return levels
+
+
+def level_board(level: dict, seed: Optional[int] = None) -> a1.GameBoard:
+    """Return a GameBoard set up with <level>, whose rng is seeded with
+    <seed>."""
+    board = a1.GameBoard(1, 1, seed)
+    board.setup_from_grid(level['board'])
+    return board
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('count', type=int)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=10)
+    parser.add_argument('--raccoons', type=int, default=4)
+    parser.add_argument('--cans', type=int, default=4)
+    parser.add_argument('--bin-density', type=float, default=0.25)
+    parser.add_argument('--min-can-distance', type=int, default=3)
+    parser.add_argument('--min-difficulty', type=float, default=0.0)
+    parser.add_argument('--max-difficulty', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=None,
+                        help='write the levels to this JSONL file')
+    args = parser.parse_args()
+    try:
+        level_spec = LevelSpec(args.width, args.height, args.raccoons,
+                               args.cans, args.bin_density,
+                               args.min_can_distance,
+                               min_difficulty=args.min_difficulty,
+                               max_difficulty=args.max_difficulty)
+        pack = generate_levels(level_spec, args.count, args.seed,
+                               args.workers)
+    except ValueError as e:
+        sys.exit(str(e))
+    lines = [json.dumps(level) for level in pack]
+    if args.out is None:
+        print('\n'.join(lines))
+    else:
+        with open(args.out, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+    print(f'{len(pack)} levels generated', file=sys.stderr)
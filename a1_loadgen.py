@@ -0,0 +1,169 @@
+"""A load generator for a1_server, for throughput and latency testing.
+
+Opens <connections> client connections to a running GameServer, starts
+<games> random games spread over them, and keeps sending random moves to
+every game for <duration> seconds. At the end it prints how many state
+updates per second the server pushed, and the latency between sending a move
+and receiving the state update acknowledging it.
+
+Run it against a server with, e.g.:
+    python a1_loadgen.py --port 8765 --connections 8 --games 2000
+    python a1_loadgen.py --unix /tmp/raccoon.sock --games 5000 --delay 0
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+from a1_server import DIRECTION_NAMES
+from a1_telemetry import percentiles
+
+# Directions a load generator client picks its moves from.
+MOVE_NAMES = list(DIRECTION_NAMES)
+
+
+class LoadStats:
+    """Measurements collected by the clients of one load test.
+
+    === Public Attributes ===
+    states:
+        the number of state updates received
+    moves:
+        the number of moves sent
+    ended:
+        the number of games that ended during the test
+    latencies:
+        the seconds between sending a move and receiving its acknowledgement,
+        one entry per acknowledged move
+    """
+    states: int
+    moves: int
+    ended: int
+    latencies: List[float]
+
+    def __init__(self) -> None:
+        """Initialize empty measurements."""
+        self.states = 0
+        self.moves = 0
+        self.ended = 0
+        self.latencies = []
+
+    def report(self, elapsed: float) -> str:
+        """Return a summary of these measurements for a test that ran
+        <elapsed> seconds.
+
+        >>> s = LoadStats()
+        >>> s.states, s.moves = 200, 100
+        >>> s.latencies = [0.001 * i for i in range(1, 101)]
+        >>> print(s.report(2.0))
+        moves sent:      100 (50.0/s)
+        states received: 200 (100.0/s)
+        games ended:     0
+        latency ms:      p50 50.5  p90 90.1  p99 99.01  max 100.0
+        """
+        lines = [f'moves sent:      {self.moves} '
+                 f'({self.moves / elapsed:.1f}/s)',
+                 f'states received: {self.states} '
+                 f'({self.states / elapsed:.1f}/s)',
+                 f'games ended:     {self.ended}']
+        if self.latencies:
+            pcts = percentiles(self.latencies, [50, 90, 99])
+            lines.append('latency ms:      ' + '  '.join(
+                f'p{p} {round(v * 1000, 2)}' for p, v in pcts.items())
+                + f'  max {round(max(self.latencies) * 1000, 2)}')
+        return '\n'.join(lines)
+
+
+async def run_client(games: int, stats: LoadStats, deadline: float,
+                     args: argparse.Namespace) -> None:
+    """Connect to the server, start <games> games and play them randomly
+    until <deadline>, recording into <stats>."""
+    if args.unix is not None:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+
+    new_game = {'op': 'new', 'width': args.width, 'height': args.height}
+    if args.delay is not None:
+        new_game['delay'] = args.delay
+    for _ in range(games):
+        writer.write(json.dumps(new_game).encode() + b'\n')
+    await writer.drain()
+
+    # the time each still unacknowledged move was sent, by game and seq
+    sent: Dict[int, Dict[int, float]] = {}
+    live = set()
+
+    async def receive() -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            msg = json.loads(line)
+            if msg['op'] != 'state':
+                continue
+            now = time.perf_counter()
+            stats.states += 1
+            game_id = msg['game']
+            if msg['ended']:
+                stats.ended += 1
+                live.discard(game_id)
+            else:
+                live.add(game_id)
+            ack: Optional[int] = msg.get('ack')
+            if ack is not None:
+                # older moves of this game were overwritten or also applied
+                pending = sent.get(game_id, {})
+                for seq in [s for s in pending if s <= ack]:
+                    if seq == ack:
+                        stats.latencies.append(now - pending[seq])
+                    del pending[seq]
+
+    receiver = asyncio.get_running_loop().create_task(receive())
+    seq = 0
+    while time.perf_counter() < deadline:
+        for game_id in list(live):
+            seq += 1
+            sent.setdefault(game_id, {})[seq] = time.perf_counter()
+            writer.write(json.dumps({'op': 'move', 'game': game_id,
+                                     'dir': random.choice(MOVE_NAMES),
+                                     'seq': seq}).encode() + b'\n')
+            stats.moves += 1
+        await writer.drain()
+        await asyncio.sleep(args.move_interval)
+    receiver.cancel()
+    writer.close()
+
+
+async def run_load(args: argparse.Namespace) -> None:
+    """Run a load test as described by the command line <args>."""
+    stats = LoadStats()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    per_client = [args.games // args.connections] * args.connections
+    for i in range(args.games % args.connections):
+        per_client[i] += 1
+    await asyncio.gather(*[run_client(n, stats, deadline, args)
+                           for n in per_client])
+    print(stats.report(time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=10)
+    parser.add_argument('--delay', type=float, default=None,
+                        help='seconds between turns of each game')
+    parser.add_argument('--move-interval', type=float, default=0.05,
+                        help='seconds between two rounds of moves')
+    parser.add_argument('--duration', type=float, default=10.0)
+    asyncio.run(run_load(parser.parse_args()))
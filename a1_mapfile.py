@@ -0,0 +1,199 @@
+"""Load boards from huge map files without reading them into memory.
+
+A map file holds a board in the format of GameBoard.setup_from_grid: one line
+per row, every row the same width, optionally ending with a newline. The
+file is memory-mapped, and rows are decoded and placed on the board one at a
+time, so loading never holds more than one row of text besides the board
+itself. Any rectangular region of the map can be loaded on its own; only the
+rows of the region are ever touched, and each of them is checked to be a
+whole row of the map as it is read.
+
+Load a map from the command line to see its size and how long it took:
+    python a1_mapfile.py huge_map.txt --region 0 0 1000 1000
+"""
+from __future__ import annotations
+
+import argparse
+import mmap
+import time
+from typing import Iterator, Optional, Tuple
+
+import a1
+
+
+class MapFile:
+    """A memory-mapped map file.
+
+    === Public Attributes ===
+    path:
+        the path of the map file
+    width, height:
+        the size of the board in the file, in squares
+
+    === Sample Usage ===
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'map.txt')
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write('P-B-\\n-BRB\\n--BB\\n-C--\\n')
+    >>> with MapFile(path) as m:
+    ...     (m.width, m.height), list(m.rows(1, 1, 2, 2))
+    ((4, 4), ['BR', '-B'])
+    """
+    # === Private Attributes ===
+    # _file:
+    #   the open map file
+    # _map:
+    #   the memory map of the whole file
+    # _stride:
+    #   the number of bytes from the start of one row to the start of the
+    #   next, i.e. the width plus the line ending
+    # _ending:
+    #   the line ending of the file
+
+    path: str
+    width: int
+    height: int
+    _file: object
+    _map: mmap.mmap
+    _stride: int
+    _ending: bytes
+
+    def __init__(self, path: str) -> None:
+        """Open and memory-map the map file at <path>.
+
+        Raise ValueError if the file is empty or its size shows that its
+        rows are not all the same width. Rows of different widths adding up
+        to the right size are only found when they are read (see rows).
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'{path} is empty') from None
+        size = len(self._map)
+        end = self._map.find(b'\n')
+        if end == -1:  # a single row, with no line ending
+            self.width, self._stride, self.height = size, size + 1, 1
+            self._ending = b'\n'
+        else:
+            newline = 2 if end > 0 and self._map[end - 1] == 13 else 1  # \r
+            self.width = end + 1 - newline
+            self._ending = b'\r\n' if newline == 2 else b'\n'
+            self._stride = end + 1
+            self.height = (size + newline) // self._stride
+            if self.height * self._stride not in (size, size + newline):
+                self.close()
+                raise ValueError(f'{path}: rows are not all '
+                                 f'{self.width} wide')
+
+    def rows(self, x: int = 0, y: int = 0, w: Optional[int] = None,
+             h: Optional[int] = None) -> Iterator[str]:
+        """Yield the rows of the <w> by <h> region of the map whose top-left
+        tile is (<x>, <y>), as in GameBoard.rows. Each row is read straight
+        from the memory map when it is needed.
+
+        Raise ValueError when a row of the region is not where a row of
+        the map's width should be.
+        """
+        x0, y0, x1, y1 = self._clip(x, y, w, h)
+        for j in range(y0, y1):
+            start = self._row_start(j)
+            yield self._map[start + x0:start + x1].decode('ascii')
+
+    def _row_start(self, j: int) -> int:
+        """Return the offset of row <j> in the file, after checking that it
+        is a whole line of the map's width: it starts the file or follows a
+        newline, holds no newline, and is followed by the file's line ending
+        or, for the last row, by the end of the file. Raise ValueError if it
+        is not."""
+        m, start = self._map, j * self._stride
+        end = start + self.width
+        ending = m[end:start + self._stride]
+        if (j > 0 and m[start - 1] != 10) or m.find(b'\n', start, end) != -1 \
+                or (ending != self._ending
+                    and not (j == self.height - 1 and end == len(m))):
+            raise ValueError(f'{self.path}: row {j} is not '
+                             f'{self.width} wide')
+        return start
+
+    def load(self, x: int = 0, y: int = 0, w: Optional[int] = None,
+             h: Optional[int] = None,
+             seed: Optional[int] = None) -> a1.GameBoard:
+        """Return a new GameBoard holding the <w> by <h> region of the map
+        whose top-left tile is (<x>, <y>) (the whole map by default), whose
+        rng is seeded with <seed>.
+        """
+        x0, y0, x1, y1 = self._clip(x, y, w, h)
+        board = a1.GameBoard(1, 1, seed)
+        board.setup_from_rows(self.rows(x0, y0, x1 - x0, y1 - y0),
+                              x1 - x0, y1 - y0)
+        return board
+
+    def _clip(self, x: int, y: int, w: Optional[int],
+              h: Optional[int]) -> Tuple[int, int, int, int]:
+        """Return the left, top, right and bottom edges (the last two
+        exclusive) of the region described by <x>, <y>, <w> and <h>, clipped
+        to the map. Raise ValueError if the region is empty."""
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = self.width if w is None else min(x + w, self.width)
+        y1 = self.height if h is None else min(y + h, self.height)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError('the region does not overlap the map')
+        return x0, y0, x1, y1
+
+    def close(self) -> None:
+        """Close the memory map and the file."""
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> MapFile:
+        """Return this map file, closing it at the end of a with block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close this map file."""
+        self.close()
+
+
+def load_board(path: str, x: int = 0, y: int = 0, w: Optional[int] = None,
+               h: Optional[int] = None,
+               seed: Optional[int] = None) -> a1.GameBoard:
+    """Return a GameBoard holding the <w> by <h> region whose top-left tile is
+    (<x>, <y>) of the map file at <path> (the whole map by default).
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'map.txt')
+    >>> with open(path, 'w') as f:
+    ...     _ = f.write('P-B-\\n-BRB\\n--BB\\n-C--')
+    >>> print(load_board(path))
+    P-B-
+    -BRB
+    --BB
+    -C--
+    >>> print(load_board(path, 2, 1))
+    RB
+    BB
+    --
+    """
+    with MapFile(path) as m:
+        return m.load(x, y, w, h, seed)
+
+
+if __name__ == '__main__':
+    import resource
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--region', type=int, nargs=4, default=None,
+                        metavar=('X', 'Y', 'W', 'H'))
+    args = parser.parse_args()
+    start = time.perf_counter()
+    region = args.region or (0, 0, None, None)
+    b = load_board(args.path, *region)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'loaded a {b.width}x{b.height} board in {elapsed:.2f}s '
+          f'(peak memory {peak // 1024} MB)')
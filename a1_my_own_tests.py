@@ -1,3 +1,4 @@
+from io import StringIO
 from a1 import *
 
 
@@ -193,6 +194,806 @@ def test_find_closest_path3() -> None:
     assert s._find_closest_path() == LEFT
 
 
+def test_distance_field_shared() -> None:
+    b = GameBoard(5, 3)
+    GarbageCan(b, 4, 0, False)
+    GarbageCan(b, 0, 2, True)
+    RecyclingBin(b, 2, 0)
+    RecyclingBin(b, 2, 1)
+    t1 = TrackingRaccoon(b, 0, 0)
+    t2 = TrackingRaccoon(b, 3, 2)
+    field = b.distance_field()
+    assert field == [2, 3, -1, 1, 0,
+                     1, 2, -1, 2, 1,
+                     0, 1, 2, 3, 2]
+    t1.take_turn()
+    t2.take_turn()
+    assert b.distance_field() is field  # computed once for the whole turn
+    assert (t1.x, t1.y) == (0, 1)
+    assert (t2.x, t2.y) == (2, 2)  # ties broken in DIRECTIONS order
+
+
+def test_distance_field_sees_cans_filled_mid_turn() -> None:
+    b = GameBoard(1, 1)
+    b.setup_from_grid('TO--O')
+    assert b.distance_field() == [1, 0, 1, 1, 0]
+    b.at(0, 0)[0].take_turn()  # climbs into the can at (1, 0)
+    assert b.distance_field() == [-1, -1, 2, 1, 0]
+
+
+def test_tracking_raccoon_follows_maze() -> None:
+    b = GameBoard(1, 1)
+    b.setup_from_grid('T-B---\n-B--B-\n---BO-')
+    t = b.at(0, 0)[0]
+    for _ in range(12):
+        t.take_turn()
+    assert t.inside_can
+    assert (t.x, t.y) == (4, 2)
+
+
+def test_tracking_raccoon_no_reachable_can() -> None:
+    b = GameBoard(3, 1)
+    t = TrackingRaccoon(b, 0, 0)
+    RecyclingBin(b, 1, 0)
+    GarbageCan(b, 2, 0, False)
+    t.take_turn()  # behaves like a trapped Raccoon
+    assert (t.x, t.y) == (0, 0)
+    assert str(b) == 'TBO'
+
+
+def test_write_grid_window() -> None:
+    b = GameBoard(1, 1)
+    b.setup_from_grid('P-B-\n-BRB\n--BB\n-C--')
+    out = StringIO()
+    b.write_grid(out)
+    assert out.getvalue() == str(b) + '\n'
+    out = StringIO()
+    b.write_grid(out, 2, 1, 5, 2)
+    assert out.getvalue() == 'RB\nBB\n'
+    assert list(b.rows(-1, 3, 3, 1)) == ['-C']
+    assert list(b.rows(4, 0)) == ['', '', '', '']
+
+
+def _grid_from_characters(b: GameBoard) -> str:
+    """Rebuild str(b) by looking at every Character on <b>."""
+    rows = []
+    for y in range(b.height):
+        row = ''
+        for x in range(b.width):
+            chars = b.at(x, y)
+            row += chars[-1].get_char() if chars else '-'
+        rows.append(row)
+    return '\n'.join(rows)
+
+
+def test_char_grid_tracks_changes() -> None:
+    b = GameBoard(4, 2)
+    r = Raccoon(b, 0, 1)
+    g = GarbageCan(b, 1, 1, True)
+    p = Player(b, 3, 1)
+    RecyclingBin(b, 2, 0)
+    grid = b.char_grid()
+    assert bytes(grid) == b'--B-RC-P'
+    assert r.move(RIGHT)  # unlocks the can
+    assert bytes(grid) == b'--B-RO-P'
+    assert r.move(RIGHT)  # climbs in
+    assert bytes(grid) == b'--B--@-P'
+    assert p.move(UP)
+    assert p.move(LEFT)  # pushes the bin
+    assert bytes(grid) == b'-BP--@--'
+    assert str(b) == _grid_from_characters(b)
+    assert b.to_grid() == [['-', 'B', 'P', '-'], ['-', '@', '-', '-']]
+
+
+def test_char_grid_random_game() -> None:
+    b = GameBoard(1, 1)
+    b.setup_from_grid('P-O----S\n---BBB--\n------B-\n-BRBB-O-\n'
+                      '---B-B--\n--O---T-')
+    for i in range(400):
+        b.handle_event(DIRECTIONS[i * 7 % 4])
+        b.give_turns()
+        assert str(b) == _grid_from_characters(b)
+
+
+def test_spatial_queries_match_scan() -> None:
+    import random
+    rng = random.Random(148)
+    b = GameBoard(37, 23)
+    tiles = [(x, y) for x in range(37) for y in range(23)]
+    rng.shuffle(tiles)
+    Player(b, *tiles.pop())
+    for _ in range(40):
+        Raccoon(b, *tiles.pop())
+    for _ in range(15):
+        GarbageCan(b, *tiles.pop(), rng.random() < 0.5)
+    for _ in range(200):
+        RecyclingBin(b, *tiles.pop())
+    for i in range(300):
+        b.handle_event(DIRECTIONS[rng.randrange(4)])
+        b.give_turns()
+        everything = [c for x in range(37) for y in range(23)
+                      for c in b.at(x, y)]
+        x, y = rng.randrange(37), rng.randrange(23)
+        w, h = rng.randrange(1, 20), rng.randrange(1, 20)
+        expected = {c for c in everything if isinstance(c, Raccoon)
+                    and x <= c.x < x + w and y <= c.y < y + h}
+        assert set(b.characters_in(Raccoon, x, y, w, h)) == expected
+        cans = [c for c in everything
+                if isinstance(c, GarbageCan) and len(b.at(c.x, c.y)) == 1]
+        nearest = min(cans, key=lambda c: (abs(c.x - x) + abs(c.y - y),
+                                           c.y, c.x), default=None)
+        assert b.nearest_unoccupied_can(x, y) is nearest
+        p = b._player
+        assert set(b.raccoons_near_player(i % 7)) == \
+            {c for c in everything if isinstance(c, Raccoon)
+             and abs(c.x - p.x) + abs(c.y - p.y) <= i % 7}
+
+
+def test_seeded_boards_play_the_same() -> None:
+    grid = 'P-O----S\n---BBB--\n------B-\n-BRBB-O-\n---B-B--\n--O-R-T-'
+    states = []
+    for _ in range(2):
+        b = GameBoard(1, 1, seed=2024)
+        b.setup_from_grid(grid)
+        for i in range(500):
+            b.handle_event(DIRECTIONS[i * 5 % 4])
+            b.give_turns()
+        states.append(str(b))
+    assert states[0] == states[1]
+
+
+def test_raccoon_take_turn_uniform() -> None:
+    b = GameBoard(3, 3, seed=0)
+    r = Raccoon(b, 1, 1)
+    RecyclingBin(b, 1, 0)
+    counts = {}
+    for _ in range(3000):
+        r.take_turn()
+        counts[(r.x, r.y)] = counts.get((r.x, r.y), 0) + 1
+        r._move((1 - r.x, 1 - r.y))  # back to the centre
+    assert set(counts) == {(0, 1), (2, 1), (1, 2)}
+    assert all(900 < n < 1100 for n in counts.values())
+
+
+def test_raccoon_moves_mask() -> None:
+    b = GameBoard(3, 3)
+    r = Raccoon(b, 1, 1)
+    assert b.raccoon_moves(1, 1) == 0b1111
+    Player(b, 0, 1)
+    GarbageCan(b, 1, 0, True)
+    GarbageCan(b, 2, 1, False)
+    Raccoon(b, 2, 1)
+    RecyclingBin(b, 1, 2)
+    assert b.raccoon_moves(1, 1) == 0b0010  # only the closed can, UP
+    assert not r.check_trapped()
+    assert not r.move(RIGHT)  # occupied can
+    r.take_turn()
+    assert not b.at(1, 0)[0].locked
+    assert (r.x, r.y) == (1, 1)
+
+
+def test_smart_raccoon_enters_can() -> None:
+    b = GameBoard(4, 1)
+    s = SmartRaccoon(b, 0, 0)
+    g = GarbageCan(b, 3, 0, True)
+    s.take_turn()
+    s.take_turn()
+    assert (s.x, s.y) == (2, 0)
+    s.take_turn()  # unlocks the can instead of walking onto it
+    assert (s.x, s.y) == (2, 0)
+    assert not g.locked
+    s.take_turn()
+    assert s.inside_can
+    assert str(b) == '---@'
+
+
+def test_raccoon_in_can_ends_game() -> None:
+    b = GameBoard(4, 1)
+    Player(b, 0, 0)
+    GarbageCan(b, 2, 0, False)
+    Raccoon(b, 2, 0)  # can still move, but it is inside a can
+    assert b.check_game_end() == 0
+    assert b.ended
+    assert b.trapped_num() == 0
+    assert b.result().in_cans == 1
+
+
+def test_result_cached_until_change() -> None:
+    b = GameBoard(3, 1)
+    p = Player(b, 0, 0)
+    Raccoon(b, 2, 0)
+    first = b.result()
+    assert not first.ended
+    assert b.result() is first
+    p.record_event(RIGHT)
+    b.give_turns()
+    res = b.result()
+    assert res is not first
+    assert (res.ended, res.trapped, res.score) == (True, 1, 10)
+
+
+def test_batch_engine_matches_give_turns() -> None:
+    import numpy as np
+    from a1_batch import BatchEngine
+    from a1_headless import populate_board
+    boards = []
+    for seed in range(30):
+        b = GameBoard(9, 7, seed)
+        populate_board(b, 4, 3, 15)
+        boards.append(b)
+    engine = BatchEngine.from_boards(boards, exact=True)
+    moves = np.random.default_rng(0).integers(-1, 4, (300, len(boards)))
+    for turn in range(300):
+        for b, d in zip(boards, moves[turn]):
+            if d >= 0:
+                b.handle_event(DIRECTIONS[d])
+            b.give_turns()
+        engine.step(moves[turn])
+        for i, b in enumerate(boards):
+            assert engine.board_string(i) == str(b)
+            assert engine.ended[i] == b.ended
+            score = b.result().score
+            assert engine.scores[i] == (-1 if score is None else score)
+
+
+def test_env_observation_is_live_view() -> None:
+    import random
+    from a1_env import RaccoonEnv
+    env = RaccoonEnv(8, 6, max_turns=400)
+    for seed in range(10):
+        obs = env.reset(seed)
+        assert not obs.flags.writeable
+        rng, done, total = random.Random(seed), False, 0.0
+        while not done:
+            _, reward, done, info = env.step(rng.randrange(5))
+            total += reward
+            assert obs.tobytes().decode() == str(env.board).replace('\n', '')
+        if not info['truncated']:
+            assert total == info['score']
+
+
+def test_fuzzer_minimises_mismatch() -> None:
+    from functools import partial
+    from a1_batch import BatchEngine
+    from a1_fuzz import fuzz, random_cases, run_batch
+
+    class NoPushEngine(BatchEngine):
+        def step(self, directions):
+            # a broken engine: the Player never pushes bins
+            blocked = directions.copy()
+            for b, d in enumerate(directions):
+                if d >= 0:
+                    x = self._player_x[b] + DIRECTIONS[d][0]
+                    y = self._player_y[b] + DIRECTIONS[d][1]
+                    h, w = self.tiles.shape[1:]
+                    if 0 <= x < w and 0 <= y < h \
+                            and self.tiles[b, y, x] == ord('B'):
+                        blocked[b] = -1
+            super().step(blocked)
+
+    cases = random_cases(10, 6, 5, 60, seed=2)
+    report = fuzz(cases, partial(run_batch, engine_class=NoPushEngine))
+    assert report.mismatch is not None
+    grid, _, moves = report.mismatch.reproducer
+    assert len(moves) <= report.mismatch.turn
+    assert grid.count('B') >= 1
+    assert report.mismatch.expected != report.mismatch.actual
+
+
+def test_free_space_index_tracks_board() -> None:
+    from a1_freespace import FreeSpaceIndex
+    from a1_headless import populate_board
+    for seed in range(20):
+        b = GameBoard(8, 6, seed)
+        populate_board(b, 4, 3, 16)
+        index = b.free_space()
+        for turn in range(400):
+            b.handle_event(DIRECTIONS[b.rng.randrange(4)])
+            b.give_turns()
+            fresh = FreeSpaceIndex(bytearray(b.char_grid()), 8, 6)
+            pairs = {}
+            for i in range(48):
+                assert index.can_reach_can(i) == fresh.can_reach_can(i)
+                if fresh.region(i) != -1:
+                    assert pairs.setdefault(fresh.region(i),
+                                            index.region(i)) \
+                        == index.region(i)
+            assert index.num_regions() == fresh.num_regions()
+
+
+def test_early_end_counts_sealed_raccoons() -> None:
+    b = GameBoard(5, 3)
+    b.setup_from_grid('-B---\nRB-OP\n-B---')
+    r = b.at(0, 1)[0]
+    assert not b.can_reach_can(0, 1) and b.can_reach_can(2, 1)
+    assert not r.check_trapped() and not b.result().ended
+    b.early_end = True
+    assert b.result().ended and b.result().trapped == 1
+
+
+def test_telemetry_writes_periodic_reports() -> None:
+    import json
+    from a1_telemetry import Telemetry
+    out = StringIO()
+    t = Telemetry(out, interval=1.0)
+    for i in range(300):
+        t.record('tick', i / 1000)
+    assert not t.maybe_write_report(t._last_report + 0.5)
+    assert t.maybe_write_report(t._last_report + 1.0)
+    report = json.loads(out.getvalue())
+    assert report['tick']['count'] == 256  # only the latest samples
+    assert report['tick']['max'] == 299.0
+    assert report['latency'] == {'count': 0}
+
+
+def test_bulk_events_match_one_event_per_turn() -> None:
+    from a1_headless import populate_board
+    moves = [DIRECTIONS[i * 7 % 4] for i in range(300)]
+    one, bulk = GameBoard(8, 6, 5), GameBoard(8, 6, 5)
+    populate_board(one, 3, 3, 12)
+    populate_board(bulk, 3, 3, 12)
+    bulk.set_input_queue(None, 1)
+    bulk.handle_events(moves)
+    for move in moves:
+        one.handle_event(move)
+        one.give_turns()
+        bulk.give_turns()
+        assert str(one) == str(bulk)
+
+
+def test_move_budget_per_turn() -> None:
+    b = GameBoard(6, 1)
+    p = Player(b, 0, 0)
+    b.set_input_queue(4, 3)
+    b.handle_events([RIGHT] * 6)  # only the last 4 are kept
+    b.give_turns()
+    assert (p.x, p.pending_moves) == (3, 1)
+    b.give_turns()
+    assert (p.x, p.pending_moves) == (4, 0)
+
+
+def test_save_file_seeks_to_any_turn(tmp_path) -> None:
+    import pytest
+    from a1_headless import populate_board
+    from a1_save import SaveReader, SaveWriter
+    for codec in ['zlib', 'bz2', 'lzma']:
+        b = GameBoard(12, 9, 4)
+        populate_board(b, 4, 4, 25)
+        states = [bytes(b.char_grid())]
+        path = str(tmp_path / f'game-{codec}.sav')
+        with SaveWriter(path, b, keyframe_interval=16, codec=codec) as save:
+            for i in range(200):
+                b.handle_event(DIRECTIONS[i * 7 % 4])
+                b.give_turns()
+                save.record(b)
+                states.append(bytes(b.char_grid()))
+        with SaveReader(path) as reader:
+            assert (reader.first_turn, reader.last_turn) == (0, 200)
+            for turn in [0, 1, 15, 16, 17, 99, 200]:
+                assert reader.tiles_at(turn) == states[turn]
+            assert [t for t, _, _ in reader.frames(150)] == \
+                list(range(150, 201))
+            assert [tiles for _, tiles, _ in reader.frames()] == states
+            assert str(reader.board_at(200)) == str(b)
+    empty = tmp_path / 'empty.sav'
+    empty.write_bytes(b'')
+    with pytest.raises(ValueError):
+        SaveReader(str(empty))
+
+
+def test_last_changes_replay_every_turn() -> None:
+    from a1_headless import populate_board
+    letters = set()
+    for seed in range(10):
+        b = GameBoard(8, 6, seed)
+        populate_board(b, 6, 4, 12)
+        tiles = bytearray(b.char_grid())
+        for turn in range(300):
+            b.handle_event(DIRECTIONS[b.rng.randrange(4)])
+            b.give_turns()
+            for x, y, before, after in b.last_changes():
+                assert chr(tiles[y * 8 + x]) == before != after
+                tiles[y * 8 + x] = ord(after)
+                letters.add(after)
+            assert tiles == b.char_grid()
+    assert {'P', 'B', 'C', '@', '-'} <= letters
+
+
+def test_board_events_follow_every_change() -> None:
+    from a1_headless import populate_board
+    kinds = set()
+    for seed in range(10):
+        b = GameBoard(8, 6, seed)
+        events = []
+        b.subscribe(events.append)
+        populate_board(b, 6, 4, 12)
+        assert all(isinstance(e, (CharacterPlaced, InsideCanChanged))
+                   for e in events)
+        assert sum(isinstance(e, CharacterPlaced) for e in events) == 23
+        for turn in range(300):
+            events.clear()
+            b.handle_event(DIRECTIONS[b.rng.randrange(4)])
+            b.give_turns()
+            touched = set()
+            for e in events:
+                kinds.add(type(e))
+                if isinstance(e, CharacterMoved):
+                    touched |= {(e.old_x, e.old_y),
+                                (e.character.x, e.character.y)}
+                elif isinstance(e, LockChanged):
+                    touched.add((e.can.x, e.can.y))
+                elif isinstance(e, InsideCanChanged):
+                    touched.add((e.raccoon.x, e.raccoon.y))
+            assert {(x, y) for x, y, _, _ in b.last_changes()} <= touched
+        b.unsubscribe(events.append)
+        assert not b.observed
+    assert kinds == {CharacterMoved, LockChanged, InsideCanChanged}
+
+
+def test_game_ended_event_fires_once() -> None:
+    b = GameBoard(1, 1)
+    b.setup_from_grid('P-B\n--R')
+    ends = []
+    b.subscribe(ends.append, GameEnded)
+    for move in [RIGHT, DOWN, LEFT]:
+        b.handle_event(move)
+        b.give_turns()
+    assert b.ended is False
+    assert [e.result.score for e in ends] == [11]
+
+
+def test_moved_listeners_see_the_updated_index() -> None:
+    b = GameBoard(20, 1)
+    p = Player(b, 7, 0)
+    found = []
+    b.subscribe(lambda e: found.append(
+        b.characters_in(Player, e.character.x, 0, 1, 1)), CharacterMoved)
+    p.move(RIGHT)
+    assert found == [[p]]
+
+
+def test_swarm_keeps_raccoons_consistent() -> None:
+    import numpy as np
+    from a1_swarm import RaccoonSwarm
+    swarm = RaccoonSwarm.random(40, 30, 200, 30, 250, seed=5)
+    letters = {ord('R'), ord('S'), ord('@')}
+    inside = 0
+    for _ in range(30):
+        swarm.tick()
+        pos = swarm.positions()
+        assert len(set(pos.tolist())) == 200
+        assert sum(int((swarm.tiles == c).sum()) for c in letters) == 200
+        assert all(swarm.tiles[p] in letters for p in pos.tolist())
+        assert int(swarm.inside_flags().sum()) >= inside
+        inside = int(swarm.inside_flags().sum())
+        for i in range(0, 200, 17):
+            view = swarm.raccoon(i)
+            assert swarm.at(view.x, view.y) == [view]
+            assert chr(swarm.tiles[pos[i]]) == view.get_char()
+    assert inside > 0
+    assert not np.array_equal(pos, RaccoonSwarm.random(
+        40, 30, 200, 30, 250, seed=5).positions())
+
+
+def test_swarm_matches_board_without_competition() -> None:
+    from a1_swarm import RaccoonSwarm
+    grid = 'S----O\n-BBBB-\nC-B-BS\nSOSB-P'
+    b = GameBoard(1, 1)
+    b.setup_from_grid(grid)
+    swarm = RaccoonSwarm.from_board(b, seed=0)
+    for _ in range(3):
+        for _ in range(RACCOON_TURN_FREQUENCY):
+            b.give_turns()
+        swarm.tick()
+        assert str(swarm) == str(b)
+    assert swarm.result().score == b.check_game_end()
+
+
+def test_config_sets_rules_per_board() -> None:
+    from a1_headless import GameConfig
+    slow = GameConfig(raccoon_turn_frequency=1000).make_board(6, 6, 2)
+    fast = GameConfig(raccoon_turn_frequency=1).make_board(6, 6, 2)
+    assert str(slow) == str(fast)
+    slow.setup_from_grid(str(slow))
+    for _ in range(5):
+        slow.give_turns()
+        fast.give_turns()
+    assert slow.raccoon_turn_frequency == 1000
+    assert str(slow) != str(fast)
+    board = GameConfig(num_raccoons=7, num_bins=3,
+                       fraction_smart=1.0).make_board(5, 5, 0)
+    assert str(board).count('S') == 7 and str(board).count('B') == 3
+
+
+def test_sweep_only_plays_new_points(tmp_path) -> None:
+    from a1_sweep import grid_points, run_sweep
+    cache = str(tmp_path / 'cache')
+    points = grid_points({'num_raccoons': [1, 2]})
+    first = run_sweep(points, 'random', [0, 1], 5, 5, 300, cache, 1)
+    assert [rec['cached'] for rec in first] == [False, False]
+    assert all(rec['summary']['games'] == 2 for rec in first)
+    more = grid_points({'num_raccoons': [1, 2, 3]})
+    second = run_sweep(more, 'random', [0, 1], 5, 5, 300, cache, 1)
+    assert [rec['cached'] for rec in second] == [True, True, False]
+    assert [rec['summary'] for rec in second[:2]] == \
+        [rec['summary'] for rec in first]
+    other = run_sweep(points, 'random', [0, 1, 2], 5, 5, 300, cache, 1)
+    assert not any(rec['cached'] for rec in other)
+
+
+def test_batch_engine_uses_each_board_frequency() -> None:
+    import numpy as np
+    from a1_fuzz import run_batch, run_reference
+    from a1_headless import GameConfig
+    configs = [GameConfig(raccoon_turn_frequency=f) for f in [1, 3, 20]]
+    moves = np.random.default_rng(0).integers(-1, 4, (60, 6))
+    boards = [configs[s % 3].make_board(6, 6, s) for s in range(6)]
+    copies = [configs[s % 3].make_board(6, 6, s) for s in range(6)]
+    assert run_batch(copies, moves) == run_reference(boards, moves)
+
+
+def test_sweep_rejects_invalid_points(tmp_path) -> None:
+    import pytest
+    from a1_sweep import run_sweep
+    cache = str(tmp_path / 'cache')
+    for point in [{'raccoon_turn_frequency': 0}, {'num_cans': -1},
+                  {'fraction_locked': 1.5}, {'num_raccoons': 30}]:
+        with pytest.raises(ValueError):
+            run_sweep([point], 'idle', [0], 5, 5, 10, cache, 1)
+
+
+def test_strategies_leave_the_board_rng_alone() -> None:
+    from random import Random
+    from a1_tournament import get_strategy, make_board
+    for name in ['random', 'greedy', 'idle', 'scripted:RRDL']:
+        board = make_board(3, 8, 8)
+        state = board.rng.getstate()
+        for _ in range(5):
+            get_strategy(name)(board, Random(0))
+        assert board.rng.getstate() == state
+
+
+def test_get_strategy_rejects_bad_scripts() -> None:
+    import pytest
+    from a1_tournament import get_strategy, play_game
+    for name in ['scripted:', 'scripted:RUX', 'scripted:r d']:
+        with pytest.raises(ValueError, match='invalid script'):
+            get_strategy(name)
+    assert play_game('scripted:ru', 3, 5, 5, 50)['strategy'] == 'scripted:ru'
+
+
+def test_map_file_loads_regions(tmp_path) -> None:
+    from a1_mapfile import MapFile, load_board
+    rows = ['P-B-O', '-BRB-', '--BBS', '-C---']
+    for ending in ['\n', '\r\n']:
+        path = tmp_path / 'map.txt'
+        path.write_bytes(ending.join(rows).encode())
+        with MapFile(str(path)) as m:
+            assert (m.width, m.height) == (5, 4)
+            assert list(m.rows(1, 2, 3, 9)) == ['-BB', 'C--']
+            assert list(m.rows(-2, -1, 4, 2)) == ['P-']
+        board = load_board(str(path), 2, 1, 3, 2)
+        assert str(board) == 'RB-\nBBS'
+        assert str(load_board(str(path))) == '\n'.join(rows)
+
+
+def test_map_file_rejects_ragged_rows(tmp_path) -> None:
+    import pytest
+    from a1_mapfile import MapFile, load_board
+    path = tmp_path / 'map.txt'
+    path.write_bytes(b'P-B\n-BR\n--B\n-C--\n')
+    with pytest.raises(ValueError):
+        MapFile(str(path))
+    path.write_bytes(b'P-B\n-B\nRB--\n')  # the size looks right
+    with MapFile(str(path)) as m:
+        assert list(m.rows(0, 0, 3, 1)) == ['P-B']
+        for y in [1, 2]:
+            with pytest.raises(ValueError, match=f'row {y}'):
+                list(m.rows(0, y, 3, 1))
+    with pytest.raises(ValueError):
+        load_board(str(path))
+    path.write_bytes(b'')
+    with pytest.raises(ValueError):
+        MapFile(str(path))
+
+
+def test_generated_levels_meet_their_spec() -> None:
+    from a1_levels import LevelSpec, generate_levels, level_board
+    spec = LevelSpec(9, 7, num_raccoons=3, num_cans=2, bin_density=0.2,
+                     min_can_distance=4, max_difficulty=0.5)
+    levels = generate_levels(spec, 20, seed=5, workers=1)
+    assert len(levels) == 20
+    assert generate_levels(spec, 20, seed=5, workers=1) == levels
+    for level in levels:
+        assert level['difficulty'] <= 0.5
+        b = level_board(level)
+        grid = str(b)
+        assert (b.width, b.height) == (9, 7)
+        assert grid.startswith('P')
+        assert grid.count('B') == spec.num_bins() == 13
+        assert sum(grid.count(c) for c in 'RS') == 3
+        assert sum(grid.count(c) for c in 'OC') == 2
+        field = b.distance_field()
+        for r in b.characters_in(Raccoon, 0, 0, 9, 7):
+            assert field[r.y * 9 + r.x] >= 4
+
+
+def test_level_generator_rejects_bad_specs() -> None:
+    import pytest
+    from a1_levels import LevelSpec, generate_levels
+    for settings in [{'width': 0}, {'num_raccoons': -1},
+                     {'bin_density': 1.5}, {'fraction_smart': -0.1},
+                     {'min_difficulty': 0.8, 'max_difficulty': 0.2},
+                     {'num_cans': 40}]:
+        with pytest.raises(ValueError):
+            LevelSpec(**{'width': 6, 'height': 6, **settings})
+    strict = LevelSpec(6, 6, min_can_distance=30)
+    with pytest.raises(ValueError, match='only 0 of 2 levels'):
+        generate_levels(strict, 2, workers=1, max_rounds=3)
+
+
+def test_run_script_plays_the_default_board() -> None:
+    from a1_headless import DEFAULT_BOARD, parse_script, run_script
+    moves = parse_script('D D R # around the bins\nR R U')
+    b = GameBoard(1, 1, 7)
+    b.setup_from_grid(DEFAULT_BOARD)
+    run_script(b, moves, 60)
+    assert (b.turns, b.ended) == (60, False)
+    assert str(b) == '--OB--S-\n---PBB--\n--R---B-\n-B-BB-@-\n' \
+                     '---B-B--\n--O-----'
+    replay = GameBoard(1, 1, 7)
+    replay.setup_from_grid(DEFAULT_BOARD)
+    for turn in range(60):
+        if turn < len(moves):
+            replay.handle_event(moves[turn])
+        replay.give_turns()
+    assert str(replay) == str(b)
+
+
+def test_play_headless_prints_the_final_board(tmp_path, capsys) -> None:
+    import pytest
+    from a1_headless import parse_args, play_headless
+    script = tmp_path / 'moves.txt'
+    script.write_text('RD\n')
+    play_headless(parse_args(['--board', 'P-B\\n--R', '--script',
+                              str(script)]))
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[:2] == ['--B', '-PR']
+    assert lines[2] == 'turns: 2  ended: True  score: 11'
+    script.write_text('RDX')
+    with pytest.raises(SystemExit, match="invalid move 'RDX'"):
+        play_headless(parse_args(['--board', 'P-B\\n--R', '--script',
+                                  str(script)]))
+
+
+def test_latest_slot_hands_over_the_newest_item() -> None:
+    import threading
+    from a1_game import LatestSlot
+    slot = LatestSlot()
+
+    def produce() -> None:
+        for i in range(1, 1001):
+            slot.put(i)
+        slot.close()
+    producer = threading.Thread(target=produce)
+    producer.start()
+    taken = []
+    while True:
+        item = slot.take(1.0)
+        if item is None:
+            break
+        taken.append(item)
+    producer.join()
+    assert slot.closed
+    assert taken == sorted(set(taken)) and taken[-1] == 1000
+    assert len(taken) + slot.dropped == 1000
+
+
+def test_threaded_game_plays_pressed_keys(monkeypatch) -> None:
+    monkeypatch.setenv('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import a1_game
+    monkeypatch.setattr(a1_game, 'LOOP_DELAY', 1)
+    monkeypatch.setattr(a1_game, 'PRINT_BOARDS', False)
+    try:
+        game = a1_game.RaccoonRaiders(3, 3, 'PB-\n-BR\n-BB', seed=0)
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN,
+                                             key=pygame.K_RIGHT))
+        game._play_threaded()  # returns once the game has ended
+        board = game._board
+        assert board.ended and board.result().trapped == 1
+        assert str(board) == '-PB\n-BR\n-BB'
+        # the render thread drew the final state last
+        assert game._last_state.ended
+        assert str(game._last_state) == str(board)
+        assert game.telemetry.percentile('tick', 50) is not None
+        assert game.telemetry.percentile('draw', 50) is not None
+    finally:
+        pygame.quit()
+
+
+class _RecordingWriter:
+    """A stand-in for the asyncio.StreamWriter of a server client, keeping
+    the messages written to it."""
+
+    def __init__(self) -> None:
+        self.data = b''
+        self.closed = False
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+
+    async def drain(self) -> None:
+        pass
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self) -> None:
+        self.closed = True
+
+    def messages(self) -> list:
+        import json
+        return [json.loads(line) for line in self.data.splitlines()]
+
+
+def _serve(requests: list, wait: float = 0.0) -> list:
+    """Send <requests> to a GameServer as one client, wait <wait> seconds,
+    disconnect, and return the messages the client received."""
+    import asyncio
+    import json
+    from a1_server import GameServer
+
+    async def run() -> list:
+        server = GameServer(delay=0.01)
+        reader, writer = asyncio.StreamReader(), _RecordingWriter()
+        client = asyncio.create_task(server.handle_client(reader, writer))
+        for request in requests:
+            reader.feed_data(json.dumps(request).encode() + b'\n')
+        await asyncio.sleep(wait)
+        reader.feed_eof()
+        await client
+        assert server.num_games() == 0
+        assert writer.closed
+        return writer.messages()
+    return asyncio.run(run())
+
+
+def test_server_plays_a_sent_board() -> None:
+    msgs = _serve([{'op': 'new', 'board': 'P-O\n-R-'},
+                   {'op': 'move', 'game': 0, 'dir': 'RIGHT', 'seq': 7}],
+                  wait=0.2)
+    assert msgs[0] == {'op': 'state', 'game': 0, 'turns': 0,
+                       'ended': False, 'board': 'P-O\n-R-'}
+    acks = [m for m in msgs if 'ack' in m]
+    assert len(acks) == 1 and acks[0]['ack'] == 7
+    assert acks[0]['board'].startswith('-P')
+    assert all(m['op'] == 'state' for m in msgs)
+
+
+def test_server_starts_random_boards() -> None:
+    msgs = _serve([{'op': 'new', 'width': 6, 'height': 6, 'seed': 1,
+                    'raccoons': 2, 'cans': 2, 'bins': 3}] * 2)
+    assert [m['game'] for m in msgs] == [0, 1]
+    assert msgs[0]['board'] == msgs[1]['board']
+    assert msgs[0]['board'].count('P') == 1
+
+
+def test_server_rejects_bad_requests() -> None:
+    msgs = _serve([{'op': 'new', 'board': 'P-O\n-R'},
+                   {'op': 'new', 'board': '--O\n-R-'},
+                   {'op': 'new', 'board': 'P-X\n-R-'},
+                   {'op': 'new', 'width': 2, 'height': 2, 'raccoons': 9},
+                   {'op': 'move', 'game': 0, 'dir': 'UP'},
+                   {'op': 'jump'},
+                   {'op': 'new', 'board': 'P-O\n-R-'},
+                   {'op': 'move', 'game': 0, 'dir': 'SIDEWAYS'},
+                   {'op': 'move', 'game': 0, 'dir': [1, 1]}])
+    assert [m['op'] for m in msgs] == ['error'] * 6 + ['state'] \
+        + ['error'] * 2
+    assert msgs[6]['game'] == 0
+
+
 if __name__ == '__main__':
     import pytest
 
@@ -0,0 +1,53 @@
+"""Where a game of Raccoon Raiders stands, as computed by GameBoard.result.
+
+a1 imports this module, which is why GameResult lives on its own.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+
+class GameResult:
+    """Where a game stands, as computed by GameBoard.result.
+
+    === Public Attributes ===
+    ended:
+        whether the game has ended, i.e. every raccoon is trapped or inside
+        a garbage can
+    trapped:
+        the number of raccoons that are trapped, not counting the ones inside
+        a garbage can (on boards with early_end set, raccoons that cannot
+        reach a garbage can count as trapped)
+    in_cans:
+        the number of raccoons inside a garbage can
+    largest_cluster:
+        the size of the largest cluster of adjacent recycling bins
+    score:
+        (trapped * 10) + largest_cluster if the game has ended, None otherwise
+
+    === Sample Usage ===
+    >>> GameResult(True, 2, 1, 4).score
+    24
+    >>> GameResult(False, 2, 0, 4).score is None
+    True
+    """
+    ended: bool
+    trapped: int
+    in_cans: int
+    largest_cluster: int
+    score: Optional[int]
+
+    def __init__(self, ended: bool, trapped: int, in_cans: int,
+                 largest_cluster: int) -> None:
+        """Initialize this result, computing its score."""
+        self.ended = ended
+        self.trapped = trapped
+        self.in_cans = in_cans
+        self.largest_cluster = largest_cluster
+        self.score = trapped * 10 + largest_cluster if ended else None
+
+    def __repr__(self) -> str:
+        """Return a string representation of this result."""
+        return (f'GameResult(ended={self.ended}, trapped={self.trapped}, '
+                f'in_cans={self.in_cans}, '
+                f'largest_cluster={self.largest_cluster}, score={self.score})')
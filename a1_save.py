@@ -0,0 +1,422 @@
+"""Compact save files of whole game sessions, with random access by turn.
+
+A save file records the state of a board after every turn of a game: the
+letter shown on every tile (as in GameBoard.char_grid), which captures moves,
+pushes, lock flips and raccoons going inside cans, and whether the game had
+ended. Turns are stored in blocks of <keyframe_interval> turns. A block
+starts with a keyframe, holding every tile, followed by one delta per turn,
+holding only the tiles that changed on that turn:
+
+    ended flag (1 byte), number of changes (varint),
+    then per change: gap from the previous changed tile (varint), letter
+
+Each block is compressed on its own with a stdlib codec (zlib, bz2 or lzma),
+so reading the state at any turn only decompresses one block and replays at
+most <keyframe_interval> - 1 deltas.
+
+File layout:
+    MAGIC, block 0, block 1, ..., index (JSON), index offset (8 bytes, LE)
+
+Record a session with:
+    with SaveWriter('game.sav', board) as save:
+        while not board.ended:
+            ...
+            board.give_turns()
+            save.record(board)
+"""
+from __future__ import annotations
+
+import bz2
+import json
+import lzma
+import mmap
+import struct
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import a1
+
+MAGIC = b'A1SAVE\x00\x01'
+
+# Compression functions of each codec, by name.
+CODECS = {'zlib': (zlib.compress, zlib.decompress),
+          'bz2': (bz2.compress, bz2.decompress),
+          'lzma': (lzma.compress, lzma.decompress)}
+
+# Number of turns per block, by default.
+DEFAULT_KEYFRAME_INTERVAL = 256
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """Append the unsigned <value> to <out>, 7 bits per byte, lowest first.
+
+    >>> out = bytearray()
+    >>> encode_varint(300, out)
+    >>> bytes(out)
+    b'\\xac\\x02'
+    """
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Return the varint starting at <pos> in <data>, and the position after
+    it.
+
+    >>> decode_varint(b'\\xac\\x02', 0)
+    (300, 2)
+    """
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_changes(width: int, changes: List[Tuple[int, int, str, str]],
+                   ended: bool, out: bytearray) -> None:
+    """Append to <out> the delta of a turn of a board <width> tiles wide
+    that made <changes>, as returned by GameBoard.last_changes, after which
+    the game had <ended> or not.
+
+    >>> out = bytearray()
+    >>> encode_changes(4, [(0, 0, 'P', '-'), (1, 0, '-', 'P')], False, out)
+    >>> bytes(out)
+    b'\\x00\\x02\\x00-\\x01P'
+    """
+    _encode_tiles([(y * width + x, ord(after)) for x, y, _, after in changes],
+                  ended, out)
+
+
+def _encode_tiles(tiles: List[Tuple[int, int]], ended: bool,
+                  out: bytearray) -> None:
+    """Append to <out> the delta setting every (index, letter code) of
+    <tiles>, in increasing order of index, after which the game had <ended>
+    or not."""
+    out.append(ended)
+    encode_varint(len(tiles), out)
+    last = 0
+    for i, code in tiles:
+        encode_varint(i - last, out)
+        out.append(code)
+        last = i
+
+
+def apply_delta(tiles: bytearray, data: bytes, pos: int) -> Tuple[bool, int]:
+    """Apply the delta starting at <pos> in <data> to <tiles>, and return the
+    ended flag of its turn and the position after it.
+
+    >>> tiles = bytearray(b'P-B-')
+    >>> apply_delta(tiles, b'\\x00\\x02\\x00-\\x01P', 0)
+    (False, 6)
+    >>> bytes(tiles)
+    b'-PB-'
+    """
+    ended = bool(data[pos])
+    count, pos = decode_varint(data, pos + 1)
+    i = 0
+    for _ in range(count):
+        gap, pos = decode_varint(data, pos)
+        i += gap
+        tiles[i] = data[pos]
+        pos += 1
+    return ended, pos
+
+
+class SaveWriter:
+    """A save file being recorded.
+
+    === Public Attributes ===
+    path:
+        the path of the save file
+    keyframe_interval:
+        the number of turns per block
+    codec:
+        the name of the compression codec, a key of CODECS
+    """
+    # === Private Attributes ===
+    # _file:
+    #   the open save file
+    # _width, _height:
+    #   the size of the board
+    # _first_turn, _last_turn:
+    #   the first and last turns recorded
+    # _blocks:
+    #   the [offset, length, first turn] of every block written
+    # _block:
+    #   the uncompressed contents of the block being recorded
+    # _block_turn:
+    #   the first turn of the block being recorded
+
+    path: str
+    keyframe_interval: int
+    codec: str
+    _file: object
+    _width: int
+    _height: int
+    _first_turn: int
+    _last_turn: int
+    _blocks: List[List[int]]
+    _block: bytearray
+    _block_turn: int
+
+    def __init__(self, path: str, board: a1.GameBoard,
+                 keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                 codec: str = 'zlib') -> None:
+        """Start recording <board>, from its current state, to a new save
+        file at <path>.
+
+        Raise ValueError if <codec> is unknown.
+        """
+        if codec not in CODECS:
+            raise ValueError(f'unknown codec {codec!r}')
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.codec = codec
+        self._width, self._height = board.width, board.height
+        self._first_turn = board.turns - 1  # the next record is the keyframe
+        self._last_turn = self._first_turn
+        self._blocks = []
+        self._block = bytearray()
+        self._block_turn = board.turns
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self.record(board)
+
+    def record(self, board: a1.GameBoard) -> None:
+        """Record the state of the board after its latest turn.
+
+        Only keyframes read the whole board; other turns are recorded from
+        the board's last_changes.
+
+        Precondition:
+        board is the board being recorded, it has taken exactly one turn
+        since the last call to record, and it has not been changed outside
+        of give_turns
+        """
+        turn = self._last_turn + 1
+        if (turn - self._first_turn - 1) % self.keyframe_interval == 0:
+            self._flush()
+            self._block_turn = turn
+            self._block.append(board.ended)
+            self._block += board.char_grid()
+        else:
+            encode_changes(board.width, board.last_changes(), board.ended,
+                           self._block)
+        self._last_turn = turn
+
+    def _flush(self) -> None:
+        """Compress and write the block being recorded, if any."""
+        if not self._block:
+            return
+        data = CODECS[self.codec][0](bytes(self._block))
+        self._blocks.append([self._file.tell(), len(data), self._block_turn])
+        self._file.write(data)
+        self._block = bytearray()
+
+    def close(self) -> None:
+        """Write the last block and the index, and close the file."""
+        self._flush()
+        index = {'width': self._width, 'height': self._height,
+                 'codec': self.codec,
+                 'keyframe_interval': self.keyframe_interval,
+                 'first_turn': self._first_turn + 1,
+                 'last_turn': self._last_turn, 'blocks': self._blocks}
+        offset = self._file.tell()
+        self._file.write(json.dumps(index).encode())
+        self._file.write(struct.pack('<Q', offset))
+        self._file.close()
+
+    def __enter__(self) -> SaveWriter:
+        """Return this save file, closing it at the end of a with block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Write the last block and the index, and close this save file."""
+        self.close()
+
+
+class SaveReader:
+    """A memory-mapped save file opened for reading. Only the blocks that
+    are read are ever touched.
+
+    === Public Attributes ===
+    width, height:
+        the size of the board, in squares
+    first_turn, last_turn:
+        the first and last turns recorded
+
+    === Sample Usage ===
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'game.sav')
+    >>> b = a1.GameBoard(1, 1, seed=3)
+    >>> b.setup_from_grid('P-B\\n--R')
+    >>> with SaveWriter(path, b, keyframe_interval=2) as save:
+    ...     for move in [a1.RIGHT, a1.DOWN, a1.LEFT]:
+    ...         b.handle_event(move)
+    ...         b.give_turns()
+    ...         save.record(b)
+    >>> with SaveReader(path) as save:
+    ...     save.first_turn, save.last_turn
+    ...     print(save.board_at(2))
+    ...     save.ended_at(2), save.ended_at(3)
+    (0, 3)
+    --B
+    -PR
+    (True, False)
+    """
+    # === Private Attributes ===
+    # _file:
+    #   the open save file
+    # _map:
+    #   the memory map of the whole file
+    # _decompress:
+    #   the decompression function of the file's codec
+    # _interval:
+    #   the number of turns per block
+    # _blocks:
+    #   the [offset, length, first turn] of every block
+    # _cache:
+    #   the index and the decompressed contents of the last block read
+
+    width: int
+    height: int
+    first_turn: int
+    last_turn: int
+    _file: object
+    _map: mmap.mmap
+    _decompress: object
+    _interval: int
+    _blocks: List[List[int]]
+    _cache: Tuple[int, bytes]
+
+    def __init__(self, path: str) -> None:
+        """Open and memory-map the save file at <path>.
+
+        Raise ValueError if it is not a save file.
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'{path} is not a save file') from None
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a save file')
+        offset, = struct.unpack('<Q', self._map[-8:])
+        index = json.loads(self._map[offset:len(self._map) - 8])
+        self.width, self.height = index['width'], index['height']
+        self.first_turn = index['first_turn']
+        self.last_turn = index['last_turn']
+        self._decompress = CODECS[index['codec']][1]
+        self._interval = index['keyframe_interval']
+        self._blocks = index['blocks']
+        self._cache = (-1, b'')
+
+    def _block(self, k: int) -> bytes:
+        """Return the decompressed contents of block <k>."""
+        if self._cache[0] != k:
+            offset, length, _ = self._blocks[k]
+            self._cache = (k, self._decompress(
+                self._map[offset:offset + length]))
+        return self._cache[1]
+
+    def frames(self, start: Optional[int] = None) -> Iterator[
+            Tuple[int, bytes, bool]]:
+        """Yield the turn, tiles and ended flag of every turn recorded from
+        turn <start> (the first one if None) on, in order.
+
+        Precondition:
+        start is None or first_turn <= start <= last_turn
+        """
+        start = self.first_turn if start is None else start
+        area = self.width * self.height
+        k = (start - self.first_turn) // self._interval
+        for k in range(k, len(self._blocks)):
+            data = self._block(k)
+            turn = self._blocks[k][2]
+            ended = bool(data[0])
+            tiles = bytearray(data[1:1 + area])
+            pos = 1 + area
+            while True:
+                if turn >= start:
+                    yield turn, bytes(tiles), ended
+                if pos == len(data):
+                    break
+                ended, pos = apply_delta(tiles, data, pos)
+                turn += 1
+
+    def tiles_at(self, turn: int) -> bytes:
+        """Return the tiles of the board after <turn>, as in
+        GameBoard.char_grid.
+
+        Precondition:
+        first_turn <= turn <= last_turn
+        """
+        return next(self.frames(turn))[1]
+
+    def ended_at(self, turn: int) -> bool:
+        """Return whether the game had ended after <turn>.
+
+        Precondition:
+        first_turn <= turn <= last_turn
+        """
+        return next(self.frames(turn))[2]
+
+    def board_at(self, turn: int, seed: Optional[int] = None) -> a1.GameBoard:
+        """Return a new board in the state it was in after <turn>, whose rng
+        is seeded with <seed>. Its raccoons take their turns in row-major
+        order, which may differ from the board that was recorded.
+
+        Precondition:
+        first_turn <= turn <= last_turn
+        """
+        tiles = self.tiles_at(turn).decode('ascii')
+        w = self.width
+        board = a1.GameBoard(1, 1, seed)
+        board.setup_from_rows((tiles[y * w:(y + 1) * w]
+                               for y in range(self.height)), w, self.height)
+        board.turns = turn
+        board.check_game_end()
+        return board
+
+    def sizes(self) -> Dict[str, int]:
+        """Return the size of the save file, and the size the same turns
+        would take saved as one string per turn.
+
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'game.sav')
+        >>> b = a1.GameBoard(20, 20, seed=1)
+        >>> _ = a1.Player(b, 0, 0)
+        >>> with SaveWriter(path, b) as save:
+        ...     for _ in range(1000):
+        ...         b.give_turns()
+        ...         save.record(b)
+        >>> with SaveReader(path) as save:
+        ...     sizes = save.sizes()
+        >>> sizes['file'] < sizes['strings'] // 100
+        True
+        """
+        turns = self.last_turn - self.first_turn + 1
+        return {'file': len(self._map),
+                'strings': turns * (self.width + 1) * self.height}
+
+    def close(self) -> None:
+        """Close the memory map and the file."""
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> SaveReader:
+        """Return this save file, closing it at the end of a with block."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close this save file."""
+        self.close()
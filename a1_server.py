@@ -0,0 +1,339 @@
+"""A local server hosting many concurrent Raccoon Raiders games in one process.
+
+Clients talk to the server over a TCP or Unix socket using one JSON object
+per line. Every request has an "op" key:
+
+    {"op": "new", "board": "P-O\\n-R-"}
+        start a game from a GameBoard.setup_from_grid string
+    {"op": "new", "width": 10, "height": 10, "seed": 42}
+        start a game on a random board (see a1_headless.populate_board); the
+        optional seed makes the board and the game reproducible
+    {"op": "move", "game": 3, "dir": "UP", "seq": 17}
+        send a direction ("LEFT", "UP", "RIGHT", "DOWN" or [dx, dy]) to the
+        Player of game 3. <seq> is optional and is echoed back in the "ack"
+        field of the first state update produced after the move was applied.
+    {"op": "close", "game": 3}
+        stop game 3
+
+Each game advances on its own schedule: every <delay> seconds its board's
+give_turns method is called. Whenever the board changes, the server pushes
+
+    {"op": "state", "game": 3, "turns": 40, "ended": false,
+     "board": "P-O\\n-R-", "ack": 17}
+
+to the client that owns the game. When a game ends, the final state update
+also carries its "score". Errors are reported as {"op": "error", ...}.
+
+Run the server with:
+    python a1_server.py --port 8765
+    python a1_server.py --unix /tmp/raccoon.sock
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from typing import Dict, Optional, Tuple
+
+import a1
+from a1_headless import populate_board, NUM_RACCOONS, NUM_GARBAGE_CANS
+
+# Default number of seconds between two give_turns calls of one game.
+DEFAULT_DELAY = 0.1
+
+# Names accepted for the "dir" field of a move request.
+DIRECTION_NAMES = {'LEFT': a1.LEFT, 'UP': a1.UP,
+                   'RIGHT': a1.RIGHT, 'DOWN': a1.DOWN}
+
+# Letters a board sent in a "new" request may use (see
+# GameBoard.setup_from_grid).
+GRID_LETTERS = frozenset('-RSTPOCB@')
+
+
+class GameSession:
+    """One game hosted by a GameServer.
+
+    === Public Attributes ===
+    game_id:
+        the id the server gave this game
+    board:
+        the board this game is played on
+    delay:
+        the number of seconds between two turns of this game
+    """
+    # === Private Attributes ===
+    # _writer:
+    #   the stream that state updates for this game are pushed to
+    # _pending_ack:
+    #   the seq of the last move received, or None if every received move
+    #   has already been acknowledged
+    # _last_state:
+    #   the string representation of the board last pushed to the client
+    # _task:
+    #   the asyncio task running this game's turns
+
+    game_id: int
+    board: a1.GameBoard
+    delay: float
+    _writer: asyncio.StreamWriter
+    _pending_ack: Optional[int]
+    _last_state: Optional[str]
+    _task: Optional[asyncio.Task]
+
+    def __init__(self, game_id: int, board: a1.GameBoard, delay: float,
+                 writer: asyncio.StreamWriter) -> None:
+        """Initialize a session for game <game_id> played on <board>,
+        pushing its state updates to <writer>."""
+        self.game_id = game_id
+        self.board = board
+        self.delay = delay
+        self._writer = writer
+        self._pending_ack = None
+        self._last_state = None
+        self._task = None
+
+    def start(self) -> None:
+        """Push the initial state of this game and start taking turns."""
+        self.push_state()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop taking turns in this game."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def handle_move(self, direction: Tuple[int, int],
+                    seq: Optional[int]) -> None:
+        """Record a move in <direction> for the Player of this game."""
+        self.board.handle_event(direction)
+        if seq is not None:
+            self._pending_ack = seq
+
+    def push_state(self) -> None:
+        """Send the current state of this game to its client if it has changed
+        since the last update, or if there is a move left to acknowledge."""
+        state = str(self.board)
+        if state == self._last_state and self._pending_ack is None \
+                and not self.board.ended:
+            return
+        self._last_state = state
+        msg = {'op': 'state', 'game': self.game_id, 'turns': self.board.turns,
+               'ended': self.board.ended, 'board': state}
+        if self._pending_ack is not None:
+            msg['ack'] = self._pending_ack
+            self._pending_ack = None
+        if self.board.ended:
+            msg['score'] = self.board.result().score
+        send(self._writer, msg)
+
+    async def _run(self) -> None:
+        """Give turns on this game's board every <delay> seconds until the
+        game ends."""
+        while not self.board.ended:
+            await asyncio.sleep(self.delay)
+            if self._writer.is_closing():
+                return
+            # the move recorded since the last turn is applied by give_turns
+            self.board.give_turns()
+            self.push_state()
+            try:
+                await self._writer.drain()
+            except ConnectionError:
+                return  # the client left; handle_client closes the game
+
+
+class GameServer:
+    """A server holding many GameSessions and routing client requests to them.
+
+    === Public Attributes ===
+    delay:
+        the default number of seconds between two turns of a game
+    """
+    # === Private Attributes ===
+    # _sessions:
+    #   the games currently hosted, keyed by their game id
+    # _next_id:
+    #   the id to give to the next game that is started
+
+    delay: float
+    _sessions: Dict[int, GameSession]
+    _next_id: int
+
+    def __init__(self, delay: float = DEFAULT_DELAY) -> None:
+        """Initialize an empty server whose games take a turn every <delay>
+        seconds."""
+        self.delay = delay
+        self._sessions = {}
+        self._next_id = 0
+
+    def num_games(self) -> int:
+        """Return the number of games currently hosted by this server."""
+        return len(self._sessions)
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of one connected client until it disconnects.
+        All the games the client started are stopped when it leaves."""
+        owned = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    self._handle_request(request, writer, owned)
+                except (ValueError, KeyError, TypeError) as e:
+                    send(writer, {'op': 'error', 'message': str(e)})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in owned:
+                self._close(game_id)
+            writer.close()
+
+    def _handle_request(self, request: dict, writer: asyncio.StreamWriter,
+                        owned: set) -> None:
+        """Carry out a single decoded client <request>."""
+        op = request['op']
+        if op == 'new':
+            game_id = self._new_game(request, writer)
+            owned.add(game_id)
+        elif op == 'move':
+            game_id = request['game']
+            if game_id not in owned:
+                raise KeyError(f'no such game {game_id}')
+            self._sessions[game_id].handle_move(
+                parse_direction(request['dir']), request.get('seq'))
+        elif op == 'close':
+            game_id = request['game']
+            owned.discard(game_id)
+            self._close(game_id)
+        else:
+            raise ValueError(f'unknown op {op!r}')
+
+    def _new_game(self, request: dict, writer: asyncio.StreamWriter) -> int:
+        """Start a game described by the 'new' <request> and return its id.
+
+        Raise ValueError if the board it sends is not a valid grid (see
+        check_grid), or if the random board it asks for is empty, or too
+        small for the Characters it asks for.
+        """
+        if 'board' in request:
+            check_grid(request['board'])
+            board = a1.GameBoard(1, 1, request.get('seed'))
+            board.setup_from_grid(request['board'])
+        else:
+            width, height = int(request['width']), int(request['height'])
+            raccoons = int(request.get('raccoons', NUM_RACCOONS))
+            cans = int(request.get('cans', NUM_GARBAGE_CANS))
+            bins = int(request.get('bins', int(width * height * 0.25)))
+            if width < 1 or height < 1:
+                raise ValueError('the board must be at least 1x1')
+            if min(raccoons, cans, bins) < 0:
+                raise ValueError('counts of Characters cannot be negative')
+            if 1 + raccoons + cans + bins > width * height:
+                raise ValueError(f'{raccoons} raccoons, {cans} cans, {bins} '
+                                 f'bins and the Player do not fit on a '
+                                 f'{width}x{height} board')
+            board = a1.GameBoard(width, height, request.get('seed'))
+            populate_board(board, raccoons, cans, bins)
+        game_id = self._next_id
+        self._next_id += 1
+        session = GameSession(game_id, board,
+                              float(request.get('delay', self.delay)), writer)
+        self._sessions[game_id] = session
+        session.start()
+        return game_id
+
+    def _close(self, game_id: int) -> None:
+        """Stop and forget game <game_id>, if it is still hosted."""
+        session = self._sessions.pop(game_id, None)
+        if session is not None:
+            session.stop()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765,
+                    unix_path: Optional[str] = None) -> None:
+        """Accept clients forever, on the Unix socket <unix_path> if it is
+        given and on TCP <host>:<port> otherwise."""
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_client,
+                                                     path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client,
+                                                host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def parse_direction(value) -> Tuple[int, int]:
+    """Return the direction named by <value>, either one of the names in
+    DIRECTION_NAMES or a [dx, dy] pair.
+
+    >>> parse_direction('UP')
+    (0, -1)
+    >>> parse_direction([1, 0])
+    (1, 0)
+    """
+    if isinstance(value, str):
+        return DIRECTION_NAMES[value.upper()]
+    direction = (int(value[0]), int(value[1]))
+    if direction not in a1.DIRECTIONS:
+        raise ValueError(f'invalid direction {value!r}')
+    return direction
+
+
+def check_grid(grid) -> None:
+    """Raise ValueError unless <grid> is a string that GameBoard can be set
+    up from: rows of the same non-zero width, separated by newlines, using
+    only GRID_LETTERS, with exactly one Player.
+
+    >>> check_grid('P-O\\n-R-')
+    >>> check_grid('P-O\\n-R')
+    Traceback (most recent call last):
+    ...
+    ValueError: the rows of the board are not all 3 wide
+    >>> check_grid('--O\\n-R-')
+    Traceback (most recent call last):
+    ...
+    ValueError: the board must have exactly one Player, not 0
+    """
+    if not isinstance(grid, str):
+        raise ValueError('the board must be a string')
+    rows = grid.split('\n')
+    width = len(rows[0])
+    if width == 0:
+        raise ValueError('the board must be at least 1x1')
+    if any(len(row) != width for row in rows):
+        raise ValueError(f'the rows of the board are not all {width} wide')
+    unknown = set(grid) - GRID_LETTERS - {'\n'}
+    if unknown:
+        raise ValueError(f'unknown letters {"".join(sorted(unknown))!r} '
+                         f'on the board')
+    players = grid.count('P')
+    if players != 1:
+        raise ValueError(f'the board must have exactly one Player, '
+                         f'not {players}')
+
+
+def send(writer: asyncio.StreamWriter, msg: dict) -> None:
+    """Write <msg> to <writer> as a single line of JSON."""
+    writer.write(json.dumps(msg, separators=(',', ':')).encode() + b'\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None,
+                        help='serve on this Unix socket path instead of TCP')
+    parser.add_argument('--delay', type=float, default=DEFAULT_DELAY,
+                        help='seconds between two turns of a game')
+    args = parser.parse_args()
+    try:
+        asyncio.run(GameServer(args.delay).serve(args.host, args.port,
+                                                 args.unix))
+    except KeyboardInterrupt:
+        pass
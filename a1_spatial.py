@@ -0,0 +1,149 @@
+"""A spatial index of the Characters on a board, for fast area queries.
+
+GameBoard keeps one and updates it as Characters are placed and move; see
+GameBoard.characters_in and GameBoard.nearest_unoccupied_can.
+
+a1 imports this module, so it only imports a1 for type checking.
+"""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, \
+    Optional, Tuple
+
+if TYPE_CHECKING:
+    from a1 import Character
+
+# Side length, in tiles, of the square buckets of the index
+INDEX_BUCKET_SIZE = 8
+
+
+def ring_buckets(cx: int, cy: int, ring: int) -> Iterator[Tuple[int, int]]:
+    """Yield the buckets on the border of the square of buckets <ring>
+    steps around bucket (<cx>, <cy>): its top and bottom rows, then its left
+    and right columns without their corners, i.e. 8 * <ring> buckets (one
+    for ring 0).
+
+    >>> sorted(ring_buckets(5, 5, 0))
+    [(5, 5)]
+    >>> sorted(ring_buckets(5, 5, 1))
+    [(4, 4), (4, 5), (4, 6), (5, 4), (5, 6), (6, 4), (6, 5), (6, 6)]
+    >>> len(set(ring_buckets(5, 5, 3)))
+    24
+    """
+    if ring == 0:
+        yield cx, cy
+        return
+    for bx in range(cx - ring, cx + ring + 1):
+        yield bx, cy - ring
+        yield bx, cy + ring
+    for by in range(cy - ring + 1, cy + ring):
+        yield cx - ring, by
+        yield cx + ring, by
+
+
+class SpatialIndex:
+    """The Characters of a board, by class. For every class, the board is
+    cut into square buckets of INDEX_BUCKET_SIZE tiles a side, so that a
+    query only looks at the buckets overlapping the area it asks about.
+
+    === Public Attributes ===
+    width, height:
+        the size of the board, in squares
+
+    === Sample Usage ===
+    >>> import a1
+    >>> b = a1.GameBoard(20, 20)
+    >>> index = SpatialIndex(20, 20)
+    >>> r = a1.Raccoon(b, 3, 4)
+    >>> index.add(r)
+    >>> index.find(a1.Raccoon, 0, 0, 8, 8) == [r]
+    True
+    >>> r.move(a1.RIGHT)
+    True
+    >>> index.move(r, 3, 4)
+    >>> index.find(a1.Raccoon, 4, 4, 1, 1) == [r]
+    True
+    """
+    # === Private Attributes ===
+    # _buckets:
+    #   for each class of Character, maps the bucket (x // INDEX_BUCKET_SIZE,
+    #   y // INDEX_BUCKET_SIZE) to the Characters of that class inside it.
+    #   Buckets with no Characters are left out.
+
+    width: int
+    height: int
+    _buckets: Dict[type, Dict[Tuple[int, int], List[Character]]]
+
+    def __init__(self, width: int, height: int) -> None:
+        """Initialize an empty index of a <width> by <height> board."""
+        self.width, self.height = width, height
+        self._buckets = {}
+
+    def add(self, c: Character) -> None:
+        """Add Character <c> to the index of its class."""
+        buckets = self._buckets.setdefault(type(c), {})
+        bucket = (c.x // INDEX_BUCKET_SIZE, c.y // INDEX_BUCKET_SIZE)
+        buckets.setdefault(bucket, []).append(c)
+
+    def move(self, c: Character, old_x: int, old_y: int) -> None:
+        """Record that Character <c> moved from tile (<old_x>, <old_y>) to
+        tile (c.x, c.y)."""
+        size = INDEX_BUCKET_SIZE
+        old_bucket = (old_x // size, old_y // size)
+        if old_bucket != (c.x // size, c.y // size):
+            buckets = self._buckets[type(c)]
+            buckets[old_bucket].remove(c)
+            if not buckets[old_bucket]:
+                del buckets[old_bucket]
+            self.add(c)
+
+    def find(self, kind: type, x: int, y: int, w: int,
+             h: int) -> List[Character]:
+        """Return every Character that is an instance of <kind> and is inside
+        the <w> by <h> rectangle whose top-left tile is (<x>, <y>), in no
+        particular order."""
+        size = INDEX_BUCKET_SIZE
+        x1, y1 = x + w - 1, y + h - 1
+        found = []
+        for cls, buckets in self._buckets.items():
+            if not issubclass(cls, kind):
+                continue
+            for bx in range(max(x, 0) // size, min(x1, self.width - 1) // size
+                            + 1):
+                for by in range(max(y, 0) // size,
+                                min(y1, self.height - 1) // size + 1):
+                    for c in buckets.get((bx, by), []):
+                        if x <= c.x <= x1 and y <= c.y <= y1:
+                            found.append(c)
+        return found
+
+    def nearest(self, kind: type, x: int, y: int,
+                accept: Callable[[Character], bool]) -> Optional[Character]:
+        """Return the Character of class <kind> (not of its subclasses) for
+        which <accept> is True that is closest to tile (<x>, <y>), counting
+        distance as the number of horizontal plus vertical steps between the
+        tiles. Ties are broken by taking the topmost, then leftmost,
+        Character. Return None if there is no such Character.
+
+        Buckets are searched in rings of growing size around (<x>, <y>),
+        each ring only visiting its border (see ring_buckets), stopping as
+        soon as no closer Character can exist.
+        """
+        buckets = self._buckets.get(kind, {})
+        size = INDEX_BUCKET_SIZE
+        cx, cy = x // size, y // size
+        max_ring = max(cx, cy, (self.width - 1) // size - cx,
+                       (self.height - 1) // size - cy)
+        best, best_key = None, None
+        for ring in range(max_ring + 1):
+            for bucket in ring_buckets(cx, cy, ring):
+                for c in buckets.get(bucket, []):
+                    if not accept(c):
+                        continue
+                    key = (abs(c.x - x) + abs(c.y - y), c.y, c.x)
+                    if best_key is None or key < best_key:
+                        best, best_key = c, key
+            # every tile in the next ring is at least ring * size + 1 away
+            if best_key is not None and best_key[0] <= ring * size:
+                break
+        return best
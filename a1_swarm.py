@@ -0,0 +1,438 @@
+"""A struct-of-arrays swarm of raccoons, for boards with millions of them.
+
+A GameBoard keeps one Raccoon object per raccoon, in a list and in the list
+of Characters of its tile, and calls take_turn on each of them in turn: a
+board with a million raccoons needs gigabytes of objects and takes minutes
+per raccoon turn. A RaccoonSwarm instead keeps the tiles of its board in one
+NumPy array of letter codes (as in GameBoard.char_grid), and its raccoons in
+parallel arrays of positions, flags (inside a can, smart) and random
+generator states: 18 bytes per raccoon, plus 9 bytes per tile. One call to
+tick gives every raccoon its turn with a fixed number of array operations.
+
+Raccoons follow the rules of Raccoon.take_turn and SmartRaccoon.take_turn,
+except that a tick is simultaneous rather than one raccoon after another:
+- every raccoon chooses its move from the board as it was when the tick
+  started, so it never follows another raccoon into the tile it just left,
+- when several raccoons move onto the same tile, the one that comes first
+  (in row-major order, or in placement order for from_board) gets it, and
+  the others stay where they are,
+- random moves are drawn from each raccoon's own generator (splitmix64),
+  not from the board's rng.
+On boards where raccoons never compete for a tile, a tick moves every
+raccoon as GameBoard.give_turns would, up to the random draws.
+
+Run a stress tick with, e.g.:
+    python a1_swarm.py --width 2000 --height 2000 --raccoons 1000000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import List, Optional
+
+import numpy as np
+
+import a1
+from a1_batch import EMPTY, PLAYER, BIN, RACCOON, SMART, OPEN_CAN, \
+    CLOSED_CAN, IN_CAN, NO_MOVE, largest_bin_clusters
+from a1_headless import FRACTION_LOCKED, FRACTION_SMART
+
+# ENTERABLE[code] is whether a raccoon can move onto a tile showing <code>.
+ENTERABLE = np.zeros(256, dtype=bool)
+ENTERABLE[[EMPTY, OPEN_CAN, CLOSED_CAN]] = True
+
+# Constants of the splitmix64 generator of each raccoon.
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def splitmix64(states: np.ndarray) -> np.ndarray:
+    """Advance every generator state in <states> (an array of uint64) by
+    one step, in place, and return the 64-bit output of each.
+
+    >>> states = np.zeros(2, dtype=np.uint64)
+    >>> hex(int(splitmix64(states)[0]))
+    '0xe220a8397b1dcdaf'
+    >>> int(states[1]) == 0x9E3779B97F4A7C15
+    True
+    """
+    states += _GOLDEN
+    z = states.copy()
+    z ^= z >> np.uint64(30)
+    z *= _MIX1
+    z ^= z >> np.uint64(27)
+    z *= _MIX2
+    z ^= z >> np.uint64(31)
+    return z
+
+
+class RaccoonSwarm:
+    """A board whose raccoons are stored as parallel arrays.
+
+    === Public Attributes ===
+    width, height:
+        the size of the board, in squares
+    tiles:
+        the letter code (as in GameBoard.char_grid) of every tile, of shape
+        (height * width,): tile (x, y) is tiles[y * width + x]
+    ticks:
+        the number of raccoon turns taken so far
+
+    === Representation Invariants ===
+    The tile of every raccoon shows 'S' (a smart raccoon), 'R' or '@' (a
+    raccoon inside a garbage can), and no other tile does.
+
+    === Sample Usage ===
+    >>> s = RaccoonSwarm.from_grid('P-S--O\\n---B-R', seed=0)
+    >>> s.num_raccoons
+    2
+    >>> s.tick()
+    >>> print(s)
+    P--S-O
+    ---BR-
+    >>> view = s.at(3, 0)[0]
+    >>> view.x, view.y, view.smart, view.get_char()
+    (3, 0, True, 'S')
+    """
+    # === Private Attributes ===
+    # _pos:
+    #   the tile index (as in tiles) of every raccoon, in the order they take
+    #   their turns
+    # _smart:
+    #   whether each raccoon is a SmartRaccoon
+    # _inside:
+    #   whether each raccoon is inside a garbage can
+    # _rng:
+    #   the splitmix64 state of each raccoon's random generator
+    # _owner:
+    #   for every tile, the index of the raccoon on it, or -1
+
+    width: int
+    height: int
+    tiles: np.ndarray
+    ticks: int
+    _pos: np.ndarray
+    _smart: np.ndarray
+    _inside: np.ndarray
+    _rng: np.ndarray
+    _owner: np.ndarray
+
+    def __init__(self, tiles: np.ndarray, seed: Optional[int] = None,
+                 order: Optional[np.ndarray] = None) -> None:
+        """Initialize a swarm on the board whose letter codes are <tiles>,
+        of shape (height, width). Raccoons take their turns in the order of
+        their tiles in <order>, or in row-major order if it is None. Their
+        generators are seeded from <seed>, or from the operating system if
+        <seed> is None.
+
+        Raise ValueError if the board holds a TrackingRaccoon.
+        """
+        self.height, self.width = tiles.shape
+        self.tiles = np.ascontiguousarray(tiles, dtype=np.uint8).ravel().copy()
+        if (self.tiles == ord('T')).any():
+            raise ValueError('TrackingRaccoons are not supported')
+        self.ticks = 0
+        codes = self.tiles
+        if order is None:
+            order = np.nonzero((codes == RACCOON) | (codes == SMART)
+                               | (codes == IN_CAN))[0]
+        self._pos = np.asarray(order, dtype=np.int64)
+        self._smart = codes[self._pos] == SMART
+        self._inside = codes[self._pos] == IN_CAN
+        entropy = np.random.SeedSequence(seed).generate_state(2, np.uint64)
+        self._rng = np.arange(len(self._pos), dtype=np.uint64) * entropy[1] \
+            + entropy[0]
+        splitmix64(self._rng)  # decorrelate neighbouring raccoons
+        self._owner = np.full(len(codes), -1, dtype=np.int64)
+        self._owner[self._pos] = np.arange(len(self._pos))
+
+    @classmethod
+    def from_grid(cls, grid: str, seed: Optional[int] = None) -> RaccoonSwarm:
+        """Return a swarm on the board given by the setup_from_grid string
+        <grid>."""
+        rows = grid.split('\n')
+        raw = np.frombuffer(''.join(rows).encode('ascii'), dtype=np.uint8)
+        return cls(raw.reshape(len(rows), len(rows[0])), seed)
+
+    @classmethod
+    def from_board(cls, board: a1.GameBoard,
+                   seed: Optional[int] = None) -> RaccoonSwarm:
+        """Return a swarm continuing the game on <board>, whose raccoons
+        take their turns in the order they were placed on it."""
+        tiles = np.frombuffer(board.char_grid(), dtype=np.uint8).reshape(
+            board.height, board.width)
+        order = [r.y * board.width + r.x for r in board.get_raccoons()]
+        return cls(tiles, seed, np.array(order, dtype=np.int64))
+
+    @classmethod
+    def random(cls, width: int, height: int, num_raccoons: int,
+               num_cans: int, num_bins: int,
+               seed: Optional[int] = None) -> RaccoonSwarm:
+        """Return a swarm on a random <width> by <height> board, set up like
+        a1_headless.populate_board does (the Player in the top-left corner,
+        everything else on distinct random tiles), but without creating any
+        Characters.
+
+        Precondition:
+        num_raccoons + num_cans + num_bins + 1 <= width * height
+
+        >>> s = RaccoonSwarm.random(50, 40, 300, 20, 500, seed=1)
+        >>> s.num_raccoons, int((s.tiles == BIN).sum()), chr(s.tiles[0])
+        (300, 500, 'P')
+        """
+        rng = np.random.default_rng(seed)
+        tiles = np.full(width * height, EMPTY, dtype=np.uint8)
+        tiles[0] = PLAYER
+        spots = rng.permutation(width * height - 1)[
+            :num_raccoons + num_cans + num_bins] + 1
+        raccoons = spots[:num_raccoons]
+        cans = spots[num_raccoons:num_raccoons + num_cans]
+        tiles[raccoons] = np.where(rng.random(num_raccoons) <= FRACTION_SMART,
+                                   SMART, RACCOON)
+        tiles[cans] = np.where(rng.random(num_cans) <= FRACTION_LOCKED,
+                               CLOSED_CAN, OPEN_CAN)
+        tiles[spots[num_raccoons + num_cans:]] = BIN
+        return cls(tiles.reshape(height, width), rng.integers(2 ** 63),
+                   np.sort(raccoons))
+
+    @property
+    def num_raccoons(self) -> int:
+        """The number of raccoons in this swarm."""
+        return len(self._pos)
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes taken by the arrays of this swarm."""
+        return sum(a.nbytes for a in (self.tiles, self._pos, self._smart,
+                                      self._inside, self._rng, self._owner))
+
+    def __str__(self) -> str:
+        """Return the board as GameBoard.__str__ would show it."""
+        w = self.width
+        text = self.tiles.tobytes().decode('ascii')
+        return '\n'.join(text[i:i + w] for i in range(0, len(text), w))
+
+    def at(self, x: int, y: int) -> List[RaccoonView]:
+        """Return a view of the raccoon on tile (<x>, <y>), in a list, as
+        GameBoard.at would return it, or an empty list if no raccoon is
+        there. Other Characters are not objects in a swarm: the letter of
+        their tile is in tiles."""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return []
+        i = int(self._owner[y * self.width + x])
+        return [] if i == -1 else [RaccoonView(self, i)]
+
+    def raccoon(self, i: int) -> RaccoonView:
+        """Return a view of raccoon <i>, the i-th to take its turn."""
+        return RaccoonView(self, i)
+
+    def positions(self) -> np.ndarray:
+        """Return the tile index (as in tiles) of every raccoon, in the order
+        they take their turns, as a read-only array."""
+        return self._read_only(self._pos)
+
+    def smart_flags(self) -> np.ndarray:
+        """Return whether every raccoon is a SmartRaccoon, as a read-only
+        array."""
+        return self._read_only(self._smart)
+
+    def inside_flags(self) -> np.ndarray:
+        """Return whether every raccoon is inside a garbage can, as a
+        read-only array."""
+        return self._read_only(self._inside)
+
+    @staticmethod
+    def _read_only(array: np.ndarray) -> np.ndarray:
+        """Return a read-only view of <array>."""
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def neighbour_masks(self, pos: np.ndarray) -> np.ndarray:
+        """Return the neighbour mask (as in GameBoard.raccoon_moves) of
+        every tile index in <pos>."""
+        w, h = self.width, self.height
+        x, y = pos % w, pos // w
+        mask = np.zeros(len(pos), dtype=np.int64)
+        for i, (valid, offset) in enumerate([(x > 0, -1), (y > 0, -w),
+                                             (x < w - 1, 1),
+                                             (y < h - 1, w)]):
+            code = self.tiles[np.where(valid, pos + offset, pos)]
+            mask |= (valid & ENTERABLE[code]).astype(np.int64) << i
+        return mask
+
+    def tick(self) -> None:
+        """Give every raccoon that is not inside a garbage can one turn, all
+        at once (see this module's docstring)."""
+        self.ticks += 1
+        active = np.nonzero(~self._inside)[0]
+        pos = self._pos[active]
+        mask = self.neighbour_masks(pos)
+        direction = np.full(len(active), NO_MOVE, dtype=np.int64)
+
+        smart = self._smart[active] & (mask != 0)
+        self._look_for_cans(pos, np.nonzero(smart)[0], direction)
+
+        num = np.array(a1.NUM_BITS)[mask]
+        rand = np.nonzero((direction == NO_MOVE) & (num > 0))[0]
+        states = self._rng[active[rand]]
+        draws = splitmix64(states)
+        self._rng[active[rand]] = states
+        k = ((draws >> np.uint64(32)) * num[rand].astype(np.uint64)
+             >> np.uint64(32)).astype(np.int64)
+        chosen = np.full(len(rand), NO_MOVE, dtype=np.int64)
+        bits = mask[rand]
+        for i in range(4):  # the k-th direction set in the mask
+            free = (bits >> i & 1 == 1) & (chosen == NO_MOVE)
+            chosen[free & (k == 0)] = i
+            k -= free
+        direction[rand] = chosen
+
+        go = np.nonzero(direction != NO_MOVE)[0]
+        self._move(active[go], pos[go], direction[go])
+
+    def _look_for_cans(self, pos: np.ndarray, looking: np.ndarray,
+                       direction: np.ndarray) -> None:
+        """Set direction[j] to the direction of the closest garbage can in
+        sight from tile pos[j] (as SmartRaccoon.take_turn sees it), for
+        every j in <looking> that has one in sight."""
+        w, h = self.width, self.height
+        best = np.full(len(pos), np.iinfo(np.int64).max)
+        for i, (dx, dy) in enumerate(a1.DIRECTIONS):
+            ray = looking
+            start = pos[ray]
+            x, y = start % w, start // w
+            dist = 0
+            while len(ray):
+                dist += 1
+                x, y = x + dx, y + dy
+                on = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+                ray, x, y = ray[on], x[on], y[on]
+                code = self.tiles[y * w + x]
+                found = ((code == OPEN_CAN) | (code == CLOSED_CAN)) \
+                    & (dist < best[ray])
+                best[ray[found]] = dist
+                direction[ray[found]] = i
+                clear = (code == EMPTY) | (code == PLAYER)
+                ray, x, y = ray[clear], x[clear], y[clear]
+
+    def _move(self, raccoons: np.ndarray, pos: np.ndarray,
+              direction: np.ndarray) -> None:
+        """Move each raccoon in <raccoons>, on tile pos[j], in direction
+        direction[j], as Raccoon.move would, resolving competing moves."""
+        offsets = np.array([-1, -self.width, 1, self.width])
+        target = pos + offsets[direction]
+        code = self.tiles[target]
+        self.tiles[target[code == CLOSED_CAN]] = OPEN_CAN
+
+        moving = np.nonzero((code == EMPTY) | (code == OPEN_CAN))[0]
+        _, first = np.unique(target[moving], return_index=True)
+        moving = moving[first]  # the first raccoon to claim each tile
+        raccoons, old, new = raccoons[moving], pos[moving], target[moving]
+        enter = code[moving] == OPEN_CAN
+        self.tiles[old] = EMPTY
+        self.tiles[new] = np.where(
+            enter, IN_CAN, np.where(self._smart[raccoons], SMART, RACCOON))
+        self._owner[old] = -1
+        self._owner[new] = raccoons
+        self._pos[raccoons] = new
+        self._inside[raccoons[enter]] = True
+
+    def result(self) -> a1.GameResult:
+        """Return where the game on this board stands, as GameBoard.result
+        would. This computes the largest bin cluster, which takes a few
+        passes over the whole board.
+
+        >>> RaccoonSwarm.from_grid('PBR\\n-BB').result().score
+        13
+        """
+        free = np.nonzero(~self._inside)[0]
+        trapped = int((self.neighbour_masks(self._pos[free]) == 0).sum())
+        in_cans = int(self._inside.sum())
+        ended = trapped + in_cans == self.num_raccoons
+        bins = (self.tiles == BIN).reshape(1, self.height, self.width)
+        return a1.GameResult(ended, trapped, in_cans,
+                             int(largest_bin_clusters(bins)[0]))
+
+
+class RaccoonView:
+    """A raccoon of a RaccoonSwarm, seen like a Raccoon object.
+
+    Views are created on demand and read the swarm's arrays, so they always
+    show the raccoon's current state.
+
+    === Public Attributes ===
+    swarm:
+        the swarm the raccoon belongs to
+    index:
+        the index of the raccoon in the swarm
+    """
+    swarm: RaccoonSwarm
+    index: int
+
+    def __init__(self, swarm: RaccoonSwarm, index: int) -> None:
+        """Initialize a view of raccoon <index> of <swarm>."""
+        self.swarm = swarm
+        self.index = index
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether <other> is a view of the same raccoon."""
+        return isinstance(other, RaccoonView) and other.swarm is self.swarm \
+            and other.index == self.index
+
+    @property
+    def x(self) -> int:
+        """The x coordinate of this raccoon."""
+        return int(self.swarm.positions()[self.index]) % self.swarm.width
+
+    @property
+    def y(self) -> int:
+        """The y coordinate of this raccoon."""
+        return int(self.swarm.positions()[self.index]) // self.swarm.width
+
+    @property
+    def inside_can(self) -> bool:
+        """Whether or not this raccoon is inside a garbage can."""
+        return bool(self.swarm.inside_flags()[self.index])
+
+    @property
+    def smart(self) -> bool:
+        """Whether this raccoon is a SmartRaccoon."""
+        return bool(self.swarm.smart_flags()[self.index])
+
+    def check_trapped(self) -> bool:
+        """Return True iff this raccoon has nowhere it could move, as
+        Raccoon.check_trapped does."""
+        pos = self.swarm.positions()[self.index:self.index + 1]
+        return int(self.swarm.neighbour_masks(pos)[0]) == 0
+
+    def get_char(self) -> chr:
+        """Return the letter of this raccoon, as Raccoon.get_char and
+        SmartRaccoon.get_char do."""
+        if self.inside_can:
+            return '@'
+        return 'S' if self.smart else 'R'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--raccoons', type=int, default=1000000)
+    parser.add_argument('--cans', type=int, default=100000)
+    parser.add_argument('--bins', type=int, default=1000000)
+    parser.add_argument('--ticks', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    swarm = RaccoonSwarm.random(args.width, args.height, args.raccoons,
+                                args.cans, args.bins, args.seed)
+    print(f'setup: {time.perf_counter() - t0:.3f}s, '
+          f'{swarm.num_raccoons} raccoons, '
+          f'{swarm.nbytes / 2 ** 20:.1f} MiB of arrays')
+    for _ in range(args.ticks):
+        t0 = time.perf_counter()
+        swarm.tick()
+        print(f'tick {swarm.ticks}: {time.perf_counter() - t0:.3f}s, '
+              f'{int(swarm.inside_flags().sum())} inside cans')
@@ -0,0 +1,268 @@
+"""A parameter sweep over the tunable rules of Raccoon Raiders, with caching.
+
+A sweep plays one strategy on the same seeded boards under many
+GameConfigs (see a1_headless), one per point of a parameter grid or of a
+Latin hypercube sample, and summarises each point's games as a1_tournament
+does. Games from every point are played together in a pool of worker
+processes.
+
+The summary of every point is cached in a directory, one JSON file per
+point, named after a hash of everything the result depends on: the
+configuration, strategy, seeds, board size and turn limit. A sweep only
+plays the points that are not in the cache yet, so growing or refining a
+sweep and running it again only costs the new points.
+
+Sweep, e.g.:
+    python a1_sweep.py --grid num_raccoons=2,4,8 --grid fraction_smart=0,1
+    python a1_sweep.py --lhs 20 --range raccoon_turn_frequency=5:40 \\
+        --range fraction_locked=0:0.5
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import Random
+from typing import Dict, List, Optional, Tuple
+
+from a1_headless import GameConfig
+from a1_tournament import DEFAULT_MAX_TURNS, format_stat, get_strategy, \
+    play_game, summarize
+
+# The type of every setting that can be swept.
+PARAMETERS = {'raccoon_turn_frequency': int, 'num_raccoons': int,
+              'num_cans': int, 'num_bins': int, 'fraction_smart': float,
+              'fraction_locked': float}
+
+# Part of every cache key: bump it whenever the rules of the game change, so
+# that results cached under the old rules are not reused.
+CACHE_VERSION = 1
+
+# Directory the results are cached in, by default.
+DEFAULT_CACHE_DIR = '.sweep_cache'
+
+# A point of a sweep: the settings of GameConfig it overrides.
+Point = Dict[str, object]
+
+
+def grid_points(space: Dict[str, List[object]]) -> List[Point]:
+    """Return every combination of the values of <space>, which maps each
+    swept setting to its values.
+
+    >>> grid_points({'num_raccoons': [2, 4], 'fraction_smart': [0.0, 1.0]})
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [{'num_raccoons': 2, 'fraction_smart': 0.0},
+     {'num_raccoons': 2, 'fraction_smart': 1.0},
+     {'num_raccoons': 4, 'fraction_smart': 0.0},
+     {'num_raccoons': 4, 'fraction_smart': 1.0}]
+    """
+    names = list(space)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(space[n] for n in names))]
+
+
+def latin_hypercube(ranges: Dict[str, Tuple[float, float]], num: int,
+                    seed: Optional[int] = None) -> List[Point]:
+    """Return <num> points sampling the box <ranges>, which maps each swept
+    setting to its lowest and highest values, as a Latin hypercube: the
+    range of every setting is cut into <num> equal strata, and each stratum
+    holds exactly one point. Integer settings are rounded down, so they may
+    repeat.
+
+    >>> points = latin_hypercube({'fraction_smart': (0.0, 1.0)}, 4, seed=0)
+    >>> sorted(int(p['fraction_smart'] * 4) for p in points)
+    [0, 1, 2, 3]
+    """
+    rng = Random(seed)
+    points = [{} for _ in range(num)]
+    for name, (low, high) in ranges.items():
+        strata = list(range(num))
+        rng.shuffle(strata)
+        for point, stratum in zip(points, strata):
+            u = (stratum + rng.random()) / num
+            if PARAMETERS[name] is int:
+                point[name] = min(int(low + u * (high - low + 1)), int(high))
+            else:
+                point[name] = low + u * (high - low)
+    return points
+
+
+def point_key(point: Point, strategy: str, seeds: List[int], width: int,
+              height: int, max_turns: int) -> str:
+    """Return the cache key of the summary of <point>: a hash of its full
+    configuration, as played on a <width> by <height> board, and of the
+    games played for it.
+
+    >>> point_key({}, 'idle', [0], 5, 5, 100) == point_key(
+    ...     {'num_raccoons': GameConfig().num_raccoons}, 'idle', [0], 5, 5,
+    ...     100)
+    True
+    >>> point_key({}, 'idle', [0], 4, 4, 100) == point_key(
+    ...     {'num_bins': 4}, 'idle', [0], 4, 4, 100)
+    True
+    """
+    config = GameConfig.from_dict(point)
+    settings = config.as_dict()
+    settings['num_bins'] = config.bins_on(width, height)
+    spec = {'version': CACHE_VERSION, 'config': settings,
+            'strategy': strategy, 'seeds': seeds, 'width': width,
+            'height': height, 'max_turns': max_turns}
+    text = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def _read_cache(path: str) -> Optional[dict]:
+    """Return the cached summary in <path>, or None if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(path: str, summary: dict) -> None:
+    """Write <summary> to <path> atomically, so that an interrupted sweep
+    never leaves a partial file behind."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(summary, f)
+    os.replace(tmp, path)
+
+
+def run_sweep(points: List[Point], strategy: str, seeds: List[int],
+              width: int, height: int,
+              max_turns: int = DEFAULT_MAX_TURNS,
+              cache_dir: str = DEFAULT_CACHE_DIR,
+              workers: Optional[int] = None) -> List[dict]:
+    """Play <strategy> on the boards of <seeds> under the configuration of
+    every point in <points> that is not cached in <cache_dir> yet, in a pool
+    of <workers> processes, and return one record per point, in order: the
+    point, its cache key, whether it came from the cache, and the summary
+    of its games (as in a1_tournament.summarize).
+
+    Raise ValueError if the strategy or a setting is unknown, or if a point
+    is not a valid configuration for a <width> by <height> board.
+    """
+    get_strategy(strategy)  # fail early on a bad name
+    configs = [GameConfig.from_dict(point) for point in points]
+    for config in configs:
+        config.check_fits(width, height)
+    keys = [point_key(point, strategy, seeds, width, height, max_turns)
+            for point in points]
+    os.makedirs(cache_dir, exist_ok=True)
+    summaries = {}
+    for key in keys:
+        if key not in summaries:
+            summaries[key] = _read_cache(os.path.join(cache_dir,
+                                                      f'{key}.json'))
+    cached = {key for key, summary in summaries.items() if summary is not None}
+
+    todo = {}
+    for key, config in zip(keys, configs):
+        if key not in cached:
+            todo[key] = config
+    if todo:
+        games = {key: [] for key in todo}
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {pool.submit(play_game, strategy, seed, width, height,
+                                   max_turns, False, config): key
+                       for key, config in todo.items() for seed in seeds}
+            for future in as_completed(futures):
+                key = futures[future]
+                games[key].append(future.result())
+                if len(games[key]) == len(seeds):
+                    # stored and returned through JSON, so that fresh and
+                    # cached summaries look the same
+                    summary = json.loads(json.dumps(
+                        summarize(games[key])[strategy]))
+                    _write_cache(os.path.join(cache_dir, f'{key}.json'),
+                                 summary)
+                    summaries[key] = summary
+
+    return [{'point': point, 'key': key, 'cached': key in cached,
+             'summary': summaries[key]}
+            for point, key in zip(points, keys)]
+
+
+def parse_setting(text: str) -> Tuple[str, str]:
+    """Return the name and value of the command line setting <text>, of the
+    form name=value.
+
+    Raise ValueError if the name is not a swept setting.
+    """
+    name, _, value = text.partition('=')
+    if name not in PARAMETERS:
+        raise ValueError(f'unknown setting {name!r}; settings are '
+                         f'{", ".join(PARAMETERS)}')
+    return name, value
+
+
+def print_sweep(records: List[dict]) -> None:
+    """Print a table of the sweep <records>."""
+    names = sorted({name for rec in records for name in rec['point']})
+
+    def fmt_setting(v: object) -> str:
+        return '-' if v is None else f'{v:.4g}' if isinstance(v, float) \
+            else str(v)
+
+    print(' '.join(f'{n:>22}' for n in names)
+          + f' {"games":>6} {"ended":>6} {"mean":>7} {"turns":>8} cached')
+    for rec in records:
+        s = rec['summary']
+        values = ' '.join(f'{fmt_setting(rec["point"].get(n)):>22}'
+                          for n in names)
+        print(f'{values} {s["games"]:>6} {s["ended"]:>6} '
+              f'{format_stat(s["mean_score"]):>7} '
+              f'{format_stat(s["mean_turns"]):>8} '
+              f'{"yes" if rec["cached"] else "no"}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--grid', action='append', default=[],
+                        metavar='NAME=V1,V2,...',
+                        help='sweep a setting over these values')
+    parser.add_argument('--lhs', type=int, default=None, metavar='N',
+                        help='sample N points of the --range box')
+    parser.add_argument('--range', action='append', default=[],
+                        metavar='NAME=LOW:HIGH',
+                        help='range of a setting, for --lhs')
+    parser.add_argument('--strategy', default='greedy')
+    parser.add_argument('--boards', type=int, default=50)
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=10)
+    parser.add_argument('--max-turns', type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the Latin hypercube sample')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    try:
+        if args.lhs is not None:
+            box = {}
+            for item in args.range:
+                setting, bounds = parse_setting(item)
+                low, high = bounds.split(':')
+                box[setting] = (PARAMETERS[setting](low),
+                                PARAMETERS[setting](high))
+            sweep_points = latin_hypercube(box, args.lhs, args.seed)
+        else:
+            space = {}
+            for item in args.grid:
+                setting, values = parse_setting(item)
+                space[setting] = [PARAMETERS[setting](v)
+                                  for v in values.split(',')]
+            sweep_points = grid_points(space)
+        result = run_sweep(
+            sweep_points, args.strategy,
+            list(range(args.first_seed, args.first_seed + args.boards)),
+            args.width, args.height, args.max_turns, args.cache_dir,
+            args.workers)
+    except ValueError as e:
+        sys.exit(str(e))
+    print_sweep(result)
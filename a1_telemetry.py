@@ -0,0 +1,184 @@
+"""Runtime performance telemetry for Raccoon Raiders.
+
+A Telemetry object collects timing samples from the threads of a running
+game -- the time each turn took to simulate ('tick'), the time each frame
+took to draw ('draw'), the time between pressing a key and first seeing its
+effect on screen ('latency') -- and the times frames were shown, from which
+frames per second are derived. Only the most recent samples of each metric
+are kept, so the numbers always describe the last few seconds of play.
+
+The game shows summary() as an overlay, and can append a report of the
+rolling percentiles to a metrics file every few seconds, one JSON object per
+line, for offline analysis.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, TextIO
+
+# Number of samples of each metric kept.
+WINDOW_SIZE = 256
+
+# Percentiles written to the metrics file.
+REPORT_PERCENTILES = [50, 90, 99]
+
+# Timed metrics, in the order they are shown and reported.
+METRICS = ['tick', 'draw', 'latency']
+
+
+def percentiles(values: List[float], ps: List[int]) -> Dict[int, float]:
+    """Return the <ps> percentiles of the non-empty <values>, interpolating
+    linearly between the closest ranks.
+
+    >>> percentiles([1.0, 2.0, 3.0, 4.0, 5.0], [0, 50, 90])
+    {0: 1.0, 50: 3.0, 90: 4.6}
+    """
+    ordered = sorted(values)
+    result = {}
+    for p in ps:
+        rank = (len(ordered) - 1) * p / 100
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        result[p] = (ordered[low]
+                     + (ordered[high] - ordered[low]) * (rank - low))
+    return result
+
+
+class Telemetry:
+    """Rolling performance measurements of a running game.
+
+    === Public Attributes ===
+    interval:
+        the number of seconds between two reports written to the metrics
+        file
+    out:
+        the metrics file, or None if no reports are written
+
+    === Sample Usage ===
+    >>> t = Telemetry()
+    >>> for ms in [1, 2, 3, 4]:
+    ...     t.record('tick', ms / 1000)
+    >>> t.percentile('tick', 50)
+    0.0025
+    >>> t.percentile('draw', 50) is None
+    True
+    """
+    # === Private Attributes ===
+    # _samples:
+    #   the most recent samples of every timed metric, in seconds
+    # _frames:
+    #   the perf_counter times the most recent frames were shown at
+    # _last_report:
+    #   the perf_counter time of the last report written
+    # _lock:
+    #   guards the samples, which come from several threads
+
+    interval: float
+    out: Optional[TextIO]
+    _samples: Dict[str, Deque[float]]
+    _frames: Deque[float]
+    _last_report: float
+    _lock: threading.Lock
+
+    def __init__(self, out: Optional[TextIO] = None,
+                 interval: float = 5.0) -> None:
+        """Initialize empty measurements, reported to <out> (if given) every
+        <interval> seconds."""
+        self.interval = interval
+        self.out = out
+        self._samples = {name: deque(maxlen=WINDOW_SIZE) for name in METRICS}
+        self._frames = deque(maxlen=WINDOW_SIZE)
+        self._last_report = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, seconds: float) -> None:
+        """Record a sample of <seconds> for the timed <metric>."""
+        with self._lock:
+            self._samples[metric].append(seconds)
+
+    def frame_shown(self, now: Optional[float] = None) -> None:
+        """Record that a frame was shown at perf_counter time <now> (the
+        current time if it is None)."""
+        with self._lock:
+            self._frames.append(time.perf_counter() if now is None else now)
+
+    def fps(self) -> float:
+        """Return the number of frames shown per second, over the most
+        recent frames.
+
+        >>> t = Telemetry()
+        >>> for i in range(11):
+        ...     t.frame_shown(i * 0.1)
+        >>> round(t.fps(), 6)
+        10.0
+        """
+        with self._lock:
+            frames = list(self._frames)
+        if len(frames) < 2 or frames[-1] == frames[0]:
+            return 0.0
+        return (len(frames) - 1) / (frames[-1] - frames[0])
+
+    def percentile(self, metric: str, p: int) -> Optional[float]:
+        """Return the <p> percentile of the recent samples of <metric>, or
+        None if there are none."""
+        with self._lock:
+            values = list(self._samples[metric])
+        return percentiles(values, [p])[p] if values else None
+
+    def summary(self) -> str:
+        """Return a one-line summary of the median of every metric, in
+        milliseconds, and of the frame rate, as shown on the overlay.
+
+        >>> t = Telemetry()
+        >>> t.record('tick', 0.0004)
+        >>> t.summary()
+        'tick 0.400ms  draw -  latency -  fps 0.0'
+        """
+        parts = []
+        for name in METRICS:
+            value = self.percentile(name, 50)
+            parts.append(f'{name} -' if value is None
+                         else f'{name} {value * 1000:.3f}ms')
+        parts.append(f'fps {self.fps():.1f}')
+        return '  '.join(parts)
+
+    def report(self) -> dict:
+        """Return the rolling percentiles (in milliseconds) and sample count
+        of every metric, and the frame rate.
+
+        >>> t = Telemetry()
+        >>> t.record('draw', 0.002)
+        >>> t.report()['draw']
+        {'count': 1, 'p50': 2.0, 'p90': 2.0, 'p99': 2.0, 'max': 2.0}
+        """
+        result = {'time': time.time(), 'fps': round(self.fps(), 2)}
+        for name in METRICS:
+            with self._lock:
+                values = list(self._samples[name])
+            entry = {'count': len(values)}
+            if values:
+                pcts = percentiles(values, REPORT_PERCENTILES)
+                for p in REPORT_PERCENTILES:
+                    entry[f'p{p}'] = round(pcts[p] * 1000, 3)
+                entry['max'] = round(max(values) * 1000, 3)
+            result[name] = entry
+        return result
+
+    def maybe_write_report(self, now: Optional[float] = None) -> bool:
+        """Append a report to the metrics file if <interval> seconds have
+        passed since the last one, and return whether one was written."""
+        now = time.perf_counter() if now is None else now
+        if self.out is None or now - self._last_report < self.interval:
+            return False
+        self._last_report = now
+        self.write_report()
+        return True
+
+    def write_report(self) -> None:
+        """Append a report to the metrics file, if there is one."""
+        if self.out is not None:
+            self.out.write(json.dumps(self.report()) + '\n')
+            self.out.flush()
@@ -0,0 +1,310 @@
+"""A tournament runner comparing Player strategies on the same seeded boards.
+
+Every strategy plays every board, where board i is the board populate_board
+generates from seed <first_seed> + i. Games are played in a pool of worker
+processes; one JSON record per finished game is streamed to the output file
+as soon as it is available, and a summary of every strategy's scores and
+turns to finish is printed at the end.
+
+A strategy is named by a string:
+    'random'         move in a random direction every turn
+    'idle'           never move
+    'greedy'         walk towards the closest free raccoon, pushing
+                     recycling bins ahead whenever possible
+    'scripted:RRDL'  repeat the given moves (L, U, R, D) over and over
+
+Run a tournament with, e.g.:
+    python a1_tournament.py random greedy scripted:RRDDLLUU --boards 500
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from random import Random
+from typing import Callable, Dict, List, Optional, Tuple
+
+import a1
+from a1_headless import GameConfig
+
+# A strategy is called once per turn with the board and a random number
+# generator of its own, and returns the direction the Player should move in,
+# or None to stay still. Strategies never draw from the board's rng, so that
+# they leave the raccoons' moves the same for every strategy.
+Strategy = Callable[[a1.GameBoard, Random], Optional[Tuple[int, int]]]
+
+# Letters used to write the moves of a scripted strategy.
+MOVE_LETTERS = {'L': a1.LEFT, 'U': a1.UP, 'R': a1.RIGHT, 'D': a1.DOWN}
+
+# Number of turns after which a game that has not ended is given up.
+DEFAULT_MAX_TURNS = 2000
+
+
+def random_strategy(board: a1.GameBoard,
+                    rng: Random) -> Optional[Tuple[int, int]]:
+    """Move in a direction drawn from <rng>."""
+    return a1.DIRECTIONS[rng.randrange(4)]
+
+
+def idle_strategy(board: a1.GameBoard,
+                  rng: Random) -> Optional[Tuple[int, int]]:
+    """Never move."""
+    return None
+
+
+def _can_push(board: a1.GameBoard, x: int, y: int,
+              direction: Tuple[int, int]) -> bool:
+    """Return whether the Player can push the run of recycling bins starting
+    at tile (<x>, <y>) in <direction>: the tile past the run is on <board>
+    and empty."""
+    while board.on_board(x, y) and board.char_at(x, y) == 'B':
+        x, y = x + direction[0], y + direction[1]
+    return board.on_board(x, y) and board.char_at(x, y) == '-'
+
+
+def greedy_strategy(board: a1.GameBoard,
+                    rng: Random) -> Optional[Tuple[int, int]]:
+    """Step towards the closest raccoon that is neither trapped nor inside a
+    can, preferring steps that push a recycling bin, among the steps the
+    Player can take. Stay still if there is no such raccoon.
+
+    >>> b = a1.GameBoard(1, 1)
+    >>> b.setup_from_grid('P-\\nB-\\n-R')
+    >>> greedy_strategy(b, Random(0)) == a1.DOWN
+    True
+    >>> b.setup_from_grid('P-\\nBR')  # the bin cannot leave the board
+    >>> greedy_strategy(b, Random(0)) == a1.RIGHT
+    True
+    """
+    player = board.characters_in(a1.Player, 0, 0, board.width,
+                                 board.height)[0]
+    targets = [r for r in board.characters_in(a1.Raccoon, 0, 0, board.width,
+                                              board.height)
+               if not r.inside_can and not r.check_trapped()]
+    if not targets:
+        return None
+    target = min(targets, key=lambda r: abs(r.x - player.x)
+                 + abs(r.y - player.y))
+    best, best_key = None, None
+    for direction in a1.DIRECTIONS:
+        x, y = player.x + direction[0], player.y + direction[1]
+        if not board.on_board(x, y) or board.char_at(x, y) not in '-OB':
+            continue
+        if board.char_at(x, y) == 'B' and not _can_push(board, x, y,
+                                                        direction):
+            continue
+        key = (abs(target.x - x) + abs(target.y - y),
+               board.char_at(x, y) != 'B')
+        if best_key is None or key < best_key:
+            best, best_key = direction, key
+    return best
+
+
+def scripted_strategy(moves: str) -> Strategy:
+    """Return a strategy that repeats <moves>, written with the letters of
+    MOVE_LETTERS, one move per turn.
+
+    Precondition:
+    moves is not empty and only uses the letters of MOVE_LETTERS, in upper or
+    lower case
+
+    >>> s = scripted_strategy('RD')
+    >>> b = a1.GameBoard(2, 2)
+    >>> [s(b, Random(0)) for b.turns in range(3)] == [
+    ...     a1.RIGHT, a1.DOWN, a1.RIGHT]
+    True
+    """
+    directions = [MOVE_LETTERS[m] for m in moves.upper()]
+
+    def strategy(board: a1.GameBoard,
+                 rng: Random) -> Optional[Tuple[int, int]]:
+        return directions[board.turns % len(directions)]
+    return strategy
+
+
+def get_strategy(name: str) -> Strategy:
+    """Return the strategy called <name> (see this module's docstring).
+
+    Raise ValueError if there is no such strategy, or if <name> is a
+    scripted strategy whose script is empty or uses letters other than those
+    of MOVE_LETTERS.
+
+    >>> get_strategy('scripted:RDX')
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid script 'RDX': moves are one or more of L, U, R, D
+    """
+    if name.startswith('scripted:'):
+        moves = name[len('scripted:'):]
+        if not moves or any(m not in MOVE_LETTERS for m in moves.upper()):
+            raise ValueError(f'invalid script {moves!r}: moves are one or '
+                             f'more of {", ".join(MOVE_LETTERS)}')
+        return scripted_strategy(moves)
+    strategies = {'random': random_strategy, 'idle': idle_strategy,
+                  'greedy': greedy_strategy}
+    if name not in strategies:
+        raise ValueError(f'unknown strategy {name!r}')
+    return strategies[name]
+
+
+def make_board(seed: int, width: int, height: int,
+               config: Optional[GameConfig] = None) -> a1.GameBoard:
+    """Return the tournament board generated from <seed>, set up and playing
+    by <config> (the default GameConfig if it is None)."""
+    return (config or GameConfig()).make_board(width, height, seed)
+
+
+def play_game(strategy_name: str, seed: int, width: int, height: int,
+              max_turns: int = DEFAULT_MAX_TURNS,
+              early_end: bool = False,
+              config: Optional[GameConfig] = None) -> dict:
+    """Play strategy <strategy_name> on the board generated from <seed> (and
+    <config>, see make_board) until the game ends or <max_turns> turns have
+    passed, and return the record of the game. With <early_end>, the game
+    ends as soon as no free raccoon can reach a garbage can (see
+    GameBoard.early_end). The strategy draws from its own generator, seeded
+    with <seed>.
+
+    >>> rec = play_game('idle', 3, 5, 5)
+    >>> rec['strategy'], rec['seed'], rec['ended'], rec['turns']
+    ('idle', 3, True, 760)
+    >>> play_game('idle', 3, 5, 5) == rec  # the same seed plays the same
+    True
+    """
+    strategy = get_strategy(strategy_name)
+    board = make_board(seed, width, height, config)
+    board.early_end = early_end
+    rng = Random(seed)
+    while not board.ended and board.turns < max_turns:
+        direction = strategy(board, rng)
+        if direction is not None:
+            board.handle_event(direction)
+        board.give_turns()
+    res = board.result()
+    return {'strategy': strategy_name, 'seed': seed, 'ended': res.ended,
+            'turns': board.turns, 'score': res.score,
+            'trapped': res.trapped, 'in_cans': res.in_cans,
+            'largest_cluster': res.largest_cluster}
+
+
+def summarize(records: List[dict]) -> Dict[str, dict]:
+    """Return per-strategy statistics of the game <records>: the number of
+    games, how many ended, the mean, spread and quartiles of the scores of
+    the games that ended, the count of each score, and the mean number of
+    turns those games took to finish.
+
+    >>> recs = [{'strategy': 'a', 'ended': True, 'score': 10, 'turns': 30},
+    ...         {'strategy': 'a', 'ended': True, 'score': 20, 'turns': 50},
+    ...         {'strategy': 'a', 'ended': False, 'score': None,
+    ...          'turns': 90}]
+    >>> s = summarize(recs)['a']
+    >>> s['games'], s['ended'], s['mean_score'], s['mean_turns']
+    (3, 2, 15.0, 40.0)
+    >>> s['score_counts']
+    {10: 1, 20: 1}
+    """
+    by_strategy = {}
+    for rec in records:
+        by_strategy.setdefault(rec['strategy'], []).append(rec)
+
+    summary = {}
+    for name, recs in by_strategy.items():
+        finished = [r for r in recs if r['ended']]
+        scores = sorted(r['score'] for r in finished)
+        counts = {}
+        for score in scores:
+            counts[score] = counts.get(score, 0) + 1
+        summary[name] = {
+            'games': len(recs),
+            'ended': len(finished),
+            'mean_score': statistics.fmean(scores) if scores else None,
+            'stdev_score': statistics.pstdev(scores) if scores else None,
+            'quartiles': statistics.quantiles(scores, n=4)
+            if len(scores) > 1 else scores,
+            'score_counts': counts,
+            'mean_turns': statistics.fmean(r['turns'] for r in finished)
+            if finished else None}
+    return summary
+
+
+def run_tournament(strategy_names: List[str], seeds: List[int], width: int,
+                   height: int, out_path: Optional[str] = None,
+                   workers: Optional[int] = None,
+                   max_turns: int = DEFAULT_MAX_TURNS,
+                   early_end: bool = False,
+                   config: Optional[GameConfig] = None) -> Dict[str, dict]:
+    """Play every strategy in <strategy_names> on every board in <seeds> in a
+    pool of <workers> processes, append one JSON line per game to
+    <out_path> (if given) as soon as the game is done, and return the
+    summary of all the games (see summarize). <early_end> and <config> are
+    passed on to play_game.
+    """
+    for name in strategy_names:
+        get_strategy(name)  # fail early on a bad name
+    records = []
+    out = open(out_path, 'a') if out_path is not None else None
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(play_game, name, seed, width, height,
+                                   max_turns, early_end, config)
+                       for seed in seeds for name in strategy_names]
+            for future in as_completed(futures):
+                rec = future.result()
+                records.append(rec)
+                if out is not None:
+                    out.write(json.dumps(rec) + '\n')
+                    out.flush()
+    finally:
+        if out is not None:
+            out.close()
+    return summarize(records)
+
+
+def format_stat(v: Optional[float]) -> str:
+    """Return the statistic <v> as shown in a summary table, or '-' if it
+    is None.
+
+    >>> format_stat(3.14159), format_stat(None)
+    ('3.1', '-')
+    """
+    return '-' if v is None else f'{v:.1f}'
+
+
+def print_summary(summary: Dict[str, dict]) -> None:
+    """Print a table of the tournament <summary>."""
+    print(f'{"strategy":<20} {"games":>6} {"ended":>6} {"mean":>7} '
+          f'{"stdev":>7} {"q1/med/q3":>18} {"turns":>8}')
+    for name, s in summary.items():
+        quarts = '/'.join(format_stat(q) for q in s['quartiles']) or '-'
+        print(f'{name:<20} {s["games"]:>6} {s["ended"]:>6} '
+              f'{format_stat(s["mean_score"]):>7} '
+              f'{format_stat(s["stdev_score"]):>7} '
+              f'{quarts:>18} {format_stat(s["mean_turns"]):>8}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('strategies', nargs='+')
+    parser.add_argument('--boards', type=int, default=100)
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--width', type=int, default=10)
+    parser.add_argument('--height', type=int, default=10)
+    parser.add_argument('--max-turns', type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--early-end', action='store_true',
+                        help='end games once no raccoon can reach a can')
+    parser.add_argument('--out', default=None,
+                        help='append one JSON line per game to this file')
+    args = parser.parse_args()
+    try:
+        result = run_tournament(
+            args.strategies,
+            list(range(args.first_seed, args.first_seed + args.boards)),
+            args.width, args.height, args.out, args.workers, args.max_turns,
+            args.early_end)
+    except ValueError as e:
+        sys.exit(str(e))
+    print_summary(result)